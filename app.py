@@ -5,9 +5,16 @@
 """
 
 import os
+import hmac
+import json
 import uuid
-from flask import Flask, render_template, request, jsonify, url_for
+from flask import Flask, Response, render_template, request, jsonify, url_for, stream_with_context, send_from_directory, abort
 from stroboscope import config_manager, file_manager, progress_monitor, logger, render_engine, scene_manager # 导入 scene_manager
+from stroboscope.render_engine import RENDER_ENGINES
+from stroboscope.worker_pool import manim_worker_pool
+from stroboscope.capabilities import capabilities
+from stroboscope.janitor import artifact_janitor
+from stroboscope.metrics import metrics
 
 app = Flask(__name__)
 
@@ -15,6 +22,30 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = config_manager.get('APP', 'SECRET_KEY', 'dev-secret-key')
 app.config['DEBUG'] = config_manager.get('APP', 'DEBUG', 'True').lower() == 'true'
 
+# 进度推送：无状态变化时发送心跳的间隔（秒），防止代理断开空闲连接
+EVENTS_KEEPALIVE_SECONDS = 15
+TERMINAL_STATES = ('done', 'failed', 'cancelled')
+
+# 产物下载：内容寻址的缓存文件与 HLS 分段写出后不再变化，可被浏览器与代理长期缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ARTIFACT_MIMETYPES = {
+    '.mp4': 'video/mp4',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+}
+# 反向代理（nginx X-Accel / Apache X-Sendfile）负责发送文件时开启
+app.config['USE_X_SENDFILE'] = config_manager.get('APP', 'USE_X_SENDFILE', 'false').lower() == 'true'
+
+# 管理接口在未配置 ADMIN_TOKEN 时只允许这些来源地址
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+def is_admin_request() -> bool:
+    """管理接口鉴权：配置了 [APP] ADMIN_TOKEN 时校验请求头 X-Admin-Token，否则只允许本机访问"""
+    token = config_manager.get('APP', 'ADMIN_TOKEN', '').strip()
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return request.remote_addr in LOCAL_ADDRESSES
+
 @app.route('/')
 def index():
     """主页"""
@@ -25,14 +56,113 @@ def health():
     """健康检查"""
     return jsonify({
         'ok': True,
-        'is_rendering': render_engine.is_busy()
+        'is_rendering': render_engine.is_busy(),
+        'active_renders': render_engine.active_count(),
+        'queue_depth': render_engine.queue_depth(),
+        'workers': render_engine.max_workers,
+        'capabilities': capabilities.get()
     })
 
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus 文本格式的运行指标（队列与并发在抓取时读取）"""
+    metrics.set('stroboscope_queue_depth', render_engine.queue_depth())
+    metrics.set('stroboscope_active_renders', render_engine.active_count())
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/reload_config', methods=['POST'])
+def reload_config():
+    """重新加载配置文件，并重新探测渲染环境（仅限本机或携带管理令牌的请求）"""
+    if not is_admin_request():
+        logger.warning(f"拒绝来自 {request.remote_addr} 的配置重新加载请求")
+        return jsonify({'success': False, 'message': '无权重新加载配置'}), 403
+    try:
+        restart_required = config_manager.reload()
+        logger.info("配置已重新加载")
+        if restart_required:
+            logger.warning(f"以下配置需要重启服务才会生效: {', '.join(restart_required)}")
+        return jsonify({
+            'success': True,
+            'capabilities': capabilities.get(),
+            'restart_required': restart_required
+        })
+    except Exception as e:
+        logger.error(f"重新加载配置失败: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/status')
 def get_status():
-    """获取渲染状态"""
+    """获取最近一次更新的渲染状态（兼容旧接口）"""
     return jsonify(render_engine.get_render_status())
 
+@app.route('/status/<unique_id>')
+def get_job_status(unique_id):
+    """获取指定任务的渲染状态：queued / running / done / failed"""
+    status = render_engine.get_render_status(unique_id)
+    if status is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    status['stream_url'] = build_stream_url(status)
+    return jsonify(status)
+
+@app.route('/status/<unique_id>/trace')
+def get_job_trace(unique_id):
+    """
+    获取指定任务各阶段与步骤的时间线；?format=chrome 时返回 Chrome Trace Event 格式，
+    以附件下载，可在 chrome://tracing 或 Perfetto 中打开
+    """
+    trace = progress_monitor.get_trace(unique_id)
+    if trace is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    if request.args.get('format') == 'chrome':
+        return Response(json.dumps(progress_monitor.to_chrome_trace(trace)), mimetype='application/json',
+                        headers={'Content-Disposition': f'attachment; filename="trace_{unique_id}.json"'})
+    return jsonify(trace)
+
+@app.route('/events/<unique_id>')
+def job_events(unique_id):
+    """
+    以 Server-Sent Events 推送指定任务的状态变化，任务完成时附带视频 URL，
+    进入 done / failed / cancelled 后结束连接
+    """
+    if render_engine.get_render_status(unique_id) is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+
+    def stream():
+        version = -1
+        while True:
+            status = progress_monitor.wait_for_update(unique_id, version, EVENTS_KEEPALIVE_SECONDS)
+            if status is None:
+                yield "event: error\ndata: {\"message\": \"任务不存在\"}\n\n"
+                return
+            if status['version'] == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = status['version']
+            status.update(render_engine.eta_fields(status))
+            status['stream_url'] = build_stream_url(status)
+            if status['state'] == 'done':
+                status['video_url'] = build_video_url(unique_id)
+            yield f"event: status\ndata: {json.dumps(status, ensure_ascii=False)}\n\n"
+            if status['state'] in TERMINAL_STATES:
+                return
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # 禁止 nginx 缓冲事件流
+    })
+
+@app.route('/cancel/<unique_id>', methods=['POST'])
+def cancel_render(unique_id):
+    """取消排队中或渲染中的任务：终止子进程树并清理未完成的文件"""
+    result = render_engine.cancel_render(unique_id)
+    if result == 'cancelled':
+        return jsonify({'success': True, 'message': '任务已取消'})
+    if result == 'shared':
+        return jsonify({'success': False, 'message': '其他请求正在等待该渲染结果，无法取消'}), 409
+    if result == 'finished':
+        return jsonify({'success': False, 'message': '任务已结束'}), 409
+    return jsonify({'success': False, 'message': '任务不存在'}), 404
+
 @app.route('/cleanup', methods=['POST'])
 # 修改 app.py 中的 cleanup_old_videos 方法
 def cleanup_old_videos():
@@ -86,6 +216,10 @@ def generate_animation():
         rotation_speed_rpm = float(request.form.get('rotation_speed', 30))
         flash_frequency_hz = float(request.form.get('flash_frequency', 25))
         render_quality = int(request.form.get('render_quality', 1))
+        render_engine_name = request.form.get('engine', '').strip().lower() or None
+        session_id = request.form.get('session_id', '').strip() or None
+        derive_tiers = request.form.get('derive_tiers', '').strip().lower()
+        derive_tiers = derive_tiers in ('1', 'true') if derive_tiers else None
         
         # 验证参数范围 (前端发送的是Hz*60的RPM值，所以最大是100*60=6000)
         if rotation_speed_rpm < 0 or rotation_speed_rpm > 6000:
@@ -96,32 +230,34 @@ def generate_animation():
             
         if render_quality < 1 or render_quality > 3:
             return jsonify({'success': False, 'message': '渲染质量必须在1-3之间'}), 400
-        
-        # 检查是否正在渲染
-        if render_engine.is_busy():
-            return jsonify({'success': False, 'message': '正在渲染中，请稍候...'}), 409
+
+        if render_engine_name is not None and render_engine_name not in RENDER_ENGINES:
+            return jsonify({'success': False, 'message': f"渲染引擎必须是 {' / '.join(RENDER_ENGINES)} 之一"}), 400
         
         # 生成唯一ID
         unique_id = str(uuid.uuid4())
         
-        # 启动渲染
+        # 提交渲染任务（进入队列，由工作线程并发执行）
         # 正确传递参数给渲染引擎（而不是传递字典）
         success = render_engine.render_animation(
             rotation_speed_rpm,
             flash_frequency_hz,
             render_quality,
-            unique_id
+            unique_id,
+            engine=render_engine_name,
+            session_id=session_id,
+            derive_tiers=derive_tiers
         )
         
         if success:
-            logger.info(f"开始渲染动画: {unique_id}")
+            logger.info(f"渲染任务已提交: {unique_id}")
             return jsonify({
                 'success': True, 
-                'message': '开始渲染动画...',
+                'message': '渲染任务已加入队列...',
                 'unique_id': unique_id
             })
         else:
-            return jsonify({'success': False, 'message': '渲染引擎繁忙'}), 409
+            return jsonify({'success': False, 'message': '渲染队列已满，请稍后再试'}), 503
         
     except ValueError as e:
         logger.error(f"参数格式错误: {e}")
@@ -130,19 +266,129 @@ def generate_animation():
         logger.error(f"服务器错误: {e}")
         return jsonify({'success': False, 'message': f'服务器错误: {str(e)}'}), 500
 
+@app.route('/generate_mosaic', methods=['POST'])
+def generate_mosaic():
+    """生成拼图动画：多组参数各占网格中的一个圆盘，一次渲染完成"""
+    try:
+        data = request.get_json(silent=True) or {}
+        panels = data.get('panels')
+        render_quality = int(data.get('render_quality', 1))
+        render_engine_name = str(data.get('engine') or '').strip().lower() or None
+        session_id = str(data.get('session_id') or '').strip() or None
+
+        if not isinstance(panels, list) or not panels:
+            return jsonify({'success': False, 'message': 'panels 必须是非空列表'}), 400
+        if len(panels) > render_engine.mosaic_max_panels:
+            return jsonify({'success': False, 'message': f'拼图最多 {render_engine.mosaic_max_panels} 个面板'}), 400
+        for panel in panels:
+            if not isinstance(panel, dict):
+                return jsonify({'success': False, 'message': '每个面板必须是包含 rotation_speed 与 flash_frequency 的对象'}), 400
+            rotation_speed_rpm = float(panel.get('rotation_speed', 30))
+            flash_frequency_hz = float(panel.get('flash_frequency', 25))
+            if rotation_speed_rpm < 0 or rotation_speed_rpm > 6000:
+                return jsonify({'success': False, 'message': '旋转频率必须在0-100 Hz之间'}), 400
+            if flash_frequency_hz < 0 or flash_frequency_hz > 100:
+                return jsonify({'success': False, 'message': '闪烁频率必须在0-100 Hz之间'}), 400
+            panel['rotation_speed'], panel['flash_frequency'] = rotation_speed_rpm, flash_frequency_hz
+
+        if render_quality < 1 or render_quality > 3:
+            return jsonify({'success': False, 'message': '渲染质量必须在1-3之间'}), 400
+
+        if render_engine_name is not None and render_engine_name not in RENDER_ENGINES:
+            return jsonify({'success': False, 'message': f"渲染引擎必须是 {' / '.join(RENDER_ENGINES)} 之一"}), 400
+
+        unique_id = str(uuid.uuid4())
+        success = render_engine.render_mosaic(panels, render_quality, unique_id,
+                                              engine=render_engine_name, session_id=session_id)
+        if success:
+            logger.info(f"拼图渲染任务已提交: {unique_id} ({len(panels)} 个面板)")
+            return jsonify({
+                'success': True,
+                'message': '拼图渲染任务已加入队列...',
+                'unique_id': unique_id
+            })
+        else:
+            return jsonify({'success': False, 'message': '渲染队列已满，请稍后再试'}), 503
+
+    except (TypeError, ValueError) as e:
+        logger.error(f"拼图参数格式错误: {e}")
+        return jsonify({'success': False, 'message': '参数格式错误'}), 400
+    except Exception as e:
+        logger.error(f"服务器错误: {e}")
+        return jsonify({'success': False, 'message': f'服务器错误: {str(e)}'}), 500
+
+def artifact_url(path):
+    """视频目录内的文件通过 /artifacts 提供，返回其 URL；不在视频目录内时返回 None"""
+    relative_path = os.path.relpath(path, file_manager.video_dir)
+    if relative_path.startswith('..') or os.path.isabs(relative_path):
+        return None
+    return url_for('serve_artifact', filename=relative_path.replace(os.sep, '/'))
+
+def build_video_url(unique_id):
+    """返回任务视频的访问 URL，视频不存在时返回 None"""
+    video_path = file_manager.get_video_path(unique_id)
+    if not video_path or not os.path.exists(video_path):
+        return None
+    video_url = artifact_url(video_path)
+    if video_url:
+        return video_url
+    # 确保 url_for 生成的路径正确，指向 static/animations 目录
+    # 这里需要注意的是，url_for('static', filename=...) 期望 filename 是相对于 static 目录的路径
+    # file_manager.get_video_path 返回的是绝对路径或相对项目根目录的路径
+    # 所以我们需要提取 filename 相对 static/animations 的部分
+    relative_video_path = os.path.relpath(video_path, app.static_folder).replace(os.sep, '/')
+    return url_for('static', filename=relative_video_path)
+
+def build_stream_url(status):
+    """返回任务流式输出（HLS 播放列表）的访问 URL，没有流式输出时返回 None"""
+    playlist = status.get('stream_playlist') if status else None
+    if not playlist:
+        return None
+    playlist_path = os.path.join(file_manager.video_dir, playlist)
+    if not os.path.exists(playlist_path):
+        return None
+    return artifact_url(playlist_path)
+
+@app.route('/artifacts/<path:filename>')
+def serve_artifact(filename):
+    """
+    提供渲染产物：支持 Range 请求与基于强 ETag 的条件请求（If-None-Match / If-Range），
+    由 WSGI 服务器的 file_wrapper（如 sendfile）零拷贝发送文件。
+    cache/ 下的内容寻址文件以缓存键作为 ETag 并标记为 immutable；
+    HLS 分段同样不可变；播放列表与其他文件每次需重新验证。
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in ARTIFACT_MIMETYPES:
+        abort(404)
+    is_cache_entry = filename.startswith('cache/')
+    immutable = is_cache_entry or extension == '.ts'
+    etag = os.path.splitext(os.path.basename(filename))[0] if is_cache_entry else True
+    response = send_from_directory(
+        file_manager.video_dir, filename,
+        mimetype=ARTIFACT_MIMETYPES[extension],
+        conditional=True,
+        etag=etag,
+        max_age=None
+    )
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache'
+    # 记录访问，供磁盘预算清理按 LRU 淘汰；HLS 文件归属其所在的流式输出目录
+    indexed_path = '/'.join(filename.split('/')[:2]) if filename.startswith('streams/') else filename
+    file_manager.artifact_index.touch(indexed_path)
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
 @app.route('/get_video/<unique_id>')
 def get_video(unique_id):
-    """获取渲染完成的视频"""
-    video_path = file_manager.get_video_path(unique_id)
-    
-    if video_path and os.path.exists(video_path):
-        # 确保 url_for 生成的路径正确，指向 static/animations 目录
-        # 这里需要注意的是，url_for('static', filename=...) 期望 filename 是相对于 static 目录的路径
-        # file_manager.get_video_path 返回的是绝对路径或相对项目根目录的路径
-        # 所以我们需要提取 filename 相对 static/animations 的部分
-        relative_video_path = os.path.relpath(video_path, app.static_folder).replace(os.sep, '/')
-        video_url = url_for('static', filename=relative_video_path)
-        return jsonify({'success': True, 'video_url': video_url})
+    """获取渲染完成的视频；仍在渲染但已有流式输出时返回 HLS 播放列表"""
+    video_url = build_video_url(unique_id)
+    status = render_engine.get_render_status(unique_id)
+    stream_url = build_stream_url(status)
+    if video_url and status and status['state'] == 'done':
+        return jsonify({'success': True, 'video_url': video_url, 'stream_url': stream_url, 'streaming': False})
+    if stream_url:
+        return jsonify({'success': True, 'video_url': stream_url, 'stream_url': stream_url, 'streaming': True})
+    if video_url:
+        return jsonify({'success': True, 'video_url': video_url, 'stream_url': None, 'streaming': False})
     else:
         return jsonify({'success': False, 'message': '视频文件不存在'}), 404
 
@@ -155,6 +401,16 @@ if __name__ == '__main__':
     except Exception as e:
         logger.error(f"启动清理失败: {e}")
     
+    # 启动时探测一次渲染环境（ffmpeg / 渲染器 / 字体），之后的任务直接使用探测结果
+    capabilities.get()
+    
+    # 后台按磁盘预算淘汰最久未用的产物
+    artifact_janitor.start()
+    
+    # 常驻 Manim 进程模式下预先启动工作进程，首个请求无需等待 Manim 导入
+    if render_engine.manim_mode == 'warm':
+        manim_worker_pool.prewarm(render_engine.max_workers)
+    
     # 获取配置
     host = config_manager.get('APP', 'HOST', '127.0.0.1')
     port = int(config_manager.get('APP', 'PORT', '5000'))
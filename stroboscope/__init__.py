@@ -4,6 +4,7 @@
 
 from .utils import config_manager, file_manager, progress_monitor, logger
 from .manim_manager import scene_manager
+from .render_cache import render_cache
 from .render_engine import render_engine
 
 __all__ = [
@@ -12,5 +13,6 @@ __all__ = [
     'progress_monitor',
     'logger',
     'scene_manager',
+    'render_cache',
     'render_engine'
 ]
@@ -0,0 +1,329 @@
+"""
+渲染产物索引
+用 SQLite 记录视频目录下生成的每个产物（任务、参数、路径、大小、创建与最近访问时间），
+查找任务视频与清理旧文件时查询索引，不再遍历目录树。
+缓存文件是任务视频的硬链接：每条记录保存文件标识（设备号:inode），
+统计用量与淘汰时按文件标识合并，同一份数据只计一次、一起删除。
+索引之外的文件（Manim 的 texts/*.svg、进程崩溃前未登记的输出）由 find_unindexed 的有限扫描兜底清理。
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from .metrics import metrics
+
+logger = logging.getLogger('stroboscope')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,          -- 相对视频目录的路径（文件或目录）
+    kind TEXT NOT NULL,             -- video / cache / stream / layer / scratch
+    job_id TEXT,
+    cache_key TEXT,
+    params TEXT,                    -- 渲染参数（JSON）
+    size INTEGER NOT NULL DEFAULT 0,
+    file_id TEXT,                   -- 文件的 设备号:inode（目录为空），硬链接共享同一标识
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts(created_at);
+CREATE INDEX IF NOT EXISTS idx_artifacts_access ON artifacts(last_access);
+CREATE TABLE IF NOT EXISTS job_outputs (
+    job_id TEXT PRIMARY KEY,        -- 任务（含合并的重复请求、缓存命中）
+    path TEXT NOT NULL              -- 该任务的视频（artifacts.path）
+);
+CREATE INDEX IF NOT EXISTS idx_job_outputs_path ON job_outputs(path);
+"""
+
+# 按文件标识合并硬链接；没有标识的产物（目录）各自成组
+GROUP_EXPR = "COALESCE(file_id, 'path:' || path)"
+
+
+class ArtifactIndex:
+    """渲染产物索引（SQLite，WAL 模式，单连接 + 锁）"""
+
+    def __init__(self, db_path: str, root_dir: str):
+        self.db_path = db_path
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+        is_new = not os.path.exists(db_path)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        if is_new:
+            self.rebuild()
+
+    def _migrate(self):
+        """旧版本的索引没有 file_id 列：补上该列并为已有文件回填"""
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(artifacts)")}
+        if 'file_id' not in columns:
+            with self._lock, self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute("ALTER TABLE artifacts ADD COLUMN file_id TEXT")
+                for row in self._conn.execute("SELECT path FROM artifacts").fetchall():
+                    self._conn.execute("UPDATE artifacts SET file_id = ? WHERE path = ?",
+                                       (self._file_id(self.absolute(row['path'])), row['path']))
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_file_id ON artifacts(file_id)")
+
+    def _relative(self, path: str) -> str:
+        """统一为相对视频目录、以 / 分隔的路径"""
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root_dir)
+        return path.replace(os.sep, '/')
+
+    def absolute(self, relative_path: str) -> str:
+        return os.path.join(self.root_dir, *relative_path.split('/'))
+
+    @staticmethod
+    def _size_of(path: str) -> int:
+        """文件大小；目录为其中全部文件大小之和（只统计该产物目录本身）"""
+        try:
+            if os.path.isdir(path):
+                return sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, files in os.walk(path) for name in files)
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _file_id(path: str) -> Optional[str]:
+        """文件的 设备号:inode，硬链接相同；目录或不存在时为 None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if os.path.isdir(path) or not stat.st_ino:
+            return None
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def _upsert_locked(self, relative_path: str, kind: str, job_id: Optional[str], cache_key: Optional[str],
+                       params: Optional[Dict[str, Any]], now: float) -> int:
+        """
+        登记或更新一条产物记录，返回新增的字节数：
+        同一路径重复登记时只计增长部分，已登记文件的硬链接不计
+        """
+        absolute_path = self.absolute(relative_path)
+        size = self._size_of(absolute_path)
+        file_id = self._file_id(absolute_path)
+        previous = self._conn.execute("SELECT size FROM artifacts WHERE path = ?", (relative_path,)).fetchone()
+        linked = file_id is not None and self._conn.execute(
+            "SELECT 1 FROM artifacts WHERE file_id = ? AND path != ? LIMIT 1", (file_id, relative_path)
+        ).fetchone() is not None
+        self._conn.execute(
+            """INSERT INTO artifacts (path, kind, job_id, cache_key, params, size, file_id, created_at, last_access)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET size = excluded.size, file_id = excluded.file_id,
+                                               last_access = excluded.last_access""",
+            (relative_path, kind, job_id, cache_key,
+             json.dumps(params, ensure_ascii=False) if params else None, size, file_id, now, now)
+        )
+        if linked:
+            return 0
+        return max(0, size - (previous['size'] if previous else 0))
+
+    def record(self, path: str, kind: str, job_id: str = None, cache_key: str = None,
+               params: Dict[str, Any] = None):
+        """登记一个产物（已存在时更新大小与访问时间）"""
+        with self._lock, self._conn:
+            written = self._upsert_locked(self._relative(path), kind, job_id, cache_key, params, time.time())
+        metrics.inc('stroboscope_artifact_bytes_written_total', written, labels={'kind': kind})
+
+    def record_job_output(self, job_id: str, outputs: List[Dict[str, Any]], video_path: str,
+                          waiter_ids: List[str] = (), link_owner: bool = True):
+        """
+        在一个事务中登记任务的全部产物，并将任务（以及等待该结果的重复请求）指向其视频。
+        outputs 中每项为 {'path', 'kind', 'cache_key'?, 'params'?}；
+        link_owner 为 False 时只将等待的请求指向该视频（同一任务派生出的其他档位）
+        """
+        now = time.time()
+        video_relative = self._relative(video_path)
+        written = {}
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for output in outputs:
+                written[output['kind']] = written.get(output['kind'], 0) + self._upsert_locked(
+                    self._relative(output['path']), output['kind'], job_id,
+                    output.get('cache_key'), output.get('params'), now)
+            for target_id in ((job_id,) if link_owner else ()) + tuple(waiter_ids):
+                self._conn.execute("INSERT OR REPLACE INTO job_outputs (job_id, path) VALUES (?, ?)",
+                                   (target_id, video_relative))
+        for kind, size in written.items():
+            metrics.inc('stroboscope_artifact_bytes_written_total', size, labels={'kind': kind})
+
+    def link_job(self, job_id: str, path: str):
+        """将任务指向已有的产物（缓存命中）并刷新其访问时间"""
+        relative_path = self._relative(path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO job_outputs (job_id, path) VALUES (?, ?)",
+                               (job_id, relative_path))
+            self._conn.execute("UPDATE artifacts SET last_access = ? WHERE path = ?", (time.time(), relative_path))
+
+    def get_job_output(self, job_id: str) -> Optional[str]:
+        """返回任务视频的绝对路径，并记录一次访问；未登记时返回 None"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT path FROM job_outputs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE artifacts SET last_access = ? WHERE path = ?", (time.time(), row['path']))
+        return self.absolute(row['path'])
+
+    def touch(self, path: str, min_interval: float = 60.0):
+        """记录一次访问（/artifacts 直接提供文件时调用）；间隔过短的重复访问不写库"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE artifacts SET last_access = ? WHERE path = ? AND last_access < ?",
+                               (now, self._relative(path), now - min_interval))
+
+    def usage(self, kinds: tuple) -> Tuple[int, int]:
+        """指定类型产物的数量与总字节数；互为硬链接的产物（任务视频与其缓存文件）只计一次"""
+        with self._lock:
+            row = self._conn.execute(
+                f"""SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (
+                       SELECT MAX(size) AS size FROM artifacts WHERE kind IN ({', '.join('?' * len(kinds))})
+                       GROUP BY {GROUP_EXPR})""",
+                list(kinds)
+            ).fetchone()
+        return row[0], row[1]
+
+    def least_recently_used(self, kinds: tuple, exclude_job_ids=(), limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        按最近访问时间从旧到新返回产物，互为硬链接的产物合为一项（任一路径的访问都算作整组的访问），
+        每项为 {'paths', 'size', 'last_access'}；跳过含有 exclude_job_ids 产物的组
+        """
+        query = (f"SELECT GROUP_CONCAT(path, char(10)) AS paths, MAX(size) AS size, MAX(last_access) AS last_access "
+                 f"FROM artifacts WHERE kind IN ({', '.join('?' * len(kinds))}) GROUP BY {GROUP_EXPR}")
+        args: list = list(kinds)
+        if exclude_job_ids:
+            query += f" HAVING COALESCE(SUM(job_id IN ({', '.join('?' * len(exclude_job_ids))})), 0) = 0"
+            args += list(exclude_job_ids)
+        query += " ORDER BY last_access LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            return [{'paths': row['paths'].split('\n'), 'size': row['size'], 'last_access': row['last_access']}
+                    for row in self._conn.execute(query, args)]
+
+    def find(self, kinds: tuple = None, created_before: float = None) -> List[Dict[str, Any]]:
+        """按类型与创建时间查询产物"""
+        query = "SELECT * FROM artifacts WHERE 1 = 1"
+        args: list = []
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            args += list(kinds)
+        if created_before is not None:
+            query += " AND created_at < ?"
+            args.append(created_before)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query + " ORDER BY created_at", args)]
+
+    def delete(self, relative_paths: List[str]) -> int:
+        """删除产物文件（或目录）并移除索引记录，返回删除的条目数"""
+        deleted = 0
+        removed = []
+        for relative_path in relative_paths:
+            path = self.absolute(relative_path)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+                deleted += 1
+                removed.append(relative_path)
+            except OSError as e:
+                logger.warning(f"删除产物失败: {path} -> {e}")
+        if removed:
+            with self._lock, self._conn:
+                self._conn.execute("BEGIN")
+                rows = [self._conn.execute("SELECT size, file_id FROM artifacts WHERE path = ?", (p,)).fetchone()
+                        for p in removed]
+                self._conn.executemany("DELETE FROM artifacts WHERE path = ?", [(p,) for p in removed])
+                self._conn.executemany("DELETE FROM job_outputs WHERE path = ?", [(p,) for p in removed])
+                # 硬链接只有在最后一个路径删除后才真正释放空间
+                freed = 0
+                seen = set()
+                for row in filter(None, rows):
+                    if row['file_id'] is None:
+                        freed += row['size']
+                    elif row['file_id'] not in seen:
+                        seen.add(row['file_id'])
+                        if not self._conn.execute("SELECT 1 FROM artifacts WHERE file_id = ? LIMIT 1",
+                                                  (row['file_id'],)).fetchone():
+                            freed += row['size']
+            metrics.inc('stroboscope_cleanup_bytes_deleted_total', freed)
+        return deleted
+
+    def delete_job(self, job_id: str) -> int:
+        """删除某个任务登记的全部产物，返回删除的条目数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM artifacts WHERE job_id = ?", (job_id,)).fetchall()
+        return self.delete([row['path'] for row in rows])
+
+    def find_unindexed(self, created_before: float, limit: int = 500) -> List[str]:
+        """
+        兜底扫描：返回视频目录下未登记、修改时间早于 created_before 的文件（相对路径）。
+        已登记的目录整体跳过，分层背景目录不参与；最多检查 limit 个文件，避免退化为每次全量遍历。
+        """
+        if limit <= 0 or not os.path.isdir(self.root_dir):
+            return []
+        with self._lock:
+            indexed = {row['path'] for row in self._conn.execute("SELECT path FROM artifacts")}
+        found = []
+        examined = 0
+        for root, dirs, files in os.walk(self.root_dir):
+            prefix = '' if os.path.normpath(root) == os.path.normpath(self.root_dir) else self._relative(root) + '/'
+            dirs[:] = [d for d in dirs if prefix + d not in indexed and not (not prefix and d == 'layers')]
+            for name in files:
+                examined += 1
+                if examined > limit:
+                    return found
+                relative_path = prefix + name
+                if relative_path in indexed:
+                    continue
+                try:
+                    if os.path.getmtime(os.path.join(root, name)) < created_before:
+                        found.append(relative_path)
+                except OSError:
+                    continue
+        return found
+
+    def rebuild(self):
+        """
+        索引新建时扫描一次视频目录，登记已有的产物（仅此一次遍历）。
+        Manim 媒体目录与流式输出目录按整个目录登记。
+        """
+        entries = []
+        if not os.path.isdir(self.root_dir):
+            return
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if name in ('cache', 'layers', 'streams') and os.path.isdir(path):
+                kind = {'cache': 'cache', 'layers': 'layer', 'streams': 'stream'}[name]
+                for child in os.listdir(path):
+                    entries.append((os.path.join(path, child), kind))
+            elif name in ('videos', 'images') and os.path.isdir(path):
+                for child in os.listdir(path):
+                    entries.append((os.path.join(path, child), 'scratch'))
+            elif os.path.isfile(path) and name.endswith(('.mp4', '.json')):
+                entries.append((path, 'video'))
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for path, kind in entries:
+                try:
+                    created = os.path.getmtime(path)
+                except OSError:
+                    continue
+                self._conn.execute(
+                    """INSERT OR IGNORE INTO artifacts (path, kind, size, file_id, created_at, last_access)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (self._relative(path), kind, self._size_of(path), self._file_id(path), created, created)
+                )
+        if entries:
+            logger.info(f"产物索引已根据现有文件重建: {len(entries)} 项")
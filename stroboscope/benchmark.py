@@ -0,0 +1,249 @@
+"""
+渲染基准测试
+按代表性的参数矩阵（质量档位 × 闪烁频率为 0 / fr = 0 / 小 fr / 接近 1 的 fr）逐个驱动 RenderEngine，
+记录每个任务各阶段的墙钟耗时（场景生成、子进程启动、逐帧渲染、编码、输出整理、清理），
+取多次运行的中位数写入 JSON 基线；与已有基线比较时，任一阶段超出阈值即判定为回归（退出码 1）。
+基准任务不使用渲染缓存，产物在每次运行后删除；只需要本机的 ffmpeg（manim 引擎另需 Manim），不需要网络与 GPU。
+
+命令行用法（在项目根目录）：
+    python -m stroboscope.benchmark --engine fast --quality 1,2 --repeat 3 --save   # 记录基线
+    python -m stroboscope.benchmark --engine fast --quality 1,2 --repeat 3          # 与基线比较
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import platform
+import statistics
+import threading
+from typing import Any, Dict, List, Optional
+from .utils import config_manager, file_manager, progress_monitor, logger
+from .manim_manager import scene_manager
+from .capabilities import capabilities
+from .render_engine import render_engine, RENDER_ENGINES, RENDER_STAGES
+from .sweep import parse_values
+
+# 相对项目根目录而不是当前工作目录，从任何目录运行都读写同一个基线
+DEFAULT_BASELINE = os.path.join(str(config_manager.project_root), 'benchmarks', 'baseline.json')
+# 默认回归阈值：比基线慢 25% 以上，且绝对差值超过 0.1 秒（过滤短阶段的计时噪声）
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_DELTA = 0.1
+
+# 转速固定为 30 RPM（0.5 Hz），按闪烁频率覆盖 fr 的典型取值
+BENCH_ROTATION_SPEED = 30.0
+FR_CASES = {
+    'continuous': 0.0,    # 闪烁频率为 0：按实际角速度连续旋转
+    'fr_zero': 0.5,       # fr = 0：指针静止
+    'fr_small': 0.55,     # fr = 0.05：缓慢顺时针
+    'fr_near_one': 1.45,  # fr = 0.95：接近一整圈每秒
+}
+
+
+def build_cases(qualities: List[int], engine: str) -> List[Dict[str, Any]]:
+    """质量档位与 fr 取值的笛卡尔积，每项的 id 形如 fast/q1/fr_small"""
+    return [
+        {
+            'id': f"{engine}/q{quality}/{name}",
+            'rotation_speed': BENCH_ROTATION_SPEED,
+            'flash_frequency': flash_frequency,
+            'quality': quality,
+            'engine': engine,
+        }
+        for quality in qualities
+        for name, flash_frequency in FR_CASES.items()
+    ]
+
+
+def machine_info() -> Dict[str, Any]:
+    """基线对应的运行环境；与当前环境不一致时比较结果仅供参考"""
+    probe = capabilities.get()
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': probe['ffmpeg']['version'],
+        'renderer': probe['renderer']['selected'],
+    }
+
+
+class RunCollector:
+    """接收渲染引擎的任务结束记录，按任务 ID 等待"""
+
+    def __init__(self):
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._changed = threading.Condition()
+
+    def __enter__(self) -> "RunCollector":
+        render_engine.add_run_listener(self._on_run)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        render_engine.remove_run_listener(self._on_run)
+
+    def _on_run(self, run: Dict[str, Any]):
+        with self._changed:
+            self._runs[run['job_id']] = run
+            self._changed.notify_all()
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """任务状态变为结束后，渲染线程还要完成清理才写出记录，这里再等待记录到达"""
+        with self._changed:
+            self._changed.wait_for(lambda: job_id in self._runs, timeout)
+            return self._runs.pop(job_id, None)
+
+
+def _run_case(case: Dict[str, Any], collector: RunCollector, timeout: float) -> Dict[str, Any]:
+    """渲染一次（不使用缓存），返回 {'stages': {阶段: 秒}, 'total_seconds'}，结束后删除产物"""
+    unique_id = f"bench_{uuid.uuid4().hex[:12]}"
+    try:
+        if not render_engine.render_animation(case['rotation_speed'], case['flash_frequency'], case['quality'],
+                                              unique_id, engine=case['engine'], use_cache=False):
+            raise RuntimeError("渲染队列已满")
+        status = progress_monitor.wait_until_finished(unique_id, timeout)
+        if not status or status['state'] != 'done':
+            if status and status['state'] in ('queued', 'running'):
+                render_engine.cancel_render(unique_id, '基准测试超时')
+            raise RuntimeError((status or {}).get('error') or '超时')
+        run = collector.wait(unique_id, timeout=30)
+        if run is None:
+            raise RuntimeError("未收到渲染记录")
+        return {
+            'stages': {stage: run['stages'].get(stage, 0.0) for stage in RENDER_STAGES},
+            'total_seconds': run['total_seconds'],
+        }
+    finally:
+        file_manager.artifact_index.delete_job(unique_id)
+
+
+def run_benchmark(cases: List[Dict[str, Any]], repeat: int = 3, warmup: int = 1,
+                  timeout: float = 1800) -> Dict[str, Dict[str, Any]]:
+    """
+    依次运行每个用例（串行，避免任务之间争用 CPU），先运行 warmup 次不计入结果
+    （首次导入、背景光栅化等一次性开销），再取 repeat 次的中位数
+    """
+    results = {}
+    with RunCollector() as collector:
+        for case in cases:
+            for _ in range(warmup):
+                _run_case(case, collector, timeout)
+            samples = [_run_case(case, collector, timeout) for _ in range(repeat)]
+            results[case['id']] = {
+                'params': {key: case[key] for key in ('rotation_speed', 'flash_frequency', 'quality', 'engine')},
+                'stages': {stage: round(statistics.median(s['stages'][stage] for s in samples), 4)
+                           for stage in RENDER_STAGES},
+                'total_seconds': round(statistics.median(s['total_seconds'] for s in samples), 4),
+                'samples': repeat,
+            }
+            logger.info(f"基准用例 {case['id']}: 中位数 {results[case['id']]['total_seconds']} 秒")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any],
+            threshold: float, min_delta: float) -> List[Dict[str, Any]]:
+    """返回超出阈值的阶段：当前耗时 > 基线 × (1 + threshold) 且差值 > min_delta 秒；基线中没有的用例不比较"""
+    regressions = []
+    for case_id, result in results.items():
+        reference = baseline.get('cases', {}).get(case_id)
+        if not reference:
+            continue
+        measured = dict(result['stages'], total=result['total_seconds'])
+        expected = dict(reference['stages'], total=reference['total_seconds'])
+        for stage, seconds in measured.items():
+            base = expected.get(stage)
+            if base is None:
+                continue
+            if seconds > base * (1 + threshold) and seconds - base > min_delta:
+                regressions.append({'case': case_id, 'stage': stage, 'baseline': base, 'current': seconds,
+                                    'ratio': round(seconds / base, 2) if base > 0 else None})
+    return regressions
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    """读取基线，不存在时返回空基线"""
+    if not os.path.exists(path):
+        return {'cases': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, Any]], threshold: float, min_delta: float):
+    """把本次结果合并进基线（同 id 的用例被覆盖，其他引擎或档位的用例保留）"""
+    baseline = load_baseline(path)
+    baseline['cases'] = dict(baseline.get('cases', {}), **results)
+    baseline.update(
+        machine=machine_info(),
+        template_hash=scene_manager.get_template_hash(),
+        thresholds={'threshold': threshold, 'min_delta': min_delta},
+        updated_at=time.strftime('%Y-%m-%d %H:%M:%S'),
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _print_table(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]):
+    """各用例各阶段的耗时，有基线时附带基线值"""
+    columns = (*RENDER_STAGES, 'total')
+    print(f"{'case':<28}" + ''.join(f"{column:>20}" for column in columns))
+    for case_id, result in results.items():
+        reference = baseline.get('cases', {}).get(case_id)
+        measured = dict(result['stages'], total=result['total_seconds'])
+        expected = dict(reference['stages'], total=reference['total_seconds']) if reference else {}
+        cells = []
+        for column in columns:
+            cell = f"{measured[column]:.3f}"
+            if column in expected:
+                cell += f" ({expected[column]:.3f})"
+            cells.append(f"{cell:>20}")
+        print(f"{case_id:<28}" + ''.join(cells))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="渲染基准测试：按阶段计时并与 JSON 基线比较")
+    parser.add_argument('--engine', choices=RENDER_ENGINES, default='fast', help="渲染引擎（默认 fast）")
+    parser.add_argument('--quality', default='1,2', help="质量档位：列表 1,2 或网格 1:3（默认 1,2）")
+    parser.add_argument('--repeat', type=int, default=3, help="每个用例计入结果的运行次数（取中位数）")
+    parser.add_argument('--warmup', type=int, default=1, help="每个用例不计入结果的预热次数")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help=f"基线文件（默认 {DEFAULT_BASELINE}）")
+    parser.add_argument('--save', action='store_true', help="把本次结果写入基线而不做比较")
+    parser.add_argument('--threshold', type=float, default=None,
+                        help=f"相对回归阈值（默认取基线中记录的值，否则 {DEFAULT_THRESHOLD}）")
+    parser.add_argument('--min-delta', type=float, default=None,
+                        help=f"绝对差值下限（秒，默认取基线中记录的值，否则 {DEFAULT_MIN_DELTA}）")
+    parser.add_argument('--timeout', type=float, default=1800, help="单次渲染的超时（秒）")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    recorded = baseline.get('thresholds', {})
+    threshold = args.threshold if args.threshold is not None else recorded.get('threshold', DEFAULT_THRESHOLD)
+    min_delta = args.min_delta if args.min_delta is not None else recorded.get('min_delta', DEFAULT_MIN_DELTA)
+
+    cases = build_cases([int(q) for q in parse_values(args.quality)], args.engine)
+    results = run_benchmark(cases, repeat=max(1, args.repeat), warmup=max(0, args.warmup), timeout=args.timeout)
+    _print_table(results, {} if args.save else baseline)
+
+    if args.save:
+        save_baseline(args.baseline, results, threshold, min_delta)
+        print(f"基线已写入: {args.baseline}")
+        return 0
+
+    if not baseline.get('cases'):
+        print(f"基线不存在或为空: {args.baseline}（使用 --save 记录基线）")
+        return 0
+    if baseline.get('machine') and baseline['machine'] != machine_info():
+        print("注意：基线记录于不同的运行环境，比较结果仅供参考")
+    regressions = compare(results, baseline, threshold, min_delta)
+    for item in regressions:
+        print(f"回归: {item['case']} {item['stage']} {item['baseline']:.3f}s -> {item['current']:.3f}s "
+              f"(x{item['ratio']})")
+    print(f"阈值 +{threshold:.0%} 且 > {min_delta}s：{len(regressions)} 项回归")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
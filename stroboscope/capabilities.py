@@ -0,0 +1,132 @@
+"""
+渲染环境能力探测
+启动时探测一次 ffmpeg、Manim、可用渲染器（OpenGL / Cairo）与字体，结果缓存复用，
+仅在配置重新加载时刷新，避免每个任务重复探测或先用 OpenGL 失败再重渲染一遍
+"""
+
+import sys
+import time
+import shutil
+import threading
+import subprocess
+import importlib.util
+from typing import Dict, Any, Optional
+from .utils import config_manager, logger
+
+# 在独立子进程中尝试创建无窗口 OpenGL 上下文，避免驱动问题影响主进程
+OPENGL_PROBE_CODE = (
+    "import moderngl; "
+    "ctx = moderngl.create_standalone_context(); "
+    "print(ctx.info.get('GL_RENDERER', ''))"
+)
+
+
+class CapabilityProbe:
+    """渲染环境能力探测（结果缓存）"""
+
+    def __init__(self):
+        self._result: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        config_manager.add_reload_listener(self.refresh)
+
+    def get(self) -> Dict[str, Any]:
+        """获取探测结果，首次调用时执行探测"""
+        with self._lock:
+            if self._result is not None:
+                return self._result
+        return self.refresh()
+
+    def refresh(self) -> Dict[str, Any]:
+        """重新执行全部探测"""
+        started = time.time()
+        result = {
+            'ffmpeg': self._probe_ffmpeg(),
+            'manim': self._probe_manim(),
+            'renderer': self._probe_renderer(),
+            'font': self._probe_font(),
+        }
+        result['probe_seconds'] = round(time.time() - started, 2)
+        result['probed_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            self._result = result
+        logger.info(
+            f"渲染环境探测完成: ffmpeg={result['ffmpeg']['path']}, "
+            f"renderer={result['renderer']['selected']}, font={result['font']['family']} "
+            f"(可用: {result['font']['available']}), 用时 {result['probe_seconds']}秒"
+        )
+        return result
+
+    def get_ffmpeg_path(self) -> Optional[str]:
+        """ffmpeg 可执行文件路径，未安装时为 None"""
+        return self.get()['ffmpeg']['path']
+
+    def get_renderer(self) -> str:
+        """任务应直接使用的 Manim 渲染器"""
+        return self.get()['renderer']['selected']
+
+    def mark_renderer_failed(self, renderer: str):
+        """运行期间某个渲染器失败后，后续任务不再尝试它（直到下次刷新）"""
+        with self._lock:
+            if self._result and self._result['renderer']['selected'] == renderer and renderer != 'cairo':
+                self._result['renderer']['selected'] = 'cairo'
+                self._result['renderer']['runtime_fallback'] = True
+                logger.warning(f"渲染器 {renderer} 运行失败，后续任务改用 cairo")
+
+    @staticmethod
+    def _probe_ffmpeg() -> Dict[str, Any]:
+        path = shutil.which("ffmpeg")
+        version = None
+        if path:
+            try:
+                output = subprocess.run([path, "-version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        text=True, timeout=10).stdout
+                version = output.splitlines()[0] if output else None
+            except Exception as e:
+                logger.warning(f"获取 ffmpeg 版本失败: {e}")
+        return {'path': path, 'version': version}
+
+    @staticmethod
+    def _probe_manim() -> Dict[str, Any]:
+        # 只检查是否已安装，不在主进程中导入 manim
+        return {'installed': importlib.util.find_spec('manim') is not None}
+
+    @staticmethod
+    def _probe_renderer() -> Dict[str, Any]:
+        """
+        配置 [RENDER] RENDERER 为 opengl / cairo 时直接使用；
+        为 auto（默认）时探测 OpenGL 是否能创建上下文，不能则使用 cairo
+        """
+        configured = config_manager.get('RENDER', 'RENDERER', 'auto').strip().lower()
+        if configured in ('opengl', 'cairo'):
+            return {'configured': configured, 'opengl': None, 'selected': configured}
+
+        opengl_info = {'available': False, 'detail': None}
+        try:
+            result = subprocess.run([sys.executable, "-c", OPENGL_PROBE_CODE], stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, text=True, timeout=30)
+            output = result.stdout.strip()
+            opengl_info['available'] = result.returncode == 0
+            opengl_info['detail'] = output.splitlines()[-1] if output else None
+        except Exception as e:
+            opengl_info['detail'] = str(e)
+        selected = 'opengl' if opengl_info['available'] else 'cairo'
+        return {'configured': configured, 'opengl': opengl_info, 'selected': selected}
+
+    @staticmethod
+    def _probe_font() -> Dict[str, Any]:
+        """通过 fc-list 检查配置的中文字体是否已安装；没有 fc-list（如 Windows）时结果为未知"""
+        family = config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC')
+        fc_list = shutil.which("fc-list")
+        if not fc_list:
+            return {'family': family, 'available': None}
+        try:
+            output = subprocess.run([fc_list, ":", "family"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                    text=True, encoding='utf-8', errors='replace', timeout=15).stdout
+        except Exception as e:
+            logger.warning(f"字体探测失败: {e}")
+            return {'family': family, 'available': None}
+        families = {name.strip().lower() for line in output.splitlines() for name in line.split(',')}
+        return {'family': family, 'available': family.lower() in families}
+
+# 全局实例
+capabilities = CapabilityProbe()
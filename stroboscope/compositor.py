@@ -0,0 +1,184 @@
+"""
+分层合成
+静态背景（圆盘、刻度、标题）每个质量档位只渲染一次并缓存，
+每个任务只渲染透明背景上的指针运动，参数文字由 ffmpeg drawtext 叠加，
+最后由 ffmpeg 一次性合成最终视频
+"""
+
+import os
+import math
+import json
+import hashlib
+from typing import Dict, Any, List, Tuple
+from .utils import config_manager, file_manager
+from .manim_manager import scene_manager
+
+# 与完整模板一致的时间轴（秒）
+MOTION_DURATION = 12        # 指针运动时长
+END_TEXT_START = 14         # 运动结束后等待 2 秒再书写"动画结束"
+END_TEXT_FADE = 1           # 书写动画时长
+TOTAL_DURATION = 16         # 书写完成后再等待 1 秒
+
+# Manim 颜色常量对应的十六进制值
+TEXT_COLORS = {
+    'GRAY': '#888888',
+    'GREEN': '#83C167',
+    'RED': '#FC6255',
+    'YELLOW': '#FFFF00',
+}
+
+# Manim 画面高度为 8 个单位；font_size=48 的文字约占 0.75 个单位
+FRAME_HEIGHT_UNITS = 8.0
+EM_UNITS_PER_FONT_SIZE = 0.75 / 48
+
+
+class LayerCompositor:
+    """分层渲染的背景缓存与 ffmpeg 合成命令构建"""
+
+    def __init__(self):
+        self.layers_dir = os.path.join(file_manager.video_dir, 'layers')
+        os.makedirs(self.layers_dir, exist_ok=True)
+
+    @staticmethod
+    def get_frame_size(quality_setting: Dict[str, Any]) -> Tuple[int, int]:
+        """由质量设置的分辨率（如 "480p"）推算 16:9 的像素尺寸，与 Manim 的 -ql/-qm/-qh 一致"""
+        height = int(str(quality_setting.get('resolution', '480p')).rstrip('p'))
+        width = int(math.ceil(height * 16 / 9 / 2)) * 2
+        return width, height
+
+    def get_background_path(self, quality_level: int) -> str:
+        """背景图层路径：由背景模板、字体与质量设置决定，任一变化都会生成新的背景"""
+        payload = {
+            'template': scene_manager.get_background_template(),
+            'font': config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC'),
+            'quality': scene_manager.get_output_quality_setting(quality_level),
+        }
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        return os.path.join(self.layers_dir, f"background_q{quality_level}_{digest[:16]}.png")
+
+    @staticmethod
+    def _estimate_text_width(text: str, em_px: float) -> float:
+        """粗略估算文字宽度：中文按 1 em，其余字符按 0.55 em"""
+        return sum(em_px if ord(ch) > 0x2E80 else em_px * 0.55 for ch in text)
+
+    def build_text_layers(self, rotation_speed: float, flash_frequency: float, frame_height: int) -> List[Dict[str, Any]]:
+        """
+        生成需要叠加的参数文字（内容、字号与出现时间与完整模板一致）。
+        位置按 Manim 的排版规则近似换算为像素坐标。
+        """
+        px_per_unit = frame_height / FRAME_HEIGHT_UNITS
+
+        def em(font_size: int) -> float:
+            return font_size * EM_UNITS_PER_FONT_SIZE * px_per_unit
+
+        rel = scene_manager.compute_relative_frequency(rotation_speed, flash_frequency)
+        rotation_frequency_hz = rel['rotation_frequency_hz']
+        relative_frequency = rel['fr_raw']
+        if relative_frequency > 0:
+            direction_text = "顺时针"
+        elif relative_frequency < 0:
+            direction_text = "逆时针"
+        else:
+            direction_text = "静止"
+
+        # 标题位于顶部（上边距 0.5 单位），副标题紧随其下
+        subtitle = "旋转速度: %.1f RPM | 闪烁频率: %.1f Hz" % (rotation_speed, flash_frequency)
+        subtitle_y = (0.5 + 36 * EM_UNITS_PER_FONT_SIZE + 0.25) * px_per_unit
+        layers = [{
+            'text': subtitle, 'font_size': em(20), 'color': TEXT_COLORS['GRAY'],
+            'x': '(w-text_w)/2', 'y': subtitle_y, 'start': 0,
+        }]
+
+        # 调试信息在运动结束后出现，左对齐到副标题下方
+        info_lines = [
+            ("旋转: %.1f Hz，闪烁: %.1f Hz，观察: %.2f Hz (%s)" %
+             (rotation_frequency_hz, flash_frequency, abs(relative_frequency), direction_text), 14, 'GREEN'),
+            ("帧运动：旋转%.1fHz，闪烁%.1fHz，相对%.2fHz" %
+             (rotation_frequency_hz, flash_frequency, relative_frequency), 12, 'RED'),
+        ]
+        if flash_frequency != 0:
+            dir_text = "顺时针" if rel['fr'] >= 0 else "逆时针"
+            info_lines.append(("k=%d，单位化频率|fr|=%.3f，方向=%s" % (rel['k'], rel['fr_unit'], dir_text), 12, 'YELLOW'))
+
+        frame_width = int(math.ceil(frame_height * 16 / 9 / 2)) * 2
+        info_x = max(0.0, (frame_width - self._estimate_text_width(subtitle, em(20))) / 2)
+        info_y = subtitle_y + em(20) + 0.25 * px_per_unit
+        for text, font_size, color in info_lines:
+            layers.append({
+                'text': text, 'font_size': em(font_size), 'color': TEXT_COLORS[color],
+                'x': info_x, 'y': info_y, 'start': MOTION_DURATION,
+            })
+            info_y += em(font_size) + 0.1 * px_per_unit
+
+        layers.append({
+            'text': "动画结束", 'font_size': em(32), 'color': TEXT_COLORS['GREEN'],
+            'x': '(w-text_w)/2', 'y': '(h-text_h)/2', 'start': END_TEXT_START, 'fade': END_TEXT_FADE,
+        })
+        return layers
+
+    @staticmethod
+    def _escape_filter_path(path: str) -> str:
+        """转义 ffmpeg 滤镜参数中的路径（兼容 Windows 盘符中的冒号）"""
+        return "'" + path.replace('\\', '/').replace(':', '\\:') + "'"
+
+    def _drawtext_filter(self, layer: Dict[str, Any], text_file: str) -> str:
+        """构建单条 drawtext 滤镜"""
+        font_file = config_manager.get('APP', 'FONT_FILE', '')
+        if font_file:
+            font_option = f"fontfile={self._escape_filter_path(font_file)}"
+        else:
+            font_family = config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC')
+            font_option = f"font='{font_family}'"
+
+        def fmt(value) -> str:
+            return value if isinstance(value, str) else f"{value:.1f}"
+
+        options = [
+            font_option,
+            f"textfile={self._escape_filter_path(text_file)}",
+            "expansion=none",
+            f"fontsize={layer['font_size']:.1f}",
+            f"fontcolor={layer['color']}",
+            f"x={fmt(layer['x'])}",
+            f"y={fmt(layer['y'])}",
+        ]
+        start = layer.get('start', 0)
+        if start > 0:
+            options.append(f"enable='gte(t,{start})'")
+        if layer.get('fade'):
+            options.append(f"alpha='min(1,(t-{start})/{layer['fade']})'")
+        return "drawtext=" + ":".join(options)
+
+    def build_composite_command(self, ffmpeg_path: str, background_path: str, pointer_path: str,
+                                text_layers: List[Dict[str, Any]], fps: int,
+                                output_path: str, work_dir: str, encoder: List[str] = ()) -> List[str]:
+        """
+        构建 ffmpeg 合成命令：背景图循环作为底图，叠加透明指针视频，再绘制参数文字。
+        文字写入 work_dir 下的文本文件，避免在滤镜表达式中转义中文与特殊符号。
+        encoder 为档位的编码参数（见 encoder.encoder_args）
+        """
+        filters = ["[0:v][1:v]overlay=0:0:shortest=1:format=auto"]
+        for index, layer in enumerate(text_layers):
+            text_file = os.path.join(work_dir, f"text_{index}.txt")
+            with open(text_file, 'w', encoding='utf-8') as f:
+                f.write(layer['text'])
+            filters.append(self._drawtext_filter(layer, text_file))
+        filters.append("format=yuv420p")
+
+        return [
+            ffmpeg_path, "-y",
+            "-loop", "1", "-framerate", str(fps), "-i", background_path,
+            "-i", pointer_path,
+            "-filter_complex", ",".join(filters) + "[v]",
+            "-map", "[v]",
+            "-r", str(fps),
+            "-t", str(TOTAL_DURATION),
+            "-c:v", "libx264",
+            "-pix_fmt", "yuv420p",
+            *encoder,
+            "-movflags", "+faststart",
+            output_path,
+        ]
+
+# 全局实例
+layer_compositor = LayerCompositor()
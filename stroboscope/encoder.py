@@ -0,0 +1,76 @@
+"""
+编码参数
+QUALITY_SETTINGS 中每个档位可选的 encoder 配置（x264 预设、CRF、线程数、关键帧间隔），
+转换为 ffmpeg 的输出参数，供快速引擎、分层合成、档位派生与 Manim 输出的重新编码共同使用。
+未配置 encoder 的档位不添加任何参数，保持 ffmpeg / Manim 原有的默认编码。
+Manim 自己编码的输出默认不再处理，只有 [RENDER] MANIM_ENCODER = reencode 时才用这些参数再编码一次。
+"""
+
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger('stroboscope')
+
+X264_PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast',
+                'medium', 'slow', 'slower', 'veryslow', 'placebo')
+X264_TUNES = ('film', 'animation', 'grain', 'stillimage', 'fastdecode', 'zerolatency', 'psnr', 'ssim')
+
+
+def encoder_args(quality_setting: Dict[str, Any], keyframes: bool = True) -> List[str]:
+    """
+    将档位的 encoder 配置转换为 libx264 输出参数：
+    - preset / tune：x264 预设与调优（预览用 ultrafast + zerolatency，成品用 slow 等压缩率更高的预设）
+    - crf：恒定质量（0-51，越大文件越小）
+    - threads：编码线程数（0 为自动）
+    - gop：关键帧间隔（帧）；keyframes 为 False 时忽略（如 HLS 输出需要按分段时长对齐关键帧）
+    无效的取值记录警告后忽略
+    """
+    profile = quality_setting.get('encoder') or {}
+    args = []
+    preset = profile.get('preset')
+    if preset is not None:
+        if preset in X264_PRESETS:
+            args += ["-preset", preset]
+        else:
+            logger.warning(f"忽略无效的编码预设: {preset}")
+    tune = profile.get('tune')
+    if tune is not None:
+        if tune in X264_TUNES:
+            args += ["-tune", tune]
+        else:
+            logger.warning(f"忽略无效的编码调优: {tune}")
+    for key, flag, low, high in (('crf', '-crf', 0, 51), ('threads', '-threads', 0, 64), ('gop', '-g', 1, 10000)):
+        value = profile.get(key)
+        if value is None or (key == 'gop' and not keyframes):
+            continue
+        try:
+            number = float(value) if key == 'crf' else int(value)
+        except (TypeError, ValueError):
+            number = None
+        if number is None or not low <= number <= high:
+            logger.warning(f"忽略无效的编码参数 {key}: {value}")
+            continue
+        args += [flag, f"{number:g}"]
+    return args
+
+
+def build_reencode_command(ffmpeg_path: str, source_path: str, output_path: str,
+                           quality_setting: Dict[str, Any]) -> List[str]:
+    """
+    按档位的编码参数重新编码一个已完成的视频（Manim 0.17 的编码命令不可配置，渲染完成后统一重新编码一次）。
+    只处理视频流；档位未配置 encoder 时返回空列表
+    """
+    args = encoder_args(quality_setting)
+    if not args:
+        return []
+    return [
+        ffmpeg_path, "-y",
+        "-loglevel", "error",
+        "-i", source_path,
+        "-map", "0:v",
+        "-c:v", "libx264",
+        "-pix_fmt", "yuv420p",
+        *args,
+        "-movflags", "+faststart",
+        output_path,
+    ]
@@ -0,0 +1,472 @@
+"""
+快速渲染引擎
+用 NumPy 直接光栅化圆盘、刻度与指针，将原始帧通过管道写入 ffmpeg，
+不启动 Manim 子进程；帧率、fr 与 k 的计算与场景模板一致，适合低延迟预览。
+运动存在周期时只渲染一个周期，用 -stream_loop 循环，末尾的静止画面由 tpad 复制最后一帧生成。
+开启流式输出时，逐帧编码的同时经 tee 输出 HLS 分段与不断增长的播放列表，可边渲染边播放。
+拼图模式在同一画面中按网格绘制多个圆盘，各自按自己的参数运动，一次编码输出。
+预览画面不绘制文字（标题、刻度字母、参数说明与拼图标签）。
+"""
+
+import os
+import math
+import shutil
+import tempfile
+import subprocess
+from fractions import Fraction
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .utils import file_manager, logger
+from .manim_manager import scene_manager
+from .compositor import LayerCompositor
+from .encoder import encoder_args
+
+# 与场景模板一致的几何参数（单位：Manim 场景单位，画面高度为 8）
+FRAME_HEIGHT_UNITS = 8.0
+DISK_RADIUS = 1.8
+MARK_INNER, MARK_OUTER = 1.5, 1.8
+CENTER_DOT_RADIUS = 0.08
+POINTER_LENGTH = 1.4
+TIP_LENGTH = 0.35                  # Manim 默认箭头长度
+TIP_HALF_WIDTH = TIP_LENGTH / 2
+STROKE_UNIT = 0.01                 # Manim 的 stroke_width 换算为场景单位的系数
+
+# 与完整模板一致的时间轴（秒）：运动 12 秒，随后停留 4 秒（等待 + 结束文字）
+MOTION_DURATION = 12
+HOLD_DURATION = 4
+
+# 流式输出的播放列表文件名
+STREAM_PLAYLIST = 'index.m3u8'
+
+# Manim 颜色常量
+BACKGROUND_COLOR = (0x1a, 0x1a, 0x1a)
+BLUE = (0x58, 0xC4, 0xDD)
+WHITE = (0xFF, 0xFF, 0xFF)
+YELLOW = (0xFF, 0xFF, 0x00)
+RED = (0xFC, 0x62, 0x55)
+
+
+def compute_frame_angles(rotation_speed: float, flash_frequency: float, fps: int) -> np.ndarray:
+    """
+    计算每一帧指针的绝对角度（弧度，逆时针为正），与场景模板的时间轴一致：
+    - 闪烁频率为 0：指针按实际角速度连续旋转
+    - 否则：第 i 帧角度为 i * fr * 2π / fps，运动结束后停在第 total_frames 步
+    """
+    motion_frames = int(MOTION_DURATION * fps)
+    hold_frames = int(HOLD_DURATION * fps)
+    frame_index = np.arange(motion_frames, dtype=np.float64)
+    if flash_frequency == 0:
+        angular_speed = rotation_speed * 2 * math.pi / 60
+        motion = angular_speed * frame_index / fps
+        final_angle = angular_speed * MOTION_DURATION
+    else:
+        fr = scene_manager.compute_relative_frequency(rotation_speed, flash_frequency)['fr']
+        angle_per_frame = fr * 2 * math.pi / fps
+        motion = frame_index * angle_per_frame
+        final_angle = motion_frames * angle_per_frame
+    return np.concatenate([motion, np.full(hold_frames, final_angle)])
+
+
+def compute_motion_period(rotation_speed: float, flash_frequency: float, fps: int) -> Optional[int]:
+    """
+    计算指针姿态重复的最小帧数：每帧转过 cycles/fps 圈，化为最简分数 p/q 后周期为 q 帧。
+    指针静止（fr = 0 或转速为 0）时周期为 1；参数无法表示为分母不大的有理数时返回 None。
+    """
+    if flash_frequency == 0:
+        cycles_per_second = rotation_speed / 60
+    else:
+        cycles_per_second = scene_manager.compute_relative_frequency(rotation_speed, flash_frequency)['fr']
+    cycles_fraction = Fraction(cycles_per_second).limit_denominator(10000)
+    if abs(float(cycles_fraction) - cycles_per_second) > 1e-9:
+        return None
+    return (cycles_fraction / fps).denominator
+
+
+def compute_mosaic_period(panels: List[Dict[str, Any]], fps: int) -> Optional[int]:
+    """拼图中所有指针姿态同时重复的最小帧数（各面板周期的最小公倍数），任一面板无周期时返回 None"""
+    periods = [compute_motion_period(panel['rotation_speed'], panel['flash_frequency'], fps) for panel in panels]
+    if None in periods:
+        return None
+    return math.lcm(*periods)
+
+
+def plan_periodic_render(rotation_speed: float, flash_frequency: float, fps: int) -> Dict[str, Any]:
+    """
+    规划快速引擎需要实际渲染的帧：运动存在短于总时长的周期时只渲染一个周期 + 余数 + 停留的单帧
+    （周期为 1 时整段画面静止，只渲染一帧）。
+    返回 {'period', 'loops', 'remainder', 'use_period', 'render_frames'（需要光栅化的帧数）, 'total_frames'}
+    """
+    return _plan_for_period(compute_motion_period(rotation_speed, flash_frequency, fps), fps)
+
+
+def plan_mosaic_render(panels: List[Dict[str, Any]], fps: int) -> Dict[str, Any]:
+    """规划拼图需要实际渲染的帧，返回值同 plan_periodic_render"""
+    return _plan_for_period(compute_mosaic_period(panels, fps), fps)
+
+
+def _plan_for_period(period: Optional[int], fps: int) -> Dict[str, Any]:
+    motion_frames = int(MOTION_DURATION * fps)
+    total_frames = motion_frames + int(HOLD_DURATION * fps)
+    # 一个周期 + 余数片段 + 停留的单帧；只有明显少于逐帧渲染时才走循环拼接
+    loops, remainder = divmod(motion_frames, period) if period else (0, 0)
+    periodic_frames = (period or 0) + remainder + (0 if period == 1 else 1)
+    use_period = period is not None and loops >= 2 and periodic_frames < total_frames
+    return {
+        'period': period,
+        'loops': loops,
+        'remainder': remainder,
+        'use_period': use_period,
+        'render_frames': periodic_frames if use_period else total_frames,
+        'total_frames': total_frames,
+    }
+
+
+class FastRenderer:
+    """NumPy 光栅化渲染器"""
+
+    # 单个圆盘居中、不缩放的布局（格式同 scene_manager.compute_mosaic_layout）
+    SINGLE_LAYOUT = {'scale': 1.0, 'centers': [(0.0, 0.0)]}
+
+    def __init__(self):
+        self._background_cache: Dict[tuple, np.ndarray] = {}
+
+    @staticmethod
+    def _coverage(distance: np.ndarray, px_per_unit: float) -> np.ndarray:
+        """由有符号距离（场景单位，内部为负）计算抗锯齿覆盖率"""
+        return np.clip(0.5 - distance * px_per_unit, 0.0, 1.0)
+
+    @staticmethod
+    def _blend(canvas: np.ndarray, alpha: np.ndarray, color: Tuple[int, int, int]):
+        """按覆盖率将纯色混合到画布上（原地修改）"""
+        canvas += alpha[..., None] * (np.asarray(color, dtype=np.float32) - canvas)
+
+    def _scene_grid(self, x0: int, x1: int, y0: int, y1: int, width: int, height: int) -> Tuple[np.ndarray, np.ndarray, float]:
+        """像素区域对应的场景坐标网格（y 轴向上）"""
+        px_per_unit = height / FRAME_HEIGHT_UNITS
+        xs = (np.arange(x0, x1, dtype=np.float32) + 0.5 - width / 2) / px_per_unit
+        ys = (height / 2 - (np.arange(y0, y1, dtype=np.float32) + 0.5)) / px_per_unit
+        return xs[None, :], ys[:, None], px_per_unit
+
+    @staticmethod
+    def _panel_box(center: Tuple[float, float], radius: float, width: int, height: int) -> Tuple[int, int, int, int]:
+        """以场景坐标 center 为中心、半径 radius（场景单位）的正方形区域对应的像素范围"""
+        ppu = height / FRAME_HEIGHT_UNITS
+        cx, cy = width / 2 + center[0] * ppu, height / 2 - center[1] * ppu
+        half = int(math.ceil(radius * ppu))
+        x0, x1 = max(0, int(cx) - half), min(width, int(cx) + half)
+        y0, y1 = max(0, int(cy) - half), min(height, int(cy) + half)
+        return x0, x1, y0, y1
+
+    def _panel_grid(self, box: Tuple[int, int, int, int], center: Tuple[float, float], scale: float,
+                    width: int, height: int) -> Tuple[np.ndarray, np.ndarray, float]:
+        """像素区域在面板自身坐标系（圆心为原点、未缩放）中的坐标网格与对应的每单位像素数"""
+        x0, x1, y0, y1 = box
+        x, y, ppu = self._scene_grid(x0, x1, y0, y1, width, height)
+        return (x - center[0]) / scale, (y - center[1]) / scale, ppu * scale
+
+    def _render_background(self, width: int, height: int, layout: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """绘制静态部分：背景，以及布局中每个面板的圆盘、四个刻度与中心点（按分辨率与布局缓存）"""
+        layout = layout or self.SINGLE_LAYOUT
+        key = (width, height, layout['scale'], tuple(layout['centers']))
+        if key in self._background_cache:
+            return self._background_cache[key]
+
+        canvas = np.empty((height, width, 3), dtype=np.float32)
+        canvas[:] = BACKGROUND_COLOR
+        for center in layout['centers']:
+            box = self._panel_box(center, (DISK_RADIUS + 0.1) * layout['scale'], width, height)
+            x, y, ppu = self._panel_grid(box, center, layout['scale'], width, height)
+            x0, x1, y0, y1 = box
+            self._draw_disk(canvas[y0:y1, x0:x1], x, y, ppu)
+
+        self._background_cache[key] = canvas
+        return canvas
+
+    def _draw_disk(self, canvas: np.ndarray, x: np.ndarray, y: np.ndarray, ppu: float):
+        """在画布区域上绘制一个圆盘（x, y 为以圆心为原点的坐标网格，原地修改）"""
+        radius = np.sqrt(x * x + y * y)
+
+        # 圆盘填充（不透明度 0.3）与描边
+        self._blend(canvas, 0.3 * self._coverage(radius - DISK_RADIUS, ppu), BLUE)
+        self._blend(canvas, self._coverage(np.abs(radius - DISK_RADIUS) - 3 * STROKE_UNIT / 2, ppu), BLUE)
+
+        # ABCD 刻度线
+        half_width = 4 * STROKE_UNIT / 2
+        for angle in (0, math.pi / 2, math.pi, 3 * math.pi / 2):
+            u = x * math.cos(angle) + y * math.sin(angle)
+            v = -x * math.sin(angle) + y * math.cos(angle)
+            distance = np.maximum(np.abs(v) - half_width, np.maximum(MARK_INNER - u, u - MARK_OUTER))
+            self._blend(canvas, self._coverage(distance, ppu), WHITE)
+
+        # 中心点（指针绘制在其上方）
+        self._blend(canvas, self._coverage(radius - CENTER_DOT_RADIUS, ppu), RED)
+
+    def _pointer_alpha(self, x: np.ndarray, y: np.ndarray, angle: float, ppu: float) -> np.ndarray:
+        """指针（线段 + 三角形箭头）在给定角度下的覆盖率"""
+        u = x * math.cos(angle) + y * math.sin(angle)
+        v = -x * math.sin(angle) + y * math.cos(angle)
+        shaft_end = POINTER_LENGTH - TIP_LENGTH
+        shaft = np.maximum(np.abs(v) - 6 * STROKE_UNIT / 2, np.maximum(-u, u - shaft_end))
+        slope = TIP_HALF_WIDTH / TIP_LENGTH
+        tip = np.maximum(shaft_end - u, (np.abs(v) - (POINTER_LENGTH - u) * slope) / math.sqrt(1 + slope * slope))
+        return self._coverage(np.minimum(shaft, tip), ppu)
+
+    @staticmethod
+    def _escape_tee_path(path: str) -> str:
+        """转义 tee 输出项中的路径（tee 用 : | [ ] 作为分隔符，兼容 Windows 盘符）"""
+        path = path.replace('\\', '/')
+        for ch in ':|[]':
+            path = path.replace(ch, '\\' + ch)
+        return path
+
+    def build_ffmpeg_command(self, ffmpeg_path: str, width: int, height: int, fps: int, output_path: str,
+                             stream_dir: Optional[str] = None, segment_seconds: int = 2,
+                             quality_setting: Optional[Dict[str, Any]] = None, pad_frames: int = 0) -> list[str]:
+        """
+        ffmpeg 从标准输入读取 rgb24 原始帧并编码为 mp4，按 quality_setting 的 encoder 配置设置编码参数。
+        pad_frames 大于 0 时由 tpad 在末尾重复最后一帧 pad_frames 次（静止画面不必逐帧写入管道）。
+        指定 stream_dir 时只编码一次，经 tee 同时写出 mp4 与 HLS（stream_dir/index.m3u8），
+        关键帧间隔与分段时长对齐（忽略 encoder 中的 gop），每个分段完成后播放列表随即更新。
+        """
+        command = [
+            ffmpeg_path, "-y",
+            "-loglevel", "error",
+            "-f", "rawvideo",
+            "-pix_fmt", "rgb24",
+            "-s", f"{width}x{height}",
+            "-r", str(fps),
+            "-i", "-",
+        ]
+        if pad_frames > 0:
+            command += ["-vf", f"tpad=stop_mode=clone:stop={int(pad_frames)}"]
+        command += [
+            "-c:v", "libx264",
+            "-pix_fmt", "yuv420p",
+            *encoder_args(quality_setting or {}, keyframes=not stream_dir),
+        ]
+        if not stream_dir:
+            return command + ["-movflags", "+faststart", output_path]
+
+        gop = str(fps * segment_seconds)
+        segment_pattern = self._escape_tee_path(os.path.join(stream_dir, 'segment_%05d.ts'))
+        playlist_path = self._escape_tee_path(os.path.join(stream_dir, STREAM_PLAYLIST))
+        outputs = (
+            f"[f=mp4:movflags=+faststart]{self._escape_tee_path(output_path)}"
+            f"|[f=hls:hls_time={segment_seconds}:hls_list_size=0:hls_playlist_type=event"
+            f":hls_segment_filename={segment_pattern}]{playlist_path}"
+        )
+        return command + [
+            "-g", gop, "-keyint_min", gop, "-sc_threshold", "0",
+            "-map", "0:v",
+            "-f", "tee", outputs,
+        ]
+
+    def _prepare_canvas(self, width: int, height: int, layout: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """准备静态背景与每个面板的指针重绘区域（指针只可能出现在圆心附近，只重绘这块区域）"""
+        layout = layout or self.SINGLE_LAYOUT
+        background = self._render_background(width, height, layout)
+        pointers = []
+        for center in layout['centers']:
+            box = self._panel_box(center, (POINTER_LENGTH + 0.05) * layout['scale'], width, height)
+            x, y, ppu = self._panel_grid(box, center, layout['scale'], width, height)
+            x0, x1, y0, y1 = box
+            pointers.append({'box': box, 'x': x, 'y': y, 'ppu': ppu,
+                             'background_crop': background[y0:y1, x0:x1]})
+        return {
+            'width': width, 'height': height, 'pointers': pointers,
+            'frame': np.clip(background + 0.5, 0, 255).astype(np.uint8),
+        }
+
+    def _encode_frames(self, angles: np.ndarray, canvas: Dict[str, Any], ffmpeg_path: str, quality_setting: Dict,
+                       output_path: str, on_frame: Optional[Callable[[], None]] = None,
+                       stream_dir: Optional[str] = None, segment_seconds: int = 2, pad_frames: int = 0):
+        """
+        将指针角度逐帧光栅化并编码为 output_path（可同时输出 HLS 到 stream_dir）。
+        angles 的形状为 (帧数, 面板数)，每帧只重绘角度发生变化的面板；pad_frames 见 build_ffmpeg_command
+        """
+        frame = canvas['frame']
+        command = self.build_ffmpeg_command(ffmpeg_path, canvas['width'], canvas['height'],
+                                            int(quality_setting.get('fps', 60)), output_path,
+                                            stream_dir, segment_seconds, quality_setting, pad_frames)
+        logger.info(f"快速渲染ffmpeg命令: {' '.join(command)}")
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            last_angles = [None] * len(canvas['pointers'])
+            frame_bytes = b''
+            for frame_angles in angles:
+                changed = False
+                for index, (pointer, angle) in enumerate(zip(canvas['pointers'], frame_angles)):
+                    if angle == last_angles[index]:
+                        continue
+                    x0, x1, y0, y1 = pointer['box']
+                    crop = pointer['background_crop'].copy()
+                    self._blend(crop, self._pointer_alpha(pointer['x'], pointer['y'], float(angle), pointer['ppu']), YELLOW)
+                    frame[y0:y1, x0:x1] = np.clip(crop + 0.5, 0, 255).astype(np.uint8)
+                    last_angles[index] = angle
+                    changed = True
+                if changed:
+                    frame_bytes = frame.tobytes()
+                process.stdin.write(frame_bytes)
+                if on_frame:
+                    on_frame()
+            process.stdin.close()
+            stderr_output = process.stderr.read().decode('utf-8', errors='replace')
+            process.wait()
+        except Exception:
+            process.kill()
+            process.wait()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+
+        if process.returncode != 0 or not os.path.exists(output_path):
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise Exception(f"快速渲染编码失败 (返回码: {process.returncode}). 输出: {stderr_output}")
+
+    @staticmethod
+    def _run_copy(command: List[str], output_path: str, action: str):
+        """运行流复制的 ffmpeg 命令，失败时抛出异常"""
+        logger.info(f"快速渲染{action}命令: {' '.join(command)}")
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, encoding='utf-8', errors='replace')
+        if result.returncode != 0 or not os.path.exists(output_path):
+            raise Exception(f"快速渲染{action}失败 (返回码: {result.returncode}). 输出: {result.stdout}")
+
+    @classmethod
+    def _loop_segment(cls, ffmpeg_path: str, segment_path: str, loops: int, output_path: str):
+        """用 -stream_loop 将片段重复 loops 次（流复制，时间戳由 ffmpeg 按片段时长顺延）"""
+        cls._run_copy([
+            ffmpeg_path, "-y",
+            "-loglevel", "error",
+            "-stream_loop", str(loops - 1),
+            "-i", segment_path,
+            "-c", "copy",
+            output_path,
+        ], output_path, "循环")
+
+    @classmethod
+    def _concat_segments(cls, ffmpeg_path: str, playlist: List[str], output_path: str, work_dir: str):
+        """用 concat 分离器按顺序拼接片段（流复制，不重新编码）"""
+        list_path = os.path.join(work_dir, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for segment in playlist:
+                f.write("file '%s'\n" % segment.replace('\\', '/').replace("'", "'\\''"))
+        command = [
+            ffmpeg_path, "-y",
+            "-loglevel", "error",
+            "-f", "concat", "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            "-movflags", "+faststart",
+            output_path,
+        ]
+        cls._run_copy(command, output_path, "拼接")
+
+    def render(self, rotation_speed: float, flash_frequency: float, quality_setting: Dict,
+               ffmpeg_path: str, output_path: str,
+               progress_callback: Optional[Callable[[int, int], None]] = None,
+               stream_dir: Optional[str] = None, segment_seconds: int = 2) -> bool:
+        """
+        渲染完整视频到 output_path。
+        指针运动存在短于总时长的周期时，只渲染一个周期，再按流复制循环并拼接末尾片段成完整视频。
+        先写入同目录的临时文件，编码成功后再原子替换，避免前端读到不完整的视频。
+        progress_callback(已完成帧数, 需要渲染的总帧数) 每帧调用一次。
+        指定 stream_dir 且需要逐帧编码完整视频时同时输出 HLS，返回是否输出了 HLS；
+        周期拼接本身很快，不输出 HLS。
+        """
+        width, height = LayerCompositor.get_frame_size(quality_setting)
+        fps = int(quality_setting.get('fps', 60))
+        angles = compute_frame_angles(rotation_speed, flash_frequency, fps)[:, None]
+        plan = plan_periodic_render(rotation_speed, flash_frequency, fps)
+        return self._render_plan(angles, plan, self._prepare_canvas(width, height), ffmpeg_path, quality_setting,
+                                 output_path, progress_callback, stream_dir, segment_seconds)
+
+    def render_mosaic(self, panels: List[Dict[str, Any]], quality_setting: Dict, ffmpeg_path: str, output_path: str,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      stream_dir: Optional[str] = None, segment_seconds: int = 2) -> bool:
+        """
+        拼图模式：按 scene_manager.compute_mosaic_layout 的网格在同一画面中绘制多个圆盘，
+        panels 为 [{'rotation_speed', 'flash_frequency', ...}, ...]；所有面板共用一次编码，
+        运动周期取各面板周期的最小公倍数。参数与返回值同 render
+        """
+        width, height = LayerCompositor.get_frame_size(quality_setting)
+        fps = int(quality_setting.get('fps', 60))
+        angles = np.stack([compute_frame_angles(panel['rotation_speed'], panel['flash_frequency'], fps)
+                           for panel in panels], axis=1)
+        layout = scene_manager.compute_mosaic_layout(len(panels))
+        return self._render_plan(angles, plan_mosaic_render(panels, fps), self._prepare_canvas(width, height, layout),
+                                 ffmpeg_path, quality_setting, output_path, progress_callback, stream_dir,
+                                 segment_seconds)
+
+    def _render_plan(self, angles: np.ndarray, plan: Dict[str, Any], canvas: Dict[str, Any], ffmpeg_path: str,
+                     quality_setting: Dict, output_path: str, progress_callback: Optional[Callable[[int, int], None]],
+                     stream_dir: Optional[str], segment_seconds: int) -> bool:
+        """
+        按渲染规划逐帧编码或只编码一个周期后循环拼接，angles 形状为 (帧数, 面板数)。
+        周期片段只编码一次，由 -stream_loop 重复；余数帧与停留画面合为一个末尾片段（停留画面由 tpad 复制最后一帧），
+        两者再用 concat 流复制拼接，拼接列表只有两项。周期为 1 时整段画面静止，一帧加 tpad 直接得到完整视频。
+        各片段使用同一套编码参数，且都从关键帧开始，拼接后不再重新编码
+        """
+        fps = int(quality_setting.get('fps', 60))
+        motion_frames = int(MOTION_DURATION * fps)
+        hold_frames = len(angles) - motion_frames
+        tmp_path = f"{output_path}.part.mp4"
+        period, loops, remainder = plan['period'], plan['loops'], plan['remainder']
+        use_period = plan['use_period']
+
+        rendered = 0
+        total_work = plan['render_frames'] if use_period else len(angles)
+
+        def on_frame():
+            nonlocal rendered
+            rendered += 1
+            if progress_callback:
+                progress_callback(rendered, total_work)
+
+        if not use_period:
+            if stream_dir:
+                os.makedirs(stream_dir, exist_ok=True)
+            self._encode_frames(angles, canvas, ffmpeg_path, quality_setting, tmp_path, on_frame,
+                                stream_dir, segment_seconds)
+            os.replace(tmp_path, output_path)
+            return bool(stream_dir)
+
+        logger.info(f"检测到运动周期 {period} 帧，循环 {loops} 次 + 余数 {remainder} 帧，共需渲染 {total_work} 帧")
+        if period == 1:
+            # 画面完全静止：整段视频只需要这一帧
+            try:
+                self._encode_frames(angles[:1], canvas, ffmpeg_path, quality_setting, tmp_path, on_frame,
+                                    pad_frames=len(angles) - 1)
+                os.replace(tmp_path, output_path)
+                return False
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        work_dir = tempfile.mkdtemp(prefix='fast_', dir=file_manager.temp_dir)
+        try:
+            period_path = os.path.join(work_dir, 'period.mp4')
+            self._encode_frames(angles[:period], canvas, ffmpeg_path, quality_setting, period_path, on_frame)
+            looped_path = os.path.join(work_dir, 'looped.mp4')
+            self._loop_segment(ffmpeg_path, period_path, loops, looped_path)
+            playlist = [looped_path]
+            # 末尾片段：余数帧（与周期开头的姿态相同）+ 停留画面
+            tail_angles = angles[:remainder]
+            if hold_frames:
+                tail_angles = np.concatenate([tail_angles, angles[-1:]])
+            if len(tail_angles):
+                tail_path = os.path.join(work_dir, 'tail.mp4')
+                self._encode_frames(tail_angles, canvas, ffmpeg_path, quality_setting, tail_path, on_frame,
+                                    pad_frames=max(0, hold_frames - 1))
+                playlist.append(tail_path)
+            self._concat_segments(ffmpeg_path, playlist, tmp_path, work_dir)
+            os.replace(tmp_path, output_path)
+            return False
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+# 全局实例
+fast_renderer = FastRenderer()
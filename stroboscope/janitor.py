@@ -0,0 +1,97 @@
+"""
+后台磁盘预算清理
+按 [CLEANUP] MAX_TEMP_FILES（产物数量）与 MAX_DISK_MB（总字节数）预算，
+从产物索引中按最近访问时间淘汰最久未用的产物（LRU），跳过排队中或渲染中任务的产物。
+任务视频与其缓存文件互为硬链接，按一个产物计数并一起淘汰。
+每轮最多删除一批，只查询索引，不扫描目录，不阻塞请求。
+"""
+
+import threading
+from typing import Optional
+from .utils import config_manager, file_manager, progress_monitor, logger
+
+# 参与预算与淘汰的产物类型（分层背景长期复用，不淘汰）
+EVICTABLE_KINDS = ('video', 'cache', 'stream', 'scratch')
+
+# 一批删除后仍超出预算时，隔多久继续下一批（秒）
+BACKLOG_PAUSE_SECONDS = 1.0
+
+
+class ArtifactJanitor:
+    """后台 LRU 清理线程"""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self.load_config()
+        config_manager.add_reload_listener(self.load_config)
+
+    def load_config(self):
+        """读取预算配置；0 表示不限制"""
+        self.max_files = int(config_manager.get('CLEANUP', 'MAX_TEMP_FILES', '50'))
+        self.max_bytes = int(float(config_manager.get('CLEANUP', 'MAX_DISK_MB', '2048')) * 1024 * 1024)
+        self.interval = float(config_manager.get('CLEANUP', 'JANITOR_INTERVAL_SECONDS', '30'))
+        self.batch_size = max(1, int(config_manager.get('CLEANUP', 'JANITOR_BATCH_SIZE', '20')))
+
+    def start(self):
+        """启动后台线程（重复调用无副作用）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="artifact-janitor", daemon=True)
+        self._thread.start()
+        logger.info(f"磁盘预算清理已启动: 最多 {self.max_files} 个产物, {self.max_bytes // (1024 * 1024)} MB, "
+                    f"每 {self.interval:g} 秒检查一次")
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def wake(self):
+        """有新产物登记后提前触发一次检查"""
+        self._wakeup.set()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                deleted, over_budget = self.run_once()
+            except Exception as e:
+                logger.error(f"磁盘预算清理失败: {e}")
+                deleted, over_budget = 0, False
+            # 仍超出预算且本批有进展时尽快继续，否则等待下一个周期或新产物
+            timeout = BACKLOG_PAUSE_SECONDS if (over_budget and deleted) else self.interval
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def run_once(self):
+        """
+        执行一批淘汰，返回 (删除数量, 本批之后是否仍超出预算)。
+        超出预算的部分按最近访问时间从旧到新删除，最多删除 batch_size 个
+        """
+        count, size = file_manager.artifact_index.usage(EVICTABLE_KINDS)
+        excess_files = count - self.max_files if self.max_files > 0 else 0
+        excess_bytes = size - self.max_bytes if self.max_bytes > 0 else 0
+        if excess_files <= 0 and excess_bytes <= 0:
+            return 0, False
+
+        candidates = file_manager.artifact_index.least_recently_used(
+            EVICTABLE_KINDS, exclude_job_ids=progress_monitor.active_job_ids(), limit=self.batch_size
+        )
+        selected = []
+        for entry in candidates:
+            if excess_files <= 0 and excess_bytes <= 0:
+                break
+            selected += entry['paths']
+            excess_files -= 1
+            excess_bytes -= entry['size']
+        if not selected:
+            return 0, True
+
+        deleted = file_manager.artifact_index.delete(selected)
+        logger.info(f"磁盘预算清理: 淘汰 {deleted} 个最久未用的产物"
+                    f"（剩余超出 {max(excess_files, 0)} 个 / {max(excess_bytes, 0) // 1024} KB）")
+        return deleted, excess_files > 0 or excess_bytes > 0
+
+# 全局实例
+artifact_janitor = ArtifactJanitor()
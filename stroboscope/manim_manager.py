@@ -4,15 +4,33 @@ Manim场景管理器
 """
 
 import os
+import math
 import uuid
-from typing import Dict, Any
+import hashlib
+from typing import Dict, Any, List
 from .utils import config_manager, file_manager, logger
 
+# 质量设置中不影响输出画面的字段
+NON_OUTPUT_QUALITY_KEYS = ('name', 'time_estimate', 'timeout')
+
+# 拼图模式：画面尺寸（场景单位，与 Manim 默认 16:9 画面一致）、顶部标题区高度，
+# 以及单个圆盘面板未缩放时的宽高（圆盘、ABCD 标签与下方的参数标签）
+MOSAIC_FRAME_HEIGHT = 8.0
+MOSAIC_FRAME_WIDTH = MOSAIC_FRAME_HEIGHT * 16 / 9
+MOSAIC_TITLE_HEIGHT = 0.9
+MOSAIC_PANEL_WIDTH = 4.6
+MOSAIC_PANEL_HEIGHT = 5.2
+
 class ManimSceneManager:
     """Manim场景管理器"""
     
     def __init__(self):
         self.scene_template = self.load_scene_template()
+        self.load_config()
+        config_manager.add_reload_listener(self.load_config)
+
+    def load_config(self):
+        """读取质量档位（分辨率、帧率、超时与 encoder 参数），配置重新加载后对新任务生效"""
         self.quality_settings = config_manager.get_quality_settings()
     
     def load_scene_template(self) -> str:
@@ -161,12 +179,26 @@ class StroboscopicEffectDynamic(Scene):
             # 计算总帧数
             total_frames = int(total_animation_time * fps)
             
-            # 一帧一帧地运动：在同一指针上累计旋转
-            for _ in range(total_frames):
-                self.play(
-                    Rotate(rotating_pointer, angle=angle_per_frame, about_point=ORIGIN, run_time=frame_duration),
-                    rate_func=linear
-                )
+            # 一帧一帧地运动：用单个随时间推进的帧计数器驱动指针，
+            # 第 i 帧的绝对角度为 i * angle_per_frame，与逐帧 play 的输出一致，
+            # 但只有一次 play 调用（一个分段视频），耗时不再随 play 次数线性增长
+            frame_tracker = ValueTracker(0)
+            pointer_start = rotating_pointer.copy()
+            
+            def step_pointer(mob):
+                frame_index = int(np.floor(frame_tracker.get_value() + 1e-6))
+                mob.become(pointer_start.copy().rotate(frame_index * angle_per_frame, about_point=ORIGIN))
+            
+            rotating_pointer.add_updater(step_pointer)
+            # 计数器在 t = i/fps 时恰好为 i；时长取 (total_frames - 0.5) 帧，保证正好输出 total_frames 帧
+            self.play(
+                frame_tracker.animate.set_value(total_frames - 0.5),
+                run_time=(total_frames - 0.5) * frame_duration,
+                rate_func=linear
+            )
+            rotating_pointer.remove_updater(step_pointer)
+            # 停在第 total_frames 步的位置，与逐帧累计旋转的终点一致
+            rotating_pointer.become(pointer_start.copy().rotate(total_frames * angle_per_frame, about_point=ORIGIN))
 
         # 将调试信息分组，统一放置在副标题下方，竖向排列，避免底部重叠
         info_group = VGroup(debug_info, test_info)
@@ -185,37 +217,311 @@ class StroboscopicEffectDynamic(Scene):
         self.wait(1)
 """
     
-    def generate_scene_file(self, rotation_speed: float, flash_frequency: float, quality_level: int) -> tuple[str, str]:
-        """生成场景文件"""
+    def get_background_template(self) -> str:
+        """分层渲染：静态背景模板（圆盘、刻度、标题与底部说明），每个质量档位只需渲染一帧"""
+        return """
+from manim import *
+import numpy as np
+
+class StroboscopeBackground(Scene):
+    def construct(self):
+        self.camera.background_color = "#1a1a1a"
+        
+        circle_radius = 1.8
+        disk = Circle(radius=circle_radius, color=BLUE, fill_opacity=0.3, stroke_width=3)
+        
+        marks = VGroup()
+        labels = VGroup()
+        positions = [
+            (0, "A"),
+            (PI/2, "B"),
+            (PI, "C"),
+            (3*PI/2, "D")
+        ]
+        for angle, label_text in positions:
+            start_point = 1.5 * np.array([np.cos(angle), np.sin(angle), 0])
+            end_point = 1.8 * np.array([np.cos(angle), np.sin(angle), 0])
+            marks.add(Line(start_point, end_point, color=WHITE, stroke_width=4))
+            label_pos = 1.9 * np.array([np.cos(angle), np.sin(angle), 0])
+            labels.add(Text(label_text, font_size=24, color=YELLOW).move_to(label_pos))
+        
+        center_dot = Dot(radius=0.08, color=RED)
+        title = Text("频闪效应模拟", font_size=36, color=WHITE, font="{font_family_placeholder}").to_edge(UP)
+        explanation = Text("观察指针在频闪下的视觉效果 - 圆盘静止，指针旋转", font_size=20, color=YELLOW, font="{font_family_placeholder}").to_edge(DOWN)
+        self.add(title, disk, marks, labels, center_dot, explanation)
+"""
+
+    def get_pointer_template(self) -> str:
+        """分层渲染：透明背景上只绘制指针运动，时间轴与完整模板保持一致"""
+        return """
+from manim import *
+import numpy as np
+
+class StroboscopePointer(Scene):
+    def construct(self):
+        pointer = Line(ORIGIN, 1.4 * RIGHT, color=YELLOW, stroke_width=6)
+        pointer.add_tip()
+        rotating_pointer = VGroup(pointer)
+        self.add(rotating_pointer)
+        
+        rotation_speed_rpm = {rotation_speed_rpm_placeholder}
+        flash_frequency_hz = {flash_frequency_hz_placeholder}
+        total_animation_time = 12  # 动画时长
+        angular_speed = rotation_speed_rpm * 2 * PI / 60
+        
+        if flash_frequency_hz == 0:
+            self.play(
+                Rotate(rotating_pointer, angle=angular_speed * total_animation_time, 
+                       about_point=ORIGIN, run_time=total_animation_time),
+                rate_func=linear
+            )
+        else:
+            rotation_frequency_hz = rotation_speed_rpm / 60
+            fr_raw = flash_frequency_hz - rotation_frequency_hz
+            sign_dir = 1 if fr_raw >= 0 else -1
+            k = int(np.floor(abs(fr_raw)))
+            fr = sign_dir * (abs(fr_raw) - k)
+            
+            fps = config.frame_rate
+            frame_duration = 1.0 / fps
+            angle_per_frame = fr * 2 * PI * frame_duration
+            total_frames = int(total_animation_time * fps)
+            frame_tracker = ValueTracker(0)
+            pointer_start = rotating_pointer.copy()
+            
+            def step_pointer(mob):
+                frame_index = int(np.floor(frame_tracker.get_value() + 1e-6))
+                mob.become(pointer_start.copy().rotate(frame_index * angle_per_frame, about_point=ORIGIN))
+            
+            rotating_pointer.add_updater(step_pointer)
+            self.play(
+                frame_tracker.animate.set_value(total_frames - 0.5),
+                run_time=(total_frames - 0.5) * frame_duration,
+                rate_func=linear
+            )
+            rotating_pointer.remove_updater(step_pointer)
+            rotating_pointer.become(pointer_start.copy().rotate(total_frames * angle_per_frame, about_point=ORIGIN))
+        
+        # 与完整模板的结尾对齐：等待 2 秒 + 结束文字书写 1 秒 + 等待 1 秒
+        self.wait(4)
+"""
+
+    def get_mosaic_template(self) -> str:
+        """拼图模式：一个画面中按网格排列多个圆盘，各自使用自己的 (N, r) 与标签，共用同一时间轴"""
+        return """
+from manim import *
+import numpy as np
+
+# (旋转速度 RPM, 闪烁频率 Hz, 标签, 圆心 x, 圆心 y)
+PANELS = {panels_placeholder}
+PANEL_SCALE = {scale_placeholder}
+
+class StroboscopeMosaic(Scene):
+    def construct(self):
+        self.camera.background_color = "#1a1a1a"
+        title = Text("频闪效应对比", font_size=32, color=WHITE, font="{font_family_placeholder}").to_edge(UP, buff=0.25)
+        self.add(title)
+        
+        total_animation_time = 12  # 动画时长
+        fps = config.frame_rate
+        total_frames = int(total_animation_time * fps)
+        frame_tracker = ValueTracker(0)
+        pointers = []
+        
+        for rotation_speed_rpm, flash_frequency_hz, label_text, cx, cy in PANELS:
+            center = np.array([cx, cy, 0])
+            disk = Circle(radius=1.8, color=BLUE, fill_opacity=0.3, stroke_width=3)
+            marks = VGroup()
+            labels = VGroup()
+            for angle, mark_text in [(0, "A"), (PI/2, "B"), (PI, "C"), (3*PI/2, "D")]:
+                start_point = 1.5 * np.array([np.cos(angle), np.sin(angle), 0])
+                end_point = 1.8 * np.array([np.cos(angle), np.sin(angle), 0])
+                marks.add(Line(start_point, end_point, color=WHITE, stroke_width=4))
+                label_pos = 1.9 * np.array([np.cos(angle), np.sin(angle), 0])
+                labels.add(Text(mark_text, font_size=24, color=YELLOW).move_to(label_pos))
+            center_dot = Dot(radius=0.08, color=RED)
+            caption = Text(label_text, font_size=26, color=GRAY, font="{font_family_placeholder}")
+            caption.next_to(disk, DOWN, buff=0.45)
+            panel = VGroup(disk, marks, labels, center_dot, caption)
+            panel.scale(PANEL_SCALE, about_point=ORIGIN).shift(center)
+            self.add(panel)
+            
+            pointer = Line(ORIGIN, 1.4 * RIGHT, color=YELLOW, stroke_width=6)
+            pointer.add_tip()
+            rotating_pointer = VGroup(pointer).scale(PANEL_SCALE, about_point=ORIGIN).shift(center)
+            self.add(rotating_pointer)
+            
+            # 与完整模板一致：r = 0 时按实际角速度连续旋转，否则按相对频率 fr 逐帧运动
+            if flash_frequency_hz == 0:
+                angle_per_frame = rotation_speed_rpm * 2 * PI / 60 / fps
+            else:
+                rotation_frequency_hz = rotation_speed_rpm / 60
+                fr_raw = flash_frequency_hz - rotation_frequency_hz
+                sign_dir = 1 if fr_raw >= 0 else -1
+                k = int(np.floor(abs(fr_raw)))
+                fr = sign_dir * (abs(fr_raw) - k)
+                angle_per_frame = fr * 2 * PI / fps
+            pointers.append((rotating_pointer, rotating_pointer.copy(), angle_per_frame, center))
+        
+        # 所有指针由同一个帧计数器驱动，整个拼图只有一次 play
+        def make_updater(pointer_start, angle_per_frame, center):
+            def step_pointer(mob):
+                frame_index = int(np.floor(frame_tracker.get_value() + 1e-6))
+                mob.become(pointer_start.copy().rotate(frame_index * angle_per_frame, about_point=center))
+            return step_pointer
+        
+        updaters = []
+        for rotating_pointer, pointer_start, angle_per_frame, center in pointers:
+            updater = make_updater(pointer_start, angle_per_frame, center)
+            rotating_pointer.add_updater(updater)
+            updaters.append(updater)
+        self.play(
+            frame_tracker.animate.set_value(total_frames - 0.5),
+            run_time=(total_frames - 0.5) / fps,
+            rate_func=linear
+        )
+        for (rotating_pointer, pointer_start, angle_per_frame, center), updater in zip(pointers, updaters):
+            rotating_pointer.remove_updater(updater)
+            rotating_pointer.become(pointer_start.copy().rotate(total_frames * angle_per_frame, about_point=center))
+        
+        # 与完整模板的总时长对齐：运动 12 秒后停留 4 秒
+        self.wait(4)
+"""
+
+    @staticmethod
+    def compute_mosaic_layout(count: int) -> Dict[str, Any]:
+        """
+        拼图模式的网格布局（场景单位，原点在画面中心，y 轴向上）：
+        列数取 ceil(sqrt(count))，面板按行排列，最后一行不满时居中；
+        返回 {'cols', 'rows', 'scale'（面板缩放比例）, 'centers'（各圆盘圆心 (x, y)）}。
+        Manim 模板与快速引擎共用这一布局
+        """
+        if count < 1:
+            raise ValueError("拼图至少需要一个面板")
+        cols = int(math.ceil(math.sqrt(count)))
+        rows = int(math.ceil(count / cols))
+        cell_width = MOSAIC_FRAME_WIDTH / cols
+        cell_height = (MOSAIC_FRAME_HEIGHT - MOSAIC_TITLE_HEIGHT) / rows
+        scale = min(1.0, cell_width / MOSAIC_PANEL_WIDTH, cell_height / MOSAIC_PANEL_HEIGHT)
+        top = MOSAIC_FRAME_HEIGHT / 2 - MOSAIC_TITLE_HEIGHT
+        # 圆盘在单元格内略微上移，给下方的参数标签留出位置
+        disk_offset = (MOSAIC_PANEL_HEIGHT / 2 - MOSAIC_PANEL_WIDTH / 2) * scale
+        centers = []
+        for index in range(count):
+            row, col = divmod(index, cols)
+            in_row = min(cols, count - row * cols)
+            x = (col - (in_row - 1) / 2) * cell_width
+            y = top - (row + 0.5) * cell_height + disk_offset
+            centers.append((round(x, 4), round(y, 4)))
+        return {'cols': cols, 'rows': rows, 'scale': round(scale, 4), 'centers': centers}
+
+    @staticmethod
+    def compute_relative_frequency(rotation_speed: float, flash_frequency: float) -> Dict[str, Any]:
+        """按模板中的相对频率逐帧法计算 fr、k 与方向（供模板之外的渲染路径复用）"""
+        rotation_frequency_hz = rotation_speed / 60
+        fr_raw = flash_frequency - rotation_frequency_hz
+        sign_dir = 1 if fr_raw >= 0 else -1
+        k = int(math.floor(abs(fr_raw)))
+        fr_unit = abs(fr_raw) - k
+        return {
+            'rotation_frequency_hz': rotation_frequency_hz,
+            'fr_raw': fr_raw,
+            'k': k,
+            'fr_unit': fr_unit,
+            'fr': sign_dir * fr_unit,
+        }
+
+    def generate_layer_scene_file(self, layer: str, rotation_speed: float, flash_frequency: float) -> tuple[str, str]:
+        """生成分层渲染使用的场景文件，layer 为 'background' 或 'pointer'"""
+        templates = {
+            'background': self.get_background_template,
+            'pointer': self.get_pointer_template,
+        }
+        if layer not in templates:
+            raise ValueError(f"未知的渲染图层: {layer}")
         unique_id = str(uuid.uuid4())
+        font_family = config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC')
+        scene_code = templates[layer]().format(
+            rotation_speed_rpm_placeholder=rotation_speed,
+            flash_frequency_hz_placeholder=flash_frequency,
+            font_family_placeholder=font_family
+        )
+        
+        filename = f"manim_scene_{layer}_{unique_id}.py"
+        file_path = os.path.join(file_manager.scenes_dir, filename)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(scene_code)
         
+        logger.info(f"生成图层场景文件: {filename}")
+        return unique_id, file_path
+
+    def build_scene_code(self, rotation_speed: float, flash_frequency: float) -> str:
+        """加载模板并填入参数，返回场景代码"""
         # 关键：每次生成前刷新模板，避免进程热更新后缓存的旧模板仍含有花括号格式
         self.scene_template = self.load_scene_template()
         
         # 替换模板中的参数
         # 从配置读取中文字体，默认 Noto Sans CJK SC（需在服务器安装）
         font_family = config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC')
-        scene_code = self.scene_template.format(
+        return self.scene_template.format(
             rotation_speed_rpm_placeholder=rotation_speed,
             flash_frequency_hz_placeholder=flash_frequency,
             font_family_placeholder=font_family
         )
-        
-        # 生成文件路径
-        filename = f"manim_scene_{unique_id}.py"
+    
+    def build_mosaic_scene_code(self, panels: List[Dict[str, Any]]) -> str:
+        """按网格布局填入各面板参数，返回拼图场景代码；panels 为 [{'rotation_speed', 'flash_frequency', 'label'}, ...]"""
+        layout = self.compute_mosaic_layout(len(panels))
+        font_family = config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC')
+        panel_rows = [
+            (float(panel['rotation_speed']), float(panel['flash_frequency']), str(panel['label']), x, y)
+            for panel, (x, y) in zip(panels, layout['centers'])
+        ]
+        return self.get_mosaic_template().format(
+            panels_placeholder=repr(panel_rows),
+            scale_placeholder=layout['scale'],
+            font_family_placeholder=font_family
+        )
+    
+    def write_scene_file(self, scene_code: str, prefix: str = "manim_scene") -> tuple[str, str]:
+        """将场景代码写入场景目录，返回 (场景 ID, 文件路径)"""
+        unique_id = str(uuid.uuid4())
+        filename = f"{prefix}_{unique_id}.py"
         file_path = os.path.join(file_manager.scenes_dir, filename)
-        
-        # 写入文件
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(scene_code)
         
         logger.info(f"生成场景文件: {filename}")
         return unique_id, file_path
     
+    def generate_scene_file(self, rotation_speed: float, flash_frequency: float, quality_level: int) -> tuple[str, str]:
+        """生成场景文件"""
+        return self.write_scene_file(self.build_scene_code(rotation_speed, flash_frequency))
+    
+    def generate_mosaic_scene_file(self, panels: List[Dict[str, Any]]) -> tuple[str, str]:
+        """生成拼图场景文件"""
+        return self.write_scene_file(self.build_mosaic_scene_code(panels), "manim_scene_mosaic")
+
+    def get_template_hash(self) -> str:
+        """当前场景模板内容的哈希（模板变化后旧缓存自动失效）"""
+        # 与 load_scene_template 相同的查找顺序，但不输出日志，避免每个请求刷屏
+        template_path = os.path.join(file_manager.scenes_dir, "manim_template.py")
+        if os.path.exists(template_path):
+            with open(template_path, 'r', encoding='utf-8') as f:
+                template = f.read()
+        else:
+            template = self.get_default_template()
+        return hashlib.sha256(template.encode('utf-8')).hexdigest()
+
     def get_quality_setting(self, quality_level: int) -> Dict[str, Any]:
         """获取质量设置"""
         return self.quality_settings.get(str(quality_level), self.quality_settings["1"])
     
+    def get_output_quality_setting(self, quality_level: int) -> Dict[str, Any]:
+        """只包含影响输出画面的质量字段（用于缓存键），名称、预估时间、超时等不计入"""
+        setting = self.get_quality_setting(quality_level)
+        return {k: v for k, v in setting.items() if k not in NON_OUTPUT_QUALITY_KEYS}
+    
     def cleanup_scene_file(self, file_path: str):
         """清理场景文件"""
         try:
@@ -0,0 +1,107 @@
+"""
+常驻 Manim 工作进程
+只导入一次 manim / numpy / cairo / pango，之后循环从标准输入读取渲染任务（每行一个 JSON），
+通过标准输出逐行返回 JSON 事件：ready / progress / done / error。
+
+本文件以脚本方式启动（python manim_worker.py），不导入 stroboscope 包，
+避免在工作进程中重复初始化配置、日志与渲染引擎。
+"""
+
+import os
+import sys
+import json
+import time
+import importlib.util
+
+
+def _open_protocol_stream():
+    """
+    复制原始标准输出作为协议通道，并把文件描述符 1 重定向到标准错误，
+    这样 Manim / rich 打印的日志不会混入协议输出。
+    """
+    protocol_fd = os.dup(1)
+    os.dup2(2, 1)
+    sys.stdout = os.fdopen(1, 'w', encoding='utf-8', errors='replace', buffering=1)
+    return os.fdopen(protocol_fd, 'w', encoding='utf-8', buffering=1)
+
+
+def _emit(stream, event: str, **payload):
+    """发送一条事件"""
+    payload['event'] = event
+    stream.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    stream.flush()
+
+
+def _load_scene_class(scene_file: str, scene_class: str):
+    """按文件路径加载场景模块（每个任务使用独立的模块名，互不干扰）"""
+    module_name = os.path.splitext(os.path.basename(scene_file))[0]
+    spec = importlib.util.spec_from_file_location(module_name, scene_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, scene_class)
+
+
+def _render_job(job: dict, stream):
+    """渲染单个任务，并在渲染过程中按帧上报进度"""
+    from manim import tempconfig
+
+    job_id = job['job_id']
+    scene_cls = _load_scene_class(job['scene_file'], job['scene_class'])
+    overrides = {
+        'input_file': job['scene_file'],
+        'media_dir': job['media_dir'],
+        'output_file': job['output_file'],
+        'quality': job['quality'],
+        'frame_rate': job['fps'],
+        'renderer': job.get('renderer', 'cairo'),
+        'format': job.get('format', 'mp4'),
+        'disable_caching': True,
+        'progress_bar': 'none',
+        'write_to_movie': True,
+    }
+    progress_interval = float(job.get('progress_interval', 0.2))
+
+    with tempconfig(overrides):
+        scene = scene_cls()
+        renderer = scene.renderer
+        original_add_frame = renderer.add_frame
+        state = {'frames': 0, 'last_emit': 0.0}
+
+        def add_frame(frame, num_frames=1):
+            original_add_frame(frame, num_frames)
+            state['frames'] += num_frames
+            now = time.monotonic()
+            if now - state['last_emit'] >= progress_interval:
+                state['last_emit'] = now
+                _emit(stream, 'progress', job_id=job_id, frames=state['frames'])
+
+        renderer.add_frame = add_frame
+        scene.render()
+        output_path = str(renderer.file_writer.movie_file_path)
+
+    _emit(stream, 'done', job_id=job_id, frames=state['frames'], output=output_path)
+
+
+def main():
+    stream = _open_protocol_stream()
+    # 预先导入 manim，后续任务不再付出启动成本
+    import manim  # noqa: F401
+    _emit(stream, 'ready', pid=os.getpid())
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError as e:
+            _emit(stream, 'error', job_id=None, message=f"无效的任务: {e}")
+            continue
+        try:
+            _render_job(job, stream)
+        except Exception as e:
+            _emit(stream, 'error', job_id=job.get('job_id'), message=f"{type(e).__name__}: {e}")
+
+
+if __name__ == '__main__':
+    main()
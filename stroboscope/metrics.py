@@ -0,0 +1,135 @@
+"""
+运行指标
+进程内的计数器、仪表与直方图，由 /metrics 以 Prometheus 文本格式（0.0.4）输出，
+供本机采集器抓取做容量规划；不依赖 prometheus_client。
+所有指标在 METRIC_DEFINITIONS 中预先声明，未声明的指标名会被忽略并记录警告。
+渲染引擎与产物索引在写入路径上更新全局实例 metrics；队列深度与并发数由 /metrics 在抓取时读取。
+"""
+
+import math
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+# 渲染耗时直方图的桶（秒）
+DURATION_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+# Manim 渲染峰值内存直方图的桶（字节）
+RSS_BUCKETS = tuple(mb * 1024 * 1024 for mb in (128, 256, 512, 768, 1024, 1536, 2048, 4096))
+
+# 指标名 -> (类型, 说明, 直方图的桶)
+METRIC_DEFINITIONS = {
+    'stroboscope_queue_depth': ('gauge', "排队等待的渲染任务数", None),
+    'stroboscope_active_renders': ('gauge', "正在渲染的任务数", None),
+    'stroboscope_render_duration_seconds': ('histogram', "成功渲染的执行耗时（不含排队），按质量档位与渲染方式", DURATION_BUCKETS),
+    'stroboscope_render_failures_total': ('counter', "失败的渲染任务数，按原因", None),
+    'stroboscope_renderer_fallbacks_total': ('counter', "渲染器运行失败后改用其他渲染器重试的次数", None),
+    'stroboscope_artifact_bytes_written_total': ('counter', "登记的渲染产物字节数，按产物类型", None),
+    'stroboscope_cleanup_bytes_deleted_total': ('counter', "清理删除的渲染产物字节数", None),
+    'stroboscope_manim_peak_rss_bytes': ('histogram', "每个 Manim 渲染任务的峰值常驻内存（RSS），按调用方式", RSS_BUCKETS),
+    'stroboscope_manim_peak_rss_max_bytes': ('gauge', "启动以来 Manim 渲染任务峰值常驻内存的最大值，按调用方式", None),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+logger = logging.getLogger('stroboscope')
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+def _escape(value: str) -> str:
+    """标签值中的反斜杠、换行与双引号需要转义"""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """线程安全的指标登记表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Dict[str, object]]] = {}
+
+    def _definition(self, name: str, expected_type: Tuple[str, ...]):
+        definition = METRIC_DEFINITIONS.get(name)
+        if definition is None or definition[0] not in expected_type:
+            logger.warning(f"未声明或类型不符的指标: {name}")
+            return None
+        return definition
+
+    def inc(self, name: str, amount: float = 1.0, labels: Optional[Dict[str, str]] = None):
+        """计数器增加 amount"""
+        if amount < 0 or not self._definition(name, ('counter',)):
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        """设置仪表的当前值"""
+        if not self._definition(name, ('gauge',)):
+            return
+        with self._lock:
+            self._values.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def set_max(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        """仪表只在新值更大时更新（记录峰值）"""
+        if not self._definition(name, ('gauge',)):
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = max(series.get(key, float(value)), float(value))
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        """直方图记录一个观测值"""
+        definition = self._definition(name, ('histogram',))
+        if not definition:
+            return
+        buckets = definition[2]
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            state = series.setdefault(_label_key(labels), {'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self) -> str:
+        """按 Prometheus 文本格式输出全部已声明的指标（没有样本的无标签计数器与仪表输出 0）"""
+        lines = []
+        with self._lock:
+            for name, (metric_type, help_text, buckets) in METRIC_DEFINITIONS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                if metric_type == 'histogram':
+                    for key, state in sorted(self._histograms.get(name, {}).items()):
+                        for bound, count in zip(buckets, state['counts']):
+                            lines.append(f"{name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {count}")
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {state['count']}")
+                        lines.append(f"{name}_sum{_format_labels(key)} {_format_value(state['sum'])}")
+                        lines.append(f"{name}_count{_format_labels(key)} {state['count']}")
+                    continue
+                series = self._values.get(name) or {(): 0.0}
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+# 全局实例
+metrics = MetricsRegistry()
@@ -0,0 +1,76 @@
+"""
+Manim 进度输出读取
+Manim 的 tqdm 进度条用回车符 \\r 原地重绘，按行读取文本时往往要等到换行才能拿到一大段拼接的输出。
+这里直接读取原始字节流，按 \\r 与 \\n 切分，逐段解析动画序号、帧数与百分比。
+"""
+
+import re
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+# 单次读取的字节数；os 管道有多少数据就返回多少，不等待凑满
+READ_CHUNK_SIZE = 4096
+# 未遇到分隔符时最多缓存的字节数，超出后按一段处理，避免异常输出占用内存
+MAX_SEGMENT_BYTES = 64 * 1024
+
+# tqdm 默认格式：'Animation 0: Rotate...:  45%|████▌     | 123/270 [00:02<00:03, 45.20it/s]'
+TQDM_REGEX = re.compile(r"(?:Animation\s+(\d+).*?)?(\d+)%\|.*?\|\s*(\d+)/(\d+)")
+# 旧格式：'[00:00:01/00:00:12] 45% Playing Animation: ...' 与 'Progress: 45%'
+DETAILED_REGEX = re.compile(r"\[\d{2}:\d{2}:\d{2}/\d{2}:\d{2}:\d{2}\]\s+(\d+)%\s+Playing Animation")
+SIMPLE_REGEX = re.compile(r"Progress:\s*(\d+)%")
+# 段分隔符：\r\n 视为换行，单独的 \r 为进度条重绘
+SEPARATOR_REGEX = re.compile(rb"\r\n|\r|\n")
+
+
+def iter_segments(stream: BinaryIO) -> Iterator[Tuple[str, bool]]:
+    """
+    逐段读取原始字节流，产出 (文本, 是否为进度条重绘段)。
+    以 \\r 结尾的段是进度条的中间状态，以 \\n 结尾的段是完整的一行
+    """
+    buffer = b""
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+        # 末尾的 \r 可能是被读取边界截断的 \r\n，留到下一次读取再判断
+        end = len(buffer) - 1 if buffer.endswith(b"\r") else len(buffer)
+        start = yield from _split_segments(buffer, end)
+        buffer = buffer[start:]
+        if len(buffer) > MAX_SEGMENT_BYTES:
+            yield buffer.decode('utf-8', errors='replace'), False
+            buffer = b""
+    start = yield from _split_segments(buffer, len(buffer))
+    if buffer[start:]:
+        yield buffer[start:].decode('utf-8', errors='replace'), False
+
+
+def _split_segments(buffer: bytes, end: int) -> Iterator[Tuple[str, bool]]:
+    """产出 buffer[:end] 中以分隔符结尾的各段，返回未处理部分的起始位置"""
+    start = 0
+    for match in SEPARATOR_REGEX.finditer(buffer, 0, end):
+        segment = buffer[start:match.start()]
+        start = match.end()
+        if segment:
+            yield segment.decode('utf-8', errors='replace'), match.group() == b"\r"
+    return start
+
+
+def parse_progress(segment: str) -> Optional[Dict[str, Any]]:
+    """
+    解析一段输出中的进度；不是进度输出时返回 None。
+    返回 {'percentage', 'animation'（第几个 play/wait，从 0 开始）, 'frame'（当前动画已渲染帧数）, 'total_frames'}，
+    旧格式只有百分比，其余字段为 None
+    """
+    match = TQDM_REGEX.search(segment)
+    if match:
+        animation, percentage, frame, total = match.groups()
+        return {
+            'percentage': int(percentage),
+            'animation': int(animation) if animation is not None else None,
+            'frame': int(frame),
+            'total_frames': int(total),
+        }
+    match = DETAILED_REGEX.search(segment) or SIMPLE_REGEX.search(segment)
+    if match:
+        return {'percentage': int(match.group(1)), 'animation': None, 'frame': None, 'total_frames': None}
+    return None
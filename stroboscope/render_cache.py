@@ -0,0 +1,134 @@
+"""
+渲染结果缓存
+按参数、场景模板、字体与质量设置计算内容地址，缓存渲染好的 mp4，
+并合并正在渲染中的相同请求
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from .utils import config_manager, file_manager, logger
+from .manim_manager import scene_manager
+
+class RenderCache:
+    """渲染结果缓存（内容寻址）"""
+    
+    def __init__(self):
+        self.cache_dir = os.path.join(file_manager.video_dir, 'cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._inflight: Dict[str, List[str]] = {} # 缓存键 -> [正在渲染的任务, 等待该结果的重复请求...]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(value: float) -> str:
+        """统一数值格式，避免 30 / 30.0 / "30.000" 产生不同的键"""
+        return f"{float(value):.6f}"
+
+    def make_key(self, rotation_speed: float, flash_frequency: float, quality_level: int,
+                 engine: str = 'manim') -> str:
+        """根据渲染参数与渲染环境（模板、字体、质量、渲染引擎与流水线）计算缓存键"""
+        payload = {
+            'rotation_speed_rpm': self._normalize(rotation_speed),
+            'flash_frequency_hz': self._normalize(flash_frequency),
+            'template': scene_manager.get_template_hash(),
+            'font': config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC'),
+            'quality': scene_manager.get_output_quality_setting(quality_level),
+            'engine': engine,
+            'pipeline': config_manager.get('RENDER', 'PIPELINE', 'full').strip().lower(),
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def make_mosaic_key(self, panels: List[Dict], quality_level: int, engine: str = 'manim') -> str:
+        """拼图模式的缓存键：面板参数与标签按顺序计入，模板取拼图模板"""
+        payload = {
+            'mosaic': [[self._normalize(panel['rotation_speed']), self._normalize(panel['flash_frequency']),
+                        panel['label']] for panel in panels],
+            'template': hashlib.sha256(scene_manager.get_mosaic_template().encode('utf-8')).hexdigest(),
+            'font': config_manager.get('APP', 'FONT_FAMILY', 'Noto Sans CJK SC'),
+            'quality': scene_manager.get_output_quality_setting(quality_level),
+            'engine': engine,
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_cache_path(self, key: str) -> str:
+        """缓存文件路径"""
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def lookup(self, key: str) -> Optional[str]:
+        """查找已缓存的视频，不存在时返回 None"""
+        path = self.get_cache_path(key)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            return path
+        return None
+
+    def claim(self, key: str, unique_id: str) -> Optional[str]:
+        """
+        申请渲染某个缓存键。
+        若相同的渲染已在进行中，将当前任务登记为等待者并返回正在执行的任务 unique_id；
+        否则登记当前任务为执行者并返回 None。
+        """
+        with self._lock:
+            waiting = self._inflight.get(key)
+            if waiting:
+                waiting.append(unique_id)
+                return waiting[0]
+            self._inflight[key] = [unique_id]
+            return None
+
+    def try_claim(self, key: str, unique_id: str) -> bool:
+        """仅在没有任务渲染该缓存键时登记当前任务为执行者（不会登记为等待者），返回是否申请成功"""
+        with self._lock:
+            if self._inflight.get(key):
+                return False
+            self._inflight[key] = [unique_id]
+            return True
+
+    def get_waiters(self, key: str, unique_id: str) -> List[str]:
+        """返回等待 unique_id 渲染结果的重复请求"""
+        with self._lock:
+            waiting = self._inflight.get(key)
+            if waiting and waiting[0] == unique_id:
+                return list(waiting[1:])
+            return []
+
+    def remove_waiter(self, unique_id: str) -> bool:
+        """取消等待：将重复请求从等待列表中移除，返回其是否确实在等待"""
+        with self._lock:
+            for waiting in self._inflight.values():
+                if unique_id in waiting[1:]:
+                    waiting.remove(unique_id)
+                    return True
+            return False
+
+    def release(self, key: str, unique_id: str):
+        """释放渲染申请（渲染结束或入队失败时调用）"""
+        with self._lock:
+            waiting = self._inflight.get(key)
+            if waiting and waiting[0] == unique_id:
+                del self._inflight[key]
+
+    def store(self, key: str, video_path: str) -> Optional[str]:
+        """将渲染结果存入缓存，优先使用硬链接避免复制整个文件"""
+        cache_path = self.get_cache_path(key)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            try:
+                os.link(video_path, tmp_path)
+            except OSError:
+                shutil.copy2(video_path, tmp_path)
+            os.replace(tmp_path, cache_path)
+            logger.info(f"渲染结果已写入缓存: {os.path.basename(cache_path)}")
+            return cache_path
+        except Exception as e:
+            logger.warning(f"写入渲染缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+# 全局实例
+render_cache = RenderCache()
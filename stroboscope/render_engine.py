@@ -8,90 +8,1080 @@
 import os
 import sys
 import subprocess
+import heapq
 import threading
+import queue
 import time
 import shutil
-import re # 导入正则表达式模块
-from typing import Dict, Any, Optional
-from .utils import config_manager, file_manager, progress_monitor, logger
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from .utils import config_manager, file_manager, progress_monitor, logger, new_process_group_kwargs, kill_process_tree, JobOutputLog, process_peak_rss, reset_peak_rss
 
 # 确保导入 scene_manager
 from .manim_manager import scene_manager
+from .render_cache import render_cache
+from .compositor import layer_compositor
+from .fast_renderer import fast_renderer, plan_periodic_render, plan_mosaic_render, STREAM_PLAYLIST
+from .render_history import render_history, parse_time_estimate
+from .worker_pool import manim_worker_pool, WarmWorkerError, QUALITY_FLAG_NAMES
+from .capabilities import capabilities
+from .progress_reader import iter_segments, parse_progress
+from .janitor import artifact_janitor
+from .metrics import metrics
+from .encoder import encoder_args, build_reencode_command
+from .tiers import top_quality_level, derivable_levels, build_derive_command
+
+# 可选的渲染引擎：manim 为完整场景渲染，fast 为 NumPy 光栅化预览（无文字）
+RENDER_ENGINES = ('manim', 'fast')
+
+# 最新请求优先模式下最多记录的会话数
+MAX_TRACKED_SESSIONS = 1000
+
+# 任务各阶段的名称（按执行顺序），耗时累计在渲染记录的 stages 中，供基准测试比较
+RENDER_STAGES = ('scene_generation', 'subprocess_startup', 'frame_rendering', 'encoding', 'finalization', 'cleanup')
+# 进入这些阶段时在任务时间线上记录的瞬时事件
+STAGE_EVENTS = {'frame_rendering': 'first_frame', 'finalization': 'encode_finish'}
+
+# 拼图面板标签的最大长度
+MOSAIC_LABEL_MAX_LENGTH = 40
+
+# Manim 质量标志对应的像素高度（决定输出子目录名，如 720p30）
+MANIM_QUALITY_HEIGHTS = {'-ql': 480, '-qm': 720, '-qh': 1080, '-qp': 1440, '-qk': 2160}
+
+class RenderCancelled(Exception):
+    """任务已被取消或已超时，渲染线程应尽快结束"""
 
 class RenderEngine:
-    """渲染引擎"""
+    """渲染引擎
+
+    渲染请求先进入有界队列，再由固定数量的工作线程并发执行 Manim 渲染；
+    每个任务的状态按 unique_id 单独记录在 progress_monitor 中。
+    """
     
     def __init__(self):
-        self.is_rendering = False
-        self.current_thread = None
-        self._lock = threading.Lock() # 添加一个锁来保护 is_rendering
+        self.max_workers = max(1, int(config_manager.get('RENDER', 'WORKERS', '2')))
+        self.max_queue_size = max(1, int(config_manager.get('RENDER', 'MAX_QUEUE_SIZE', '20')))
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=self.max_queue_size)
+        self._workers: list[threading.Thread] = []
+        self._active_jobs = 0
+        self._lock = threading.Lock() # 保护工作线程列表与活动任务计数
+        self._background_locks: Dict[int, threading.Lock] = {}
+        self._pending: Dict[str, Tuple[str, ...]] = {} # 排队或渲染中的任务 -> 其负责写入的缓存键
+        self._stopped: Dict[str, Tuple[str, str]] = {} # 被取消/超时的任务 -> (cancelled|timeout, 原因)
+        self._job_processes: Dict[str, list] = {} # 任务 -> 正在运行的子进程
+        self._job_runs: Dict[str, Dict[str, Any]] = {} # 执行中的任务 -> 渲染记录（阶段计时）
+        self._run_listeners = [] # 任务结束后接收渲染记录的回调（基准测试等）
+        self._session_jobs: "OrderedDict[str, str]" = OrderedDict() # 会话 -> 最近提交的任务
+        self.load_config()
+        config_manager.add_reload_listener(self.load_config)
+
+    def load_config(self):
+        """读取按任务生效的渲染配置（配置重新加载时再次调用）；WORKERS 与 MAX_QUEUE_SIZE 只在启动时读取"""
+        # full: 每个任务完整渲染整个场景；layered: 背景缓存 + 指针图层 + 文字叠加
+        self.pipeline = config_manager.get('RENDER', 'PIPELINE', 'full').strip().lower()
+        self.default_engine = config_manager.get('RENDER', 'ENGINE', 'manim').strip().lower()
+        # subprocess: 每个任务启动一次 manim；warm: 使用常驻工作进程（失败时回退到 subprocess）
+        self.manim_mode = config_manager.get('RENDER', 'MANIM_MODE', 'subprocess').strip().lower()
+        # Manim 输出是否应用档位的 encoder：off（保持 Manim 默认编码）或 reencode（渲染完成后再用 ffmpeg 编码一次）
+        self.manim_encoder = config_manager.get('RENDER', 'MANIM_ENCODER', 'off').strip().lower()
+        # 同一会话提交新任务时自动取消该会话尚未完成的旧任务
+        self.latest_wins = config_manager.get('RENDER', 'LATEST_WINS', 'false').lower() == 'true'
+        # 快速引擎逐帧编码时同时输出 HLS 分段，前端可在第一个分段完成后开始播放
+        self.streaming = config_manager.get('RENDER', 'STREAMING', 'false').lower() == 'true'
+        self.stream_segment_seconds = max(1, int(config_manager.get('RENDER', 'STREAM_SEGMENT_SECONDS', '2')))
+        # Manim 进度发布到状态的最小间隔（秒）：进度条每帧重绘一次，限频后再通知 /status 与 /events
+        self.progress_interval = float(config_manager.get('RENDER', 'PROGRESS_INTERVAL_SECONDS', '0.2'))
+        # 拼图模式一次渲染最多包含的面板数
+        self.mosaic_max_panels = max(1, int(config_manager.get('RENDER', 'MOSAIC_MAX_PANELS', '9')))
+        # 派生模式：只渲染最高档，其余档位由其抽帧缩放得到并各自写入缓存
+        self.derive_tiers = config_manager.get('RENDER', 'DERIVE_TIERS', 'false').lower() == 'true'
     
     def is_busy(self) -> bool:
-        """检查是否正在渲染 (线程安全)"""
+        """检查是否有任务正在渲染或排队 (线程安全)"""
+        with self._lock:
+            return self._active_jobs > 0 or not self._queue.empty()
+
+    def active_count(self) -> int:
+        """正在渲染的任务数"""
+        with self._lock:
+            return self._active_jobs
+
+    def queue_depth(self) -> int:
+        """排队等待的任务数"""
+        return self._queue.qsize()
+
+    def _ensure_workers(self):
+        """按需启动工作线程（懒启动，避免导入模块时就创建线程）"""
         with self._lock:
-            return self.is_rendering
+            self._workers = [t for t in self._workers if t.is_alive()]
+            for index in range(len(self._workers), self.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"ManimRenderWorker-{index}", # 命名线程便于调试
+                    daemon=True # 设置为守护线程，主程序退出时会强制停止
+                )
+                worker.start()
+                self._workers.append(worker)
 
-    def _set_rendering_status(self, status: bool):
-        """设置渲染状态 (线程安全)"""
+    def ensure_capacity(self, workers: int):
+        """将并发渲染数提高到至少 workers（批量任务使用），不会减少已有的工作线程"""
         with self._lock:
-            self.is_rendering = status
+            self.max_workers = max(self.max_workers, int(workers))
+        self._ensure_workers()
+
+    def _worker_loop(self):
+        """工作线程：从队列中依次取出任务执行"""
+        while True:
+            job_args = self._queue.get()
+            with self._lock:
+                self._active_jobs += 1
+            try:
+                self._render_thread(*job_args)
+            except Exception as e:
+                # _render_thread 内部已处理异常，这里只防止工作线程意外退出
+                logger.error(f"渲染工作线程异常: {e}")
+            finally:
+                with self._lock:
+                    self._active_jobs -= 1
+                self._queue.task_done()
 
     def render_animation(self, rotation_speed: float, flash_frequency: float, 
-                        quality_level: int, unique_id: str) -> bool:
-        """渲染动画"""
-        if self.is_busy():
-            logger.warning("渲染任务正在进行中，请稍候...")
-            return False
-        
+                        quality_level: int, unique_id: str, engine: str = None,
+                        session_id: str = None, use_cache: bool = True, derive_tiers: bool = None) -> bool:
+        """
+        提交渲染任务；队列已满时返回 False。
+        相同参数已有缓存时直接完成；相同渲染正在进行时等待其结果而不重复渲染。
+        engine 为 None 时使用配置中的默认引擎。
+        开启 LATEST_WINS 且提供 session_id 时，先取消该会话之前尚未完成的任务。
+        use_cache 为 False 时不查找、不合并也不写入缓存，总是完整渲染一次（基准测试使用）。
+        derive_tiers 为 True 时按派生模式渲染（见 _plan_derivation），为 None 时使用配置 DERIVE_TIERS；
+        派生模式依赖缓存，use_cache 为 False 时不生效。
+        """
+        engine = self._resolve_engine(engine)
+        cache_key = render_cache.make_key(rotation_speed, flash_frequency, quality_level, engine) if use_cache else None
+        derive = self.derive_tiers if derive_tiers is None else derive_tiers
+        return self._submit(rotation_speed, flash_frequency, quality_level, unique_id, engine, session_id, cache_key,
+                            derive=bool(derive and cache_key))
+
+    def render_mosaic(self, panels: List[Dict[str, Any]], quality_level: int, unique_id: str,
+                      engine: str = None, session_id: str = None) -> bool:
+        """
+        提交拼图渲染任务：panels 中的每组 (rotation_speed, flash_frequency, label) 各占网格中的一个圆盘，
+        在同一个场景中一次渲染完成。缓存、排队、取消与状态查询与单个参数的任务相同
+        """
+        engine = self._resolve_engine(engine)
+        panels = self.normalize_panels(panels)
+        cache_key = render_cache.make_mosaic_key(panels, quality_level, engine)
+        return self._submit(None, None, quality_level, unique_id, engine, session_id, cache_key, panels)
+
+    def normalize_panels(self, panels: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """校验拼图面板并统一为 [{'rotation_speed', 'flash_frequency', 'label'}]，未给标签时用参数作为标签"""
+        if not panels or len(panels) > self.mosaic_max_panels:
+            raise ValueError(f"拼图面板数量必须在 1-{self.mosaic_max_panels} 之间")
+        normalized = []
+        for panel in panels:
+            rotation_speed = float(panel['rotation_speed'])
+            flash_frequency = float(panel['flash_frequency'])
+            label = str(panel.get('label') or f"N={rotation_speed:g} RPM, r={flash_frequency:g} Hz")
+            normalized.append({
+                'rotation_speed': rotation_speed,
+                'flash_frequency': flash_frequency,
+                'label': label[:MOSAIC_LABEL_MAX_LENGTH],
+            })
+        return normalized
+
+    def _resolve_engine(self, engine: Optional[str]) -> str:
+        """规范引擎名称，未指定时使用配置中的默认引擎"""
+        engine = (engine or self.default_engine).lower()
+        if engine not in RENDER_ENGINES:
+            raise ValueError(f"未知的渲染引擎: {engine}")
+        return engine
+
+    def _submit(self, rotation_speed: Optional[float], flash_frequency: Optional[float], quality_level: int,
+                unique_id: str, engine: str, session_id: Optional[str], cache_key: Optional[str],
+                panels: Optional[List[Dict[str, Any]]] = None, derive: bool = False) -> bool:
+        """命中缓存、合并相同渲染或入队；拼图任务的 rotation_speed / flash_frequency 为 None"""
+        if session_id and self.latest_wins:
+            self._supersede_session_job(session_id, unique_id)
         # 获取质量设置
         quality_setting = scene_manager.get_quality_setting(quality_level)
         estimated_time = quality_setting.get('time_estimate', '未知')
+        predicted_seconds, from_history = self._predict_job_seconds(rotation_speed, flash_frequency, quality_level,
+                                                                    engine, panels)
+        if from_history:
+            estimated_time = f"约{predicted_seconds:.0f}秒"
         
-        # 启动渲染线程
-        # 设置渲染状态为 True
-        self._set_rendering_status(True) 
-        self.current_thread = threading.Thread(
-            target=self._render_thread,
-            args=(rotation_speed, flash_frequency, quality_level, unique_id, estimated_time),
-            name=f"ManimRenderThread-{unique_id}" # 命名线程便于调试
-        )
-        self.current_thread.daemon = True # 设置为守护线程，主程序退出时会强制停止
-        self.current_thread.start()
+        cached_path = render_cache.lookup(cache_key) if cache_key else None
+        if cached_path:
+            progress_monitor.register_job(unique_id, estimated_time)
+            progress_monitor.add_span(unique_id, 'cache_hit', time.time(), args={'cache_key': cache_key})
+            file_manager.register_video(unique_id, cached_path) # 同时刷新缓存文件的访问时间
+            progress_monitor.finish_render(success=True, unique_id=unique_id)
+            logger.info(f"命中渲染缓存: {unique_id} -> {os.path.basename(cached_path)}")
+            return True
+        
+        leader_id = render_cache.claim(cache_key, unique_id) if cache_key else None
+        if leader_id is not None:
+            progress_monitor.link_job(unique_id, leader_id)
+            logger.info(f"相同渲染正在进行，任务 {unique_id} 等待 {leader_id} 的结果")
+            return True
+        
+        plan = self._plan_derivation(rotation_speed, flash_frequency, quality_level, unique_id, engine) \
+            if derive else None
+        if plan and plan['source'] is None and plan['top'] != quality_level:
+            # 实际渲染的是最高档，按最高档预测耗时
+            predicted_seconds, from_history = self._predict_job_seconds(rotation_speed, flash_frequency, plan['top'],
+                                                                        engine, panels)
+            if from_history:
+                estimated_time = f"约{predicted_seconds:.0f}秒"
+        owned_keys = tuple(key for key in (cache_key, *(plan['keys'].values() if plan else ())) if key)
+        
+        job_args = (rotation_speed, flash_frequency, quality_level, unique_id, estimated_time, cache_key, engine, panels,
+                    plan)
+        progress_monitor.register_job(unique_id, estimated_time, predicted_seconds)
+        with self._lock:
+            self._pending[unique_id] = owned_keys
+        try:
+            self._queue.put_nowait(job_args)
+        except queue.Full:
+            with self._lock:
+                self._pending.pop(unique_id, None)
+            for key in owned_keys:
+                render_cache.release(key, unique_id)
+            progress_monitor.finish_render(success=False, error='渲染队列已满', unique_id=unique_id)
+            metrics.inc('stroboscope_render_failures_total', labels={'cause': 'queue_full'})
+            logger.warning(f"渲染队列已满 ({self.max_queue_size})，拒绝任务: {unique_id}")
+            return False
         
+        self._ensure_workers()
+        logger.info(f"渲染任务已入队: {unique_id} (排队 {self.queue_depth()} / 并发 {self.max_workers})")
         return True
     
+    def _plan_derivation(self, rotation_speed: float, flash_frequency: float, quality_level: int,
+                         unique_id: str, engine: str) -> Optional[Dict[str, Any]]:
+        """
+        规划派生模式的任务（调用时本任务已申请到所请求档位的缓存键）：
+        - 最高档已有缓存：不渲染，直接由缓存视频派生所请求的档位（source 为缓存路径）；
+        - 否则渲染最高档，并一并派生其余尚未缓存、也没有其他任务在渲染的档位；
+        - 所请求的档位无法派生、最高档正由其他任务渲染或没有需要派生的档位时返回 None，按普通任务渲染。
+        返回 {'top': 最高档, 'source': 已缓存的最高档视频或 None, 'keys': {档位: 缓存键}}，
+        keys 为本任务另外申请到、需要写入的档位（不含所请求的档位）
+        """
+        top = top_quality_level()
+        levels = derivable_levels(top)
+        if quality_level != top and quality_level not in levels:
+            return None
+        keys = {}
+        source = None
+        if quality_level != top:
+            top_key = render_cache.make_key(rotation_speed, flash_frequency, top, engine)
+            source = render_cache.lookup(top_key)
+            if source is None:
+                if not render_cache.try_claim(top_key, unique_id):
+                    return None
+                keys[top] = top_key
+        if source is None:
+            for level in levels:
+                if level == quality_level:
+                    continue
+                key = render_cache.make_key(rotation_speed, flash_frequency, level, engine)
+                if render_cache.lookup(key) is None and render_cache.try_claim(key, unique_id):
+                    keys[level] = key
+            if not keys:
+                return None
+        logger.info(f"派生模式: 任务 {unique_id} 档位 {quality_level}，"
+                    f"{'由已缓存的最高档派生' if source else f'渲染最高档 {top}'}，另外写入档位 {sorted(keys)}")
+        return {'top': top, 'source': source, 'keys': keys}
+
+    def _render_variant(self, engine: str, mosaic: bool = False) -> str:
+        """任务将采用的渲染方式，渲染历史按此分组；拼图任务单独分组（mosaic/...），不使用分层合成"""
+        if engine == 'fast':
+            variant = 'fast'
+        elif self.pipeline == 'layered' and not mosaic:
+            variant = 'layered'
+        elif self.manim_mode == 'warm':
+            variant = 'warm'
+        else:
+            variant = f"full/{capabilities.get_renderer()}"
+        return f"mosaic/{variant}" if mosaic else variant
+
+    def _job_frames(self, rotation_speed: float, flash_frequency: float, quality_level: int, engine: str,
+                    panels: Optional[List[Dict[str, Any]]] = None) -> Tuple[int, int]:
+        """任务的帧率与实际需要渲染的帧数（快速引擎按运动周期只渲染一部分帧）"""
+        fps = int(scene_manager.get_quality_setting(quality_level).get('fps', 60))
+        if engine == 'fast' and panels:
+            return fps, plan_mosaic_render(panels, fps)['render_frames']
+        if engine == 'fast':
+            return fps, plan_periodic_render(rotation_speed, flash_frequency, fps)['render_frames']
+        return fps, self._expected_scene_frames(fps)
+
+    @staticmethod
+    def _frame_pixels(quality_level: int) -> int:
+        """质量档位每帧的像素数（宽 × 高）"""
+        width, height = layer_compositor.get_frame_size(scene_manager.get_quality_setting(quality_level))
+        return width * height
+
+    def _predict_job_seconds(self, rotation_speed: float, flash_frequency: float, quality_level: int,
+                             engine: str, panels: Optional[List[Dict[str, Any]]] = None) -> Tuple[Optional[float], bool]:
+        """返回 (预测耗时, 是否来自渲染历史)；没有历史时按 time_estimate 估算"""
+        _, frames = self._job_frames(rotation_speed, flash_frequency, quality_level, engine, panels)
+        predicted = render_history.predict_duration(engine, self._render_variant(engine, bool(panels)),
+                                                    quality_level, frames, pixels=self._frame_pixels(quality_level))
+        if predicted is not None:
+            return predicted, True
+        return parse_time_estimate(scene_manager.get_quality_setting(quality_level).get('time_estimate', '')), False
+
+    def estimate_job_seconds(self, rotation_speed: float, flash_frequency: float, quality_level: int,
+                             engine: str = None) -> Optional[float]:
+        """预测任务的执行耗时（秒，不含排队），供状态 ETA 与调度使用"""
+        engine = (engine or self.default_engine).lower()
+        return self._predict_job_seconds(rotation_speed, flash_frequency, quality_level, engine)[0]
+
+    @staticmethod
+    def _remaining_seconds(job: Dict[str, Any], now: float) -> Optional[float]:
+        """
+        渲染中任务的剩余耗时：按预测耗时减去已用时间，并按当前进度外推，
+        进度越靠后越信任外推结果
+        """
+        elapsed = now - job['start_time'] if job.get('start_time') else 0.0
+        predicted = job.get('predicted_seconds')
+        by_model = max(0.0, predicted - elapsed) if predicted is not None else None
+        fraction = job.get('progress', 0) / 100
+        if fraction >= 0.1 and elapsed > 0:
+            by_progress = elapsed * (1 - fraction) / fraction
+            return by_progress if by_model is None else fraction * by_progress + (1 - fraction) * by_model
+        return by_model
+
+    def estimate_queue_wait(self, queued_time: float) -> float:
+        """
+        预测某个时刻入队的任务还需排队多久：按各工作线程的剩余耗时，
+        把排在它前面的任务依次分配给最早空闲的工作线程
+        """
+        now = time.time()
+        jobs = progress_monitor.active_jobs()
+        slots = [self._remaining_seconds(job, now) or 0.0 for job in jobs if job['state'] == 'running']
+        slots = sorted(slots)[:self.max_workers] + [0.0] * max(0, self.max_workers - len(slots))
+        heapq.heapify(slots)
+        for job in jobs:
+            if job['state'] == 'queued' and job['queued_time'] < queued_time:
+                heapq.heappush(slots, heapq.heappop(slots) + (job.get('predicted_seconds') or 0.0))
+        return slots[0]
+
+    def eta_fields(self, status: Dict[str, Any]) -> Dict[str, Any]:
+        """状态中的数值 ETA：eta_seconds 为预计还需多少秒完成，queue_wait_seconds 为预计排队时间"""
+        if status['state'] == 'running':
+            remaining = self._remaining_seconds(status, time.time())
+            return {'eta_seconds': round(remaining, 1) if remaining is not None else None, 'queue_wait_seconds': 0.0}
+        if status['state'] == 'queued':
+            wait = self.estimate_queue_wait(status['queued_time'])
+            predicted = status.get('predicted_seconds')
+            eta = wait + predicted if predicted is not None else None
+            return {'eta_seconds': round(eta, 1) if eta is not None else None, 'queue_wait_seconds': round(wait, 1)}
+        return {'eta_seconds': 0.0 if status['state'] == 'done' else None, 'queue_wait_seconds': None}
+
+    def _record_run(self, run: Dict[str, Any]):
+        """把结束的任务写入渲染历史（取消的任务不记录）"""
+        if run.get('success') is None or 'start' not in run:
+            return
+        end = time.time()
+        render_start = run.get('render_start', run['start'])
+        render_end = run.get('render_end', end)
+        run.update(
+            queue_seconds=run['start'] - run['queued_time'] if run.get('queued_time') else None,
+            prepare_seconds=render_start - run['start'],
+            render_seconds=render_end - render_start,
+            finalize_seconds=end - render_end,
+            total_seconds=end - run['start'],
+        )
+        render_history.record(run)
+        if run['success']:
+            metrics.observe('stroboscope_render_duration_seconds', run['total_seconds'],
+                            labels={'quality': str(run['quality_level']), 'renderer': run['variant']})
+        for listener in list(self._run_listeners):
+            try:
+                listener(dict(run))
+            except Exception as e:
+                logger.warning(f"渲染记录回调失败: {e}")
+
+    def add_run_listener(self, callback):
+        """注册任务结束回调，参数为渲染记录（含 stages 各阶段耗时），取消的任务不回调"""
+        self._run_listeners.append(callback)
+
+    def remove_run_listener(self, callback):
+        if callback in self._run_listeners:
+            self._run_listeners.remove(callback)
+
+    def _mark_stage(self, unique_id: str, stage: Optional[str], only_after: Optional[str] = None):
+        """
+        结束任务的当前阶段并进入 stage（None 表示结束计时），耗时累计到 run['stages']。
+        only_after 指定时，只有当前阶段为该阶段才切换（用于进度回调中只触发一次的切换）
+        """
+        run = self._job_runs.get(unique_id)
+        if run is None or (only_after is not None and run.get('stage') != only_after):
+            return
+        now = time.time()
+        current = run.get('stage')
+        if current:
+            run['stages'][current] = run['stages'].get(current, 0.0) + now - run['stage_start']
+            progress_monitor.add_span(unique_id, current, run['stage_start'], now, category='stage')
+        if stage in STAGE_EVENTS:
+            progress_monitor.add_span(unique_id, STAGE_EVENTS[stage], now)
+        run['stage'], run['stage_start'] = stage, now
+
+    @contextmanager
+    def _span(self, unique_id: str, name: str, **args):
+        """在任务时间线上记录 with 块的执行区间（异常时同样记录）"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            progress_monitor.add_span(unique_id, name, start, time.time(), args=args)
+
+    def _supersede_session_job(self, session_id: str, unique_id: str):
+        """最新请求优先：记录会话的新任务，并取消该会话之前的任务"""
+        with self._lock:
+            previous_id = self._session_jobs.pop(session_id, None)
+            self._session_jobs[session_id] = unique_id
+            while len(self._session_jobs) > MAX_TRACKED_SESSIONS:
+                self._session_jobs.popitem(last=False)
+        if previous_id and previous_id != unique_id:
+            result = self.cancel_render(previous_id, '已被同一会话的新请求取代')
+            if result == 'cancelled':
+                logger.info(f"会话 {session_id} 提交了新任务 {unique_id}，已取消旧任务 {previous_id}")
+
+    def cancel_render(self, unique_id: str, reason: str = '用户取消') -> str:
+        """
+        取消任务：排队中的任务不再执行，渲染中的任务终止其子进程树并清理未完成的文件。
+        返回 cancelled / shared（其他请求正在等待该渲染结果，未终止） / finished / not_found
+        """
+        with self._lock:
+            if unique_id in self._pending:
+                if any(render_cache.get_waiters(key, unique_id) for key in self._pending[unique_id]):
+                    return 'shared'
+                self._stopped.setdefault(unique_id, ('cancelled', reason))
+                processes = list(self._job_processes.get(unique_id, ()))
+            else:
+                processes = None
+
+        if processes is None:
+            # 合并到其他任务的重复请求：只解除等待，不影响实际渲染
+            if render_cache.remove_waiter(unique_id):
+                progress_monitor.cancel_job(unique_id, reason)
+                logger.info(f"已取消等待中的重复请求: {unique_id}")
+                return 'cancelled'
+            return 'not_found' if progress_monitor.get_status(unique_id) is None else 'finished'
+
+        progress_monitor.cancel_job(unique_id, reason)
+        for process in processes:
+            kill_process_tree(process)
+        logger.info(f"已取消渲染任务: {unique_id} ({reason})")
+        return 'cancelled'
+
+    def _on_timeout(self, unique_id: str, timeout_seconds: float):
+        """渲染超时：终止子进程树，任务按失败处理"""
+        with self._lock:
+            if unique_id not in self._pending:
+                return
+            self._stopped.setdefault(unique_id, ('timeout', f"渲染超时（超过 {timeout_seconds:g} 秒）"))
+            processes = list(self._job_processes.get(unique_id, ()))
+        logger.warning(f"渲染任务超时，终止子进程: {unique_id}")
+        for process in processes:
+            kill_process_tree(process)
+
+    def _raise_if_stopped(self, unique_id: str):
+        """任务已被取消或超时时抛出 RenderCancelled"""
+        with self._lock:
+            stopped = self._stopped.get(unique_id)
+        if stopped:
+            raise RenderCancelled(stopped[1])
+
+    def _track_process(self, unique_id: str, process: subprocess.Popen):
+        """登记任务的子进程；任务已被取消时立即终止"""
+        with self._lock:
+            stopped = unique_id in self._stopped
+            if not stopped:
+                self._job_processes.setdefault(unique_id, []).append(process)
+        if stopped:
+            kill_process_tree(process)
+
+    def _untrack_process(self, unique_id: str, process: subprocess.Popen):
+        with self._lock:
+            processes = self._job_processes.get(unique_id)
+            if processes and process in processes:
+                processes.remove(process)
+
+    def _cleanup_partial_outputs(self, scene_file_path: Optional[str], video_path: Optional[str]):
+        """清理被取消或超时任务留下的未完成文件"""
+        if video_path and os.path.exists(video_path):
+            try:
+                os.remove(video_path)
+            except OSError as e:
+                logger.warning(f"删除未完成的视频失败: {e}")
+        if scene_file_path:
+            self._remove_manim_scratch(scene_file_path)
+
+    @staticmethod
+    def _remove_manim_scratch(scene_file_path: str, keep: Optional[str] = None):
+        """
+        删除 Manim 以场景模块名为子目录存放的中间文件（分段视频 partial_movie_files、帧图像等）；
+        keep 位于其中时（输出移动失败、直接使用原始路径）保留该目录
+        """
+        scene_module = os.path.splitext(os.path.basename(scene_file_path))[0]
+        for media_type in ('videos', 'images'):
+            scratch_dir = os.path.abspath(os.path.join(file_manager.video_dir, media_type, scene_module))
+            if keep and os.path.abspath(keep).startswith(scratch_dir + os.sep):
+                continue
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def _move_output(self, unique_id: str, source: str, destination: str) -> str:
+        """
+        将 Manim 的输出发布为最终视频，返回最终路径。
+        Manim 的媒体目录就是视频目录，两者在同一文件系统，直接原子重命名，不复制文件内容；
+        重命名失败（如跨文件系统）时先复制为临时名再重命名，仍失败时直接使用原始路径
+        """
+        if os.path.normpath(source) == os.path.normpath(destination):
+            return destination
+        with self._span(unique_id, 'output_publish'):
+            try:
+                os.replace(source, destination)
+                return destination
+            except OSError as e:
+                logger.warning(f"移动渲染结果失败，改为复制: {source} -> {destination}，错误: {e}")
+            tmp_path = f"{destination}.part.mp4"
+            try:
+                shutil.copy2(source, tmp_path)
+                os.replace(tmp_path, destination)
+                return destination
+            except OSError as e:
+                logger.warning(f"复制渲染结果到统一目录失败，将直接使用原始路径: {source}，错误: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return source
+
+    def _reencode_output(self, unique_id: str, ffmpeg_path: str, video_path: str, quality_setting: Dict[str, Any]):
+        """
+        MANIM_ENCODER 为 reencode 时按档位的 encoder 重新编码 Manim 的输出：写入临时文件后原子替换，
+        失败时记录警告并保留 Manim 的编码
+        """
+        if self.manim_encoder != 'reencode':
+            return
+        tmp_path = f"{video_path}.part.mp4"
+        command = build_reencode_command(ffmpeg_path, video_path, tmp_path, quality_setting)
+        if not command:
+            return
+        with self._span(unique_id, 'output_reencode'):
+            try:
+                returncode, output = self._run_ffmpeg(command, unique_id)
+                if returncode == 0:
+                    os.replace(tmp_path, video_path)
+                    return
+                logger.warning(f"按档位编码参数重新编码失败，保留 Manim 的编码 (返回码: {returncode}): {output[-500:]}")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _publish_result(self, unique_id: str, cache_key: Optional[str], video_path: str,
+                        params: Dict[str, Any], extra_outputs: tuple = (), link_owner: bool = True):
+        """
+        登记渲染结果：写入缓存，并让等待该结果的重复请求指向同一视频。
+        写入缓存成功时登记内容寻址的缓存文件，其 URL 可被浏览器长期缓存。
+        本任务的全部产物（视频、缓存、流式分段）在一个事务中写入产物索引。
+        link_owner 为 False 时（派生的其他档位）本任务不指向该视频，只有等待该档位的请求指向它。
+        """
+        self._raise_if_stopped(unique_id)
+        with self._span(unique_id, 'output_registration'):
+            outputs = [{'path': video_path, 'kind': 'video', 'params': params}]
+            registered_path = video_path
+            waiter_ids = []
+            if cache_key:
+                cache_path = render_cache.store(cache_key, video_path)
+                if cache_path:
+                    outputs.append({'path': cache_path, 'kind': 'cache', 'cache_key': cache_key, 'params': params})
+                    registered_path = cache_path
+                waiter_ids = render_cache.get_waiters(cache_key, unique_id)
+            outputs += [{'path': path, 'kind': kind} for path, kind in extra_outputs]
+            file_manager.artifact_index.record_job_output(unique_id, outputs, registered_path, waiter_ids,
+                                                          link_owner=link_owner)
+            artifact_janitor.wake()
+
+    def _publish_derived(self, unique_id: str, ffmpeg_path: str, cache_key: Optional[str], video_path: str,
+                         params: Dict[str, Any], derive: Dict[str, Any], extra_outputs: tuple = ()):
+        """
+        派生模式的发布：video_path 为最高档视频（本任务渲染的结果或已缓存的视频），
+        用一次 ffmpeg 输出本任务负责的其余档位，各档位分别写入缓存，最后登记所请求档位的结果。
+        本任务渲染了最高档但请求的是其他档位时，最高档另存为 stroboscope_<id>_q<档位>.mp4
+        """
+        requested, top = params['quality_level'], derive['top']
+        outputs = {} # 档位 -> 视频路径
+        created = [] # 失败时需要删除的文件
+        if derive['source'] is None:
+            if requested != top:
+                top_path = os.path.join(file_manager.video_dir, f"stroboscope_{unique_id}_q{top}.mp4")
+                os.replace(video_path, top_path)
+                outputs[top] = video_path = top_path
+                created.append(top_path)
+            else:
+                outputs[top] = video_path
+        targets = [(level, os.path.join(file_manager.video_dir,
+                                        f"stroboscope_{unique_id}.mp4" if level == requested
+                                        else f"stroboscope_{unique_id}_q{level}.mp4"))
+                   for level in sorted(set(derive['keys']) | {requested}) if level not in outputs]
+        created += [path for _, path in targets]
+        try:
+            if targets:
+                progress_monitor.update_progress(95, "派生其他质量档位...", unique_id=unique_id)
+                with self._span(unique_id, 'tier_derivation', levels=[level for level, _ in targets]):
+                    command = build_derive_command(ffmpeg_path, video_path, top,
+                                                   [(level, f"{path}.part.mp4") for level, path in targets])
+                    returncode, output = self._run_ffmpeg(command, unique_id)
+                    if returncode != 0:
+                        raise Exception(f"质量档位派生失败 (返回码: {returncode}): {output[-2000:]}")
+                    for level, path in targets:
+                        os.replace(f"{path}.part.mp4", path)
+                        outputs[level] = path
+            for level, key in derive['keys'].items():
+                level_params = dict(params, quality_level=level)
+                if level != top:
+                    level_params['derived_from'] = top
+                self._publish_result(unique_id, key, outputs[level], level_params, link_owner=False)
+        except Exception:
+            for path in created:
+                for leftover in (f"{path}.part.mp4", path):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+            raise
+        requested_params = dict(params, derived_from=top) if requested != top else params
+        self._publish_result(unique_id, cache_key, outputs[requested], requested_params, extra_outputs)
+
+    @staticmethod
+    def _expected_scene_frames(fps: int) -> int:
+        """完整场景模板的总帧数：运动 12 秒 + 等待 2 秒 + 结束文字 1 秒 + 等待 1 秒"""
+        return 16 * int(fps)
+
+    @staticmethod
+    def _manim_media_subdir(media_dir: str, scene_file_path: str) -> str:
+        """Manim 为每个场景模块创建的视频子目录（含分段文件）"""
+        scene_module = os.path.splitext(os.path.basename(scene_file_path))[0]
+        return os.path.join(media_dir, 'videos', scene_module)
+
+    @classmethod
+    def _expected_manim_output(cls, media_dir: str, scene_file_path: str, quality_setting: Dict[str, Any],
+                               output_filename: str) -> str:
+        """
+        Manim 输出视频的确定路径：<media_dir>/videos/<场景模块>/<像素高度>p<帧率>/<输出文件名>，
+        与 Manim 的 video_dir 规则一致，无需在渲染后遍历目录查找
+        """
+        height = MANIM_QUALITY_HEIGHTS.get(quality_setting.get('flag'))
+        if height is None:
+            height = int(str(quality_setting.get('resolution', '480p')).rstrip('p'))
+        fps = float(quality_setting.get('fps', 60))
+        return os.path.join(cls._manim_media_subdir(media_dir, scene_file_path), f"{height}p{fps:g}", output_filename)
+
+    def _build_manim_command(self, renderer: str, quality_setting: Dict[str, Any], media_dir: str,
+                             output_filename: str, scene_file_path: str, scene_class: str,
+                             output_format: Optional[str] = "mp4", extra_args: tuple = ()) -> list[str]:
+        """构建 Manim 命令；优先通过当前 Python 解释器调用 manim，避免 PATH 问题"""
+        command = [
+            sys.executable, "-m", "manim", "render",
+            "--renderer", renderer,
+        ]
+        if output_format:
+            command += ["--format", output_format]
+        command += [
+            quality_setting['flag'],   # 质量标志，例如 -qh, -qm, -ql
+            "--disable_caching",       # 禁用缓存
+            "--media_dir", media_dir,  # 指定媒体输出目录
+            "--output_file", output_filename, # 指定输出文件名
+            "--progress_bar", "display", # 明确显示进度条
+            "--fps", str(quality_setting.get('fps', 60)), # 设置 FPS
+            *extra_args,
+            scene_file_path,           # 场景文件路径
+            scene_class                # 场景类名
+        ]
+        return command
+
+    def _run_manim(self, command: list[str], unique_id: str, expected_frames: Optional[int] = None) -> subprocess.Popen:
+        """
+        运行 Manim 子进程并实时解析进度，返回已结束的进程对象。
+        输出以无缓冲的字节流读取，进度条的 \\r 重绘可以立即解析；expected_frames 为整个场景的总帧数（已知时）
+        """
+        self._raise_if_stopped(unique_id)
+        logger.info(f"Manim命令: {' '.join(command)}")
+        with self._span(unique_id, 'subprocess_spawn', program='manim'):
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=0,
+                **new_process_group_kwargs()
+            )
+        spawned = time.time()
+        self._track_process(unique_id, process)
+        try:
+            # 原始输出写入任务日志，全局日志只记录摘要与错误
+            with JobOutputLog(unique_id) as job_log:
+                peak_rss = self._monitor_render_progress_from_stdout(process, unique_id, job_log, expected_frames)
+                process.wait()
+                self._observe_peak_rss(peak_rss, 'subprocess')
+                job_log.summary(f"进程结束 (返回码: {process.returncode})，共 {job_log.line_count} 行输出", force=True)
+                if process.returncode != 0 and unique_id not in self._stopped:
+                    job_log.log_tail()
+        finally:
+            self._untrack_process(unique_id, process)
+            progress_monitor.add_span(unique_id, 'manim_process', spawned, time.time(),
+                                      args={'returncode': process.returncode})
+        self._raise_if_stopped(unique_id)
+        return process
+
+    def _run_ffmpeg(self, command: list[str], unique_id: str) -> Tuple[int, str]:
+        """运行 ffmpeg 子进程（可被取消），返回 (返回码, 输出)"""
+        self._raise_if_stopped(unique_id)
+        with self._span(unique_id, 'subprocess_spawn', program='ffmpeg'):
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, encoding='utf-8', errors='replace',
+                                       **new_process_group_kwargs())
+        self._track_process(unique_id, process)
+        try:
+            output, _ = process.communicate()
+        finally:
+            self._untrack_process(unique_id, process)
+        self._raise_if_stopped(unique_id)
+        return process.returncode, output
+
+    @staticmethod
+    def _find_layer_output(media_dir: str, extensions: tuple) -> Optional[str]:
+        """在单个任务独占的媒体目录中查找 Manim 的图层产物"""
+        for root, _, files in os.walk(media_dir):
+            for file in files:
+                if file.endswith(extensions) and 'partial_movie_files' not in root:
+                    return os.path.join(root, file)
+        return None
+
+    def _ensure_background(self, quality_level: int, quality_setting: Dict[str, Any], unique_id: str) -> str:
+        """获取某个质量档位的背景图层，不存在时渲染一次并缓存"""
+        background_path = layer_compositor.get_background_path(quality_level)
+        with self._lock:
+            tier_lock = self._background_locks.setdefault(quality_level, threading.Lock())
+        with tier_lock:
+            if os.path.exists(background_path):
+                return background_path
+
+            progress_monitor.update_progress(15, "渲染静态背景图层...", unique_id=unique_id)
+            media_dir = os.path.join(file_manager.temp_dir, 'layers', f"background_{unique_id}")
+            _, scene_file_path = scene_manager.generate_layer_scene_file('background', 0, 0)
+            try:
+                command = self._build_manim_command(
+                    "cairo", quality_setting, os.path.abspath(media_dir), "background",
+                    os.path.abspath(scene_file_path), "StroboscopeBackground",
+                    output_format=None, extra_args=("-s",)
+                )
+                process = self._run_manim(command, unique_id)
+                image_path = self._find_layer_output(media_dir, ('.png',))
+                if process.returncode != 0 or not image_path:
+                    raise Exception(f"背景图层渲染失败 (返回码: {process.returncode})")
+                os.replace(image_path, background_path)
+                file_manager.artifact_index.record(background_path, 'layer', params={'quality_level': quality_level})
+                logger.info(f"背景图层已缓存: {background_path}")
+            finally:
+                scene_manager.cleanup_scene_file(scene_file_path)
+                shutil.rmtree(media_dir, ignore_errors=True)
+        return background_path
+
+    def _render_layered(self, rotation_speed: float, flash_frequency: float, quality_level: int,
+                        unique_id: str, ffmpeg_path: str, final_video_output_path: str):
+        """分层渲染：缓存背景 + 透明指针图层 + drawtext 文字，由 ffmpeg 合成最终视频"""
+        quality_setting = scene_manager.get_quality_setting(quality_level)
+        fps = quality_setting.get('fps', 60)
+        background_path = self._ensure_background(quality_level, quality_setting, unique_id)
+
+        progress_monitor.update_progress(20, "生成指针图层代码...", unique_id=unique_id)
+        work_dir = os.path.join(file_manager.temp_dir, 'layers', unique_id)
+        os.makedirs(work_dir, exist_ok=True)
+        _, scene_file_path = scene_manager.generate_layer_scene_file('pointer', rotation_speed, flash_frequency)
+        try:
+            progress_monitor.update_progress(30, "渲染指针图层...", unique_id=unique_id)
+            # 透明图层使用 cairo 渲染器输出带 alpha 通道的 mov
+            command = self._build_manim_command(
+                "cairo", quality_setting, os.path.abspath(work_dir), f"pointer_{unique_id}",
+                os.path.abspath(scene_file_path), "StroboscopePointer",
+                output_format="mov", extra_args=("--transparent",)
+            )
+            process = self._run_manim(command, unique_id)
+            pointer_path = self._find_layer_output(work_dir, ('.mov',))
+            if process.returncode != 0 or not pointer_path:
+                raise Exception(f"指针图层渲染失败 (返回码: {process.returncode})")
+
+            progress_monitor.update_progress(88, "合成图层...", unique_id=unique_id)
+            self._mark_stage(unique_id, 'encoding')
+            _, frame_height = layer_compositor.get_frame_size(quality_setting)
+            text_layers = layer_compositor.build_text_layers(rotation_speed, flash_frequency, frame_height)
+            # 先写入同目录下的临时文件，完成后原子重命名，最终路径上不会出现写了一半的视频
+            tmp_output_path = f"{final_video_output_path}.part.mp4"
+            composite_command = layer_compositor.build_composite_command(
+                ffmpeg_path, background_path, pointer_path, text_layers, fps,
+                tmp_output_path, work_dir, encoder_args(quality_setting)
+            )
+            logger.info(f"ffmpeg合成命令: {' '.join(composite_command)}")
+            try:
+                returncode, output = self._run_ffmpeg(composite_command, unique_id)
+                if returncode != 0 or not os.path.exists(tmp_output_path):
+                    raise Exception(f"ffmpeg合成失败 (返回码: {returncode}). 输出: {output[-2000:]}")
+                os.replace(tmp_output_path, final_video_output_path)
+            finally:
+                if os.path.exists(tmp_output_path):
+                    os.remove(tmp_output_path)
+        finally:
+            scene_manager.cleanup_scene_file(scene_file_path)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _render_fast(self, rotation_speed: float, flash_frequency: float, quality_level: int,
+                     unique_id: str, ffmpeg_path: str, final_video_output_path: str,
+                     panels: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+        """快速引擎：NumPy 逐帧光栅化并通过管道写入 ffmpeg，不启动 Manim；返回流式输出目录（如有）"""
+        quality_setting = scene_manager.get_quality_setting(quality_level)
+        progress_monitor.update_progress(10, "快速渲染中...", unique_id=unique_id)
+
+        stream_dir = None
+        stream_relative_path = None
+        stream_check_interval = max(1, int(quality_setting.get('fps', 60)) // 2)
+        if self.streaming:
+            stream_dir = os.path.join(file_manager.video_dir, 'streams', unique_id)
+            stream_relative_path = f"streams/{unique_id}/{STREAM_PLAYLIST}"
+        stream_announced = False
+
+        def on_frame(done_frames: int, total_frames: int):
+            nonlocal stream_announced
+            # 取消或超时时在下一帧中止，快速引擎会终止 ffmpeg 并删除临时文件
+            self._raise_if_stopped(unique_id)
+            if done_frames == 1:
+                self._mark_stage(unique_id, 'frame_rendering', only_after='subprocess_startup')
+            if done_frames == total_frames:
+                # 最后一帧写入后等待 ffmpeg 编码完成（周期拼接时还包括 concat）
+                self._mark_stage(unique_id, 'encoding', only_after='frame_rendering')
+            # 第一个分段写完后播放列表才出现，此时通知前端可以开始播放
+            if stream_dir and not stream_announced and done_frames % stream_check_interval == 0 \
+                    and os.path.exists(os.path.join(stream_dir, STREAM_PLAYLIST)):
+                stream_announced = True
+                progress_monitor.set_stream_playlist(unique_id, stream_relative_path)
+            # 将帧进度映射到 10-95%
+            mapped_progress = int(10 + done_frames / total_frames * (95 - 10))
+            progress_monitor.update_progress(
+                mapped_progress, f"快速渲染中... ({done_frames}/{total_frames} 帧)",
+                current_animation=done_frames, total_animations=total_frames, unique_id=unique_id
+            )
+
+        try:
+            if panels:
+                streamed = fast_renderer.render_mosaic(panels, quality_setting, ffmpeg_path, final_video_output_path,
+                                                       progress_callback=on_frame, stream_dir=stream_dir,
+                                                       segment_seconds=self.stream_segment_seconds)
+            else:
+                streamed = fast_renderer.render(rotation_speed, flash_frequency, quality_setting,
+                                                ffmpeg_path, final_video_output_path, progress_callback=on_frame,
+                                                stream_dir=stream_dir, segment_seconds=self.stream_segment_seconds)
+        except Exception:
+            if stream_dir:
+                shutil.rmtree(stream_dir, ignore_errors=True)
+            raise
+        return stream_dir if streamed else None
+
+    def _render_warm(self, scene_file_path: str, scene_class: str, quality_setting: Dict[str, Any],
+                     media_dir: str, output_filename: str, unique_id: str) -> Optional[str]:
+        """
+        在常驻 Manim 工作进程中渲染，返回输出视频路径。
+        工作进程不可用或渲染失败时返回 None，由调用方回退到子进程渲染。
+        """
+        fps = int(quality_setting.get('fps', 60))
+        expected_frames = self._expected_scene_frames(fps)
+        job = {
+            'job_id': unique_id,
+            'scene_file': scene_file_path,
+            'scene_class': scene_class,
+            'media_dir': media_dir,
+            'output_file': output_filename,
+            'quality': QUALITY_FLAG_NAMES.get(quality_setting['flag'], 'low_quality'),
+            'fps': fps,
+            'renderer': capabilities.get_renderer(), # 与子进程模式相同，使用启动时探测 / 配置的渲染器
+        }
+
+        # 常驻进程的 VmHWM 是进程启动以来的峰值：任务开始前重置，任务期间按进度发布间隔采样
+        rss = {'pid': None, 'peak': None, 'sampled': 0.0}
+
+        def sample_rss():
+            if rss['pid'] is not None:
+                rss['peak'] = process_peak_rss(rss['pid']) or rss['peak']
+                rss['sampled'] = time.time()
+
+        def on_progress(frames: int):
+            # 最后一帧时工作进程尚未归还（达到任务上限时归还即退出），在此补一次采样
+            if frames >= expected_frames or time.time() - rss['sampled'] >= self.progress_interval:
+                sample_rss()
+            self._mark_stage(unique_id, 'frame_rendering', only_after='subprocess_startup')
+            if frames >= expected_frames:
+                self._mark_stage(unique_id, 'encoding', only_after='frame_rendering')
+            percentage = min(100, int(frames / expected_frames * 100))
+            mapped_progress = int(40 + (percentage / 100) * (85 - 40))
+            progress_monitor.update_progress(
+                mapped_progress, f"正在渲染动画... ({percentage}%)",
+                current_animation=frames, total_animations=expected_frames, unique_id=unique_id
+            )
+
+        progress_monitor.update_progress(30, "提交到常驻Manim进程...", unique_id=unique_id)
+        tracked = []
+
+        def on_process(process: subprocess.Popen):
+            # 取消时终止该工作进程，进程池会在归还时发现其已退出并丢弃
+            tracked.append(process)
+            self._track_process(unique_id, process)
+            # 无法重置峰值时（非 Linux 或内核不支持）不采集，避免把之前任务的峰值记到本任务
+            rss['pid'] = process.pid if reset_peak_rss(process.pid) else None
+
+        try:
+            with JobOutputLog(unique_id, source='Manim Worker') as job_log:
+                try:
+                    output = manim_worker_pool.render(job, on_progress, on_process=on_process, job_log=job_log)
+                    self._observe_peak_rss(rss['peak'], 'warm')
+                    return output
+                except WarmWorkerError:
+                    if unique_id not in self._stopped:
+                        job_log.log_tail()
+                    raise
+        except WarmWorkerError as e:
+            self._raise_if_stopped(unique_id)
+            logger.warning(f"常驻Manim进程渲染失败，回退到子进程渲染: {e}")
+            return None
+        finally:
+            for process in tracked:
+                self._untrack_process(unique_id, process)
+
+    @staticmethod
+    def _observe_peak_rss(peak_rss: Optional[int], mode: str):
+        """记录一次 Manim 渲染的峰值内存，mode 为 subprocess（每任务一个进程）或 warm（常驻进程中的单个任务）"""
+        if peak_rss:
+            metrics.observe('stroboscope_manim_peak_rss_bytes', peak_rss, labels={'mode': mode})
+            metrics.set_max('stroboscope_manim_peak_rss_max_bytes', peak_rss, labels={'mode': mode})
+
     def _render_thread(self, rotation_speed: float, flash_frequency: float, 
-                      quality_level: int, unique_id: str, estimated_time: str):
-        """渲染线程"""
+                      quality_level: int, unique_id: str, estimated_time: str,
+                      cache_key: str = None, engine: str = 'manim',
+                      panels: Optional[List[Dict[str, Any]]] = None, derive: Optional[Dict[str, Any]] = None):
+        """渲染线程（panels 不为空时为拼图任务；derive 为派生模式的规划，见 _plan_derivation）"""
         scene_file_path = None # 初始化为 None
         final_video_output_path = None # 初始化为 None
+        timeout_timer = None
+        if panels:
+            job_params = {'panels': panels, 'quality_level': quality_level, 'engine': engine}
+        else:
+            job_params = {
+                'rotation_speed': rotation_speed,
+                'flash_frequency': flash_frequency,
+                'quality_level': quality_level,
+                'engine': engine,
+            }
+        if derive and derive['source'] is None:
+            # 派生模式：渲染最高档，所请求的档位在发布时派生
+            quality_level = derive['top']
+        # 渲染历史：各阶段的时间点在下方依次记录，结束时写入
+        run = {'job_id': unique_id, 'engine': engine, 'variant': self._render_variant(engine, bool(panels)),
+               'quality_level': quality_level, 'pixels': self._frame_pixels(quality_level),
+               'success': None, 'stages': {}}
+        with self._lock:
+            self._job_runs[unique_id] = run
         try:
-            progress_monitor.start_render(estimated_time)
+            # 排队期间已被取消的任务直接跳过
+            self._raise_if_stopped(unique_id)
+            run['fps'], run['frames'] = self._job_frames(rotation_speed, flash_frequency, quality_level, engine, panels)
+            queued_status = progress_monitor.get_status(unique_id)
+            run['queued_time'] = queued_status['queued_time'] if queued_status else None
+            run['start'] = time.time()
+            if run['queued_time']:
+                progress_monitor.add_span(unique_id, 'queue', run['queued_time'], run['start'], category='stage')
+            self._mark_stage(unique_id, 'scene_generation')
+            progress_monitor.start_render(estimated_time, unique_id=unique_id)
 
-            # 检查 ffmpeg 是否可用（Manim 生成 mp4 必需）
-            try:
-                import shutil as _shutil
-                ffmpeg_path = _shutil.which("ffmpeg")
-            except Exception:
-                ffmpeg_path = None
+            # 按质量档位设置墙钟超时，防止卡死的进程长期占用工作线程
+            timeout_seconds = float(scene_manager.get_quality_setting(quality_level).get('timeout', 0) or 0)
+            if timeout_seconds > 0:
+                timeout_timer = threading.Timer(timeout_seconds, self._on_timeout, args=(unique_id, timeout_seconds))
+                timeout_timer.daemon = True
+                timeout_timer.start()
+
+            # 检查 ffmpeg 是否可用（Manim 生成 mp4 必需）；使用启动时的探测结果
+            ffmpeg_path = capabilities.get_ffmpeg_path()
             if not ffmpeg_path:
+                run['failure_cause'] = 'ffmpeg_missing'
                 raise Exception(
                     "未检测到 ffmpeg，无法生成 mp4。请安装后重试（conda install -c conda-forge ffmpeg / scoop install ffmpeg / choco install ffmpeg）。"
                 )
+
+            def publish(video_path: str, extra_outputs: tuple = ()):
+                if derive:
+                    self._publish_derived(unique_id, ffmpeg_path, cache_key, video_path, job_params, derive,
+                                          extra_outputs)
+                else:
+                    self._publish_result(unique_id, cache_key, video_path, job_params, extra_outputs)
+
+            if derive and derive['source']:
+                # 最高档已有缓存：不渲染，只派生所请求的档位
+                run['variant'] = 'derive'
+                run['render_start'] = time.time()
+                self._mark_stage(unique_id, 'finalization')
+                publish(derive['source'])
+                run['render_end'] = time.time()
+                run['success'] = True
+                progress_monitor.finish_render(success=True, unique_id=unique_id)
+                logger.info(f"动画渲染完成(由最高档派生): {unique_id}")
+                return
+            
+            if engine == 'fast':
+                final_video_output_path = os.path.join(file_manager.video_dir, f"stroboscope_{unique_id}.mp4")
+                run['render_start'] = time.time()
+                self._mark_stage(unique_id, 'subprocess_startup')
+                run['failure_cause'] = 'encoder_error'
+                stream_dir = self._render_fast(rotation_speed, flash_frequency, quality_level, unique_id,
+                                               ffmpeg_path, final_video_output_path, panels)
+                run.pop('failure_cause')
+                run['render_end'] = time.time()
+                self._mark_stage(unique_id, 'finalization')
+                publish(final_video_output_path, ((stream_dir, 'stream'),) if stream_dir else ())
+                run['success'] = True
+                progress_monitor.finish_render(success=True, unique_id=unique_id)
+                logger.info(f"动画渲染完成(快速引擎): {final_video_output_path}")
+                return
+            
+            if self.pipeline == 'layered' and not panels:
+                final_video_output_path = os.path.join(file_manager.video_dir, f"stroboscope_{unique_id}.mp4")
+                run['render_start'] = time.time()
+                self._mark_stage(unique_id, 'subprocess_startup')
+                self._render_layered(rotation_speed, flash_frequency, quality_level, unique_id,
+                                     ffmpeg_path, final_video_output_path)
+                run['render_end'] = time.time()
+                self._mark_stage(unique_id, 'finalization')
+                publish(final_video_output_path)
+                run['success'] = True
+                progress_monitor.finish_render(success=True, unique_id=unique_id)
+                logger.info(f"动画渲染完成(分层合成): {final_video_output_path}")
+                return
             
             # 生成场景文件
-            progress_monitor.update_progress(10, "生成动画代码...")
-            # 关键修改：传递 quality_level 参数给 scene_manager.generate_scene_file
-            scene_unique_id, scene_file_path = scene_manager.generate_scene_file(
-                rotation_speed, flash_frequency, quality_level
-            )
+            progress_monitor.update_progress(10, "生成动画代码...", unique_id=unique_id)
+            with self._span(unique_id, 'template_load'):
+                if panels:
+                    scene_code = scene_manager.build_mosaic_scene_code(panels)
+                    scene_prefix, scene_class = "manim_scene_mosaic", "StroboscopeMosaic"
+                else:
+                    scene_code = scene_manager.build_scene_code(rotation_speed, flash_frequency)
+                    scene_prefix, scene_class = "manim_scene", "StroboscopicEffectDynamic"
+            with self._span(unique_id, 'scene_file_write', bytes=len(scene_code)):
+                scene_unique_id, scene_file_path = scene_manager.write_scene_file(scene_code, scene_prefix)
             
             # 获取质量设置
             quality_setting = scene_manager.get_quality_setting(quality_level)
             quality_flag = quality_setting['flag'] # 例如 "-ql", "-qm", "-qh"
             
             # 构建Manim命令
-            progress_monitor.update_progress(20, "准备渲染参数...")
+            progress_monitor.update_progress(20, "准备渲染参数...", unique_id=unique_id)
             
             output_filename = f"stroboscope_{unique_id}.mp4" 
             
@@ -109,129 +1099,114 @@ class RenderEngine:
             logger.info(f"传递给Manim的媒体目录: {absolute_video_output_dir_for_manim}")
             logger.info(f"传递给Manim的场景文件路径: {scene_file_path_for_manim}")
 
-            # 优先通过当前 Python 解释器调用 manim，避免 PATH 问题
+            run['render_start'] = time.time()
+            self._mark_stage(unique_id, 'subprocess_startup')
+            if self.manim_mode == 'warm':
+                warm_video_path = self._render_warm(
+                    scene_file_path_for_manim, scene_class, quality_setting,
+                    absolute_video_output_dir_for_manim, output_filename, unique_id
+                )
+                if warm_video_path and os.path.exists(warm_video_path):
+                    run['render_end'] = time.time()
+                    self._mark_stage(unique_id, 'finalization')
+                    progress_monitor.update_progress(90, "处理输出文件...", unique_id=unique_id)
+                    final_video_output_path = self._move_output(unique_id, warm_video_path, final_video_output_path)
+                    self._reencode_output(unique_id, ffmpeg_path, final_video_output_path, quality_setting)
+                    publish(final_video_output_path)
+                    run['success'] = True
+                    progress_monitor.finish_render(success=True, unique_id=unique_id)
+                    logger.info(f"动画渲染完成(常驻进程): {output_filename}, 路径: {final_video_output_path}")
+                    return
+
             def build_manim_command(renderer: str) -> list[str]:
-                return [
-                    sys.executable, "-m", "manim",
-                    "render",
-                    "--renderer", renderer,
-                    "--format", "mp4",
-                    quality_flag,          # 质量标志，例如 -qh, -qm, -ql
-                    "--disable_caching",   # 禁用缓存
-                    "--media_dir", absolute_video_output_dir_for_manim, # 指定媒体输出目录
-                    "--output_file", output_filename, # 指定输出文件名
-                    "--progress_bar", "display", # 明确显示进度条
-                    "--fps", str(quality_setting.get('fps', 60)), # 设置 FPS
-                    scene_file_path_for_manim, # 场景文件路径
-                    "StroboscopicEffectDynamic" # 场景类名
-                ]
-
-            manim_command = build_manim_command("opengl")
-            
-            logger.info(f"Manim命令: {' '.join(manim_command)}")
+                return self._build_manim_command(
+                    renderer, quality_setting, absolute_video_output_dir_for_manim,
+                    output_filename, scene_file_path_for_manim, scene_class
+                )
 
-            # 执行渲染
-            progress_monitor.update_progress(30, "启动Manim渲染...")
-            logger.info(f"开始渲染动画: {output_filename}")
-            
-            # 启动子进程并实时读取输出
-            process = subprocess.Popen(
-                manim_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT, # 将 stderr 合并到 stdout，方便统一读取进度
-                text=True,
-                bufsize=1, # 行缓冲
-                universal_newlines=True
-            )
-            
-            # 监控渲染进度（改进版）
-            self._monitor_render_progress_from_stdout(process, unique_id)
+            # 直接使用启动时探测到的渲染器；仅当探测为 OpenGL 但运行失败时回退 cairo 一次，
+            # 并记录下来，后续任务直接使用 cairo
+            renderer = capabilities.get_renderer()
+            progress_monitor.update_progress(30, "启动Manim渲染...", unique_id=unique_id)
+            logger.info(f"开始渲染动画: {output_filename} (渲染器: {renderer})")
+            expected_frames = self._expected_scene_frames(quality_setting.get('fps', 60))
+            process = self._run_manim(build_manim_command(renderer), unique_id, expected_frames)
+            if process.returncode != 0 and renderer == 'opengl':
+                logger.warning(f"使用 OpenGL 渲染失败 (返回码: {process.returncode})，改用 Cairo 渲染器重试...")
+                capabilities.mark_renderer_failed('opengl')
+                metrics.inc('stroboscope_renderer_fallbacks_total', labels={'from': 'opengl', 'to': 'cairo'})
+                renderer = 'cairo'
+                self._mark_stage(unique_id, 'subprocess_startup')
+                process = self._run_manim(build_manim_command(renderer), unique_id, expected_frames)
+            # 常驻进程失败后回退的任务也按实际使用的渲染器记录
+            run['variant'] = f"mosaic/full/{renderer}" if panels else f"full/{renderer}"
+            run['render_end'] = time.time()
+            self._mark_stage(unique_id, 'finalization')
+
+            # 进程已退出，输出文件已关闭，无需等待即可检查
+            if process.returncode != 0:
+                full_error_message = (f"Manim渲染失败 (渲染器: {renderer}, 返回码: {process.returncode}). "
+                                      f"完整输出: {file_manager.get_job_log_path(unique_id)}")
+                logger.error(full_error_message)
+                run['failure_cause'] = 'manim_error'
+                raise Exception(full_error_message)
+
+            # 查找生成的视频文件
+            progress_monitor.update_progress(90, "处理输出文件...", unique_id=unique_id)
             
-            # 等待进程完成
-            process.wait() # 实时读取stdout后，只需等待进程结束
+            # Manim 输出路径由媒体目录、场景模块、分辨率与帧率确定，直接检查该路径
+            with self._span(unique_id, 'output_discovery'):
+                found_video_path = self._expected_manim_output(
+                    absolute_video_output_dir_for_manim, scene_file_path_for_manim, quality_setting, output_filename
+                )
+                found = bool(found_video_path) and os.path.exists(found_video_path)
             
-            # 在检查文件前稍作等待，给文件系统一点时间
-            time.sleep(1) 
-
-            if process.returncode == 0:
-                # 查找生成的视频文件
-                progress_monitor.update_progress(90, "处理输出文件...")
-                
-                # 增强文件查找逻辑：即使指定了 --output_file，也再次确认
-                found_video_path = self._find_generated_video(unique_id)
+            if found:
+                # 将结果移动到 static/animations 目录，确保前端可访问
+                final_video_output_path = self._move_output(unique_id, found_video_path, final_video_output_path)
+                self._reencode_output(unique_id, ffmpeg_path, final_video_output_path, quality_setting)
                 
-                if found_video_path and os.path.exists(found_video_path):
-                    # 将结果统一复制/移动到 static/animations 目录，确保前端可访问
-                    try:
-                        if os.path.normpath(found_video_path) != os.path.normpath(final_video_output_path):
-                            os.makedirs(os.path.dirname(final_video_output_path), exist_ok=True)
-                            shutil.copy2(found_video_path, final_video_output_path)
-                            logger.info(f"已将视频复制到统一目录: {final_video_output_path}")
-                        final_video_output_path = final_video_output_path
-                    except Exception as cp_err:
-                        logger.warning(f"复制渲染结果到统一目录失败，将直接使用原始路径: {found_video_path}，错误: {cp_err}")
-                        final_video_output_path = found_video_path
-                    
-                    progress_monitor.finish_render(success=True)
-                    logger.info(f"动画渲染完成: {output_filename}, 路径: {final_video_output_path}")
-                else:
-                    logger.error(f"Manim渲染成功，但未找到生成的视频文件: {final_video_output_path} 或其他位置。")
-                    # 读取剩余输出，以防有延迟的错误信息
-                    remaining_output = process.stdout.read()
-                    raise Exception(f"Manim渲染成功，但未找到生成的视频文件。请检查Manim输出目录。Manim剩余输出: {remaining_output}")
+                publish(final_video_output_path)
+                run['success'] = True
+                progress_monitor.finish_render(success=True, unique_id=unique_id)
+                logger.info(f"动画渲染完成({renderer}): {output_filename}, 路径: {final_video_output_path}")
             else:
-                # 如果 opengl 失败，尝试回退到 cairo 渲染器
-                logger.warning(f"使用 OpenGL 渲染失败 (返回码: {process.returncode})，尝试使用 Cairo 渲染器重试...")
-                try:
-                    manim_command_fallback = build_manim_command("cairo")
-                    logger.info(f"Manim回退命令: {' '.join(manim_command_fallback)}")
-                    process_fb = subprocess.Popen(
-                        manim_command_fallback,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
-                        text=True,
-                        bufsize=1,
-                        universal_newlines=True
-                    )
-                    self._monitor_render_progress_from_stdout(process_fb, unique_id)
-                    process_fb.wait()
-                    time.sleep(1)
-
-                    if process_fb.returncode == 0:
-                        progress_monitor.update_progress(90, "处理输出文件...")
-                        found_video_path = self._find_generated_video(unique_id)
-                        if found_video_path and os.path.exists(found_video_path):
-                            # 与 OpenGL 成功路径保持一致：尽量将结果复制到统一目录 static/animations 下
-                            try:
-                                if os.path.normpath(found_video_path) != os.path.normpath(final_video_output_path):
-                                    os.makedirs(os.path.dirname(final_video_output_path), exist_ok=True)
-                                    shutil.copy2(found_video_path, final_video_output_path)
-                                    logger.info(f"已将视频复制到统一目录: {final_video_output_path}")
-                                final_video_output_path = final_video_output_path
-                            except Exception as cp_err:
-                                logger.warning(f"复制渲染结果到统一目录失败，将直接使用原始路径: {found_video_path}，错误: {cp_err}")
-                                final_video_output_path = found_video_path
-
-                            progress_monitor.finish_render(success=True)
-                            logger.info(f"动画渲染完成(回退cairo): {output_filename}, 路径: {final_video_output_path}")
-                        else:
-                            remaining_output_fb = process_fb.stdout.read() if process_fb.stdout else ""
-                            raise Exception(f"Manim回退渲染成功，但未找到视频文件。输出: {remaining_output_fb}")
-                    else:
-                        remaining_output_fb = process_fb.stdout.read() if process_fb.stdout else ""
-                        raise Exception(f"Manim回退渲染失败 (返回码: {process_fb.returncode}). 输出: {remaining_output_fb}")
-                except Exception as fb_err:
-                    remaining_output = process.stdout.read() if process.stdout else ""
-                    full_error_message = f"Manim渲染失败 (返回码: {process.returncode}). 输出: {remaining_output}；回退失败: {fb_err}"
-                    logger.error(full_error_message)
-                    raise Exception(full_error_message)
+                logger.error(f"Manim渲染成功，但未找到生成的视频文件: {found_video_path}")
+                run['failure_cause'] = 'output_missing'
+                raise Exception(f"Manim渲染成功，但未找到生成的视频文件: {found_video_path}")
                 
         except Exception as e:
-            progress_monitor.finish_render(success=False, error=str(e))
-            logger.error(f"渲染过程中发生异常: {e}")
+            with self._lock:
+                stopped = self._stopped.get(unique_id)
+            if stopped:
+                kind, reason = stopped
+                self._cleanup_partial_outputs(scene_file_path, final_video_output_path)
+                if kind == 'timeout':
+                    run['success'] = False
+                    metrics.inc('stroboscope_render_failures_total', labels={'cause': 'timeout'})
+                    progress_monitor.finish_render(success=False, error=reason, unique_id=unique_id)
+                    logger.error(f"渲染任务 {unique_id} {reason}")
+                else:
+                    logger.info(f"渲染任务已停止: {unique_id} ({reason})")
+            else:
+                run['success'] = False
+                metrics.inc('stroboscope_render_failures_total', labels={'cause': run.get('failure_cause', 'error')})
+                progress_monitor.finish_render(success=False, error=str(e), unique_id=unique_id)
+                logger.error(f"渲染过程中发生异常: {e}")
         finally:
-            self._set_rendering_status(False) # 渲染结束，设置状态为 False
-            # 清理场景文件
+            if timeout_timer:
+                timeout_timer.cancel()
+            self._mark_stage(unique_id, 'cleanup')
+            with self._lock:
+                self._pending.pop(unique_id, None)
+                self._stopped.pop(unique_id, None)
+                self._job_processes.pop(unique_id, None)
+            for key in (cache_key, *(derive['keys'].values() if derive else ())):
+                if key:
+                    render_cache.release(key, unique_id)
+            # 清理场景文件，以及 Manim 的中间目录（结果已移出；任务结束即删除，不占用磁盘预算）
+            if scene_file_path:
+                self._remove_manim_scratch(scene_file_path, keep=final_video_output_path)
             if scene_file_path and os.path.exists(scene_file_path):
                 scene_manager.cleanup_scene_file(scene_file_path)
             
@@ -245,116 +1220,104 @@ class RenderEngine:
                         logger.info(f"清理了Manim生成的json文件: {json_file_path}")
                     except Exception as e:
                         logger.error(f"清理Manim生成的json文件失败: {e}")
+            self._mark_stage(unique_id, None)
+            with self._lock:
+                self._job_runs.pop(unique_id, None)
+            self._record_run(run)
 
-    def _monitor_render_progress_from_stdout(self, process: subprocess.Popen, unique_id: str):
-        """通过解析Manim的stdout实时监控渲染进度"""
-        progress_monitor.update_progress(40, "正在渲染动画...")
-        
-        progress_regex_detailed = re.compile(
-            r".*?\[(\d{2}):(\d{2}):(\d{2})/(\d{2}):(\d{2}):(\d{2})\]\s+(\d+)%\s+Playing Animation:.*"
-        )
-        progress_regex_simple = re.compile(r".*?Progress:\s*(\d+)%")
+    def _monitor_render_progress_from_stdout(self, process: subprocess.Popen, unique_id: str,
+                                             job_log: JobOutputLog, expected_frames: Optional[int] = None):
+        """
+        读取 Manim 的原始字节输出并实时解析进度，按 [RENDER] PROGRESS_INTERVAL_SECONDS 限频发布。
+        进度条以 \\r 原地重绘，按 \\r 与 \\n 切分后逐段解析；已知整个场景的总帧数时，
+        按"已完成动画的帧数 + 当前动画帧数"计算整体进度，否则按单个动画的百分比计算。
+        完整的行写入任务日志，进度条重绘段只在发布时写入。
+        返回采样到的子进程峰值常驻内存（字节，无法读取时为 None），采样与进度发布同频
+        """
+        progress_monitor.update_progress(40, "正在渲染动画...", unique_id=unique_id)
         
         last_reported_progress = 30 # 从30%开始监控，因为前面有准备步骤
+        last_published = 0.0
+        pending = None # 尚未发布的最新进度 (mapped_progress, task, frames)
+        completed_frames = 0 # 已完成动画的帧数之和
+        current_animation = None
+        current_animation_frames = 0
+        peak_rss = None
+        last_sampled = 0.0
+
+        def publish(now: float):
+            nonlocal last_reported_progress, last_published, pending
+            mapped_progress, task, frames = pending
+            progress_monitor.update_progress(
+                mapped_progress, task, unique_id=unique_id,
+                current_animation=frames, total_animations=expected_frames if frames is not None else None
+            )
+            last_reported_progress = mapped_progress
+            last_published = now
+            pending = None
         
-        # 实时读取 Manim 进程的输出
-        for line in process.stdout:
-            # 统一用 info，避免旧进程中 Logger 没有 debug 方法导致异常
-            logger.info(f"Manim Output: {line.strip()}")
-            
-            match_detailed = progress_regex_detailed.match(line)
-            if match_detailed:
-                try:
-                    current_h, current_m, current_s, total_h, total_m, total_s, percentage_str = match_detailed.groups()
-                    current_seconds = int(current_h) * 3600 + int(current_m) * 60 + int(current_s)
-                    total_seconds = int(total_h) * 3600 + int(total_m) * 60 + int(total_s)
-                    percentage = int(percentage_str)
-                    
-                    # 将 Manim 的 0-100% 映射到我们的 40-85% 范围
-                    mapped_progress = int(40 + (percentage / 100) * (85 - 40))
-                    if mapped_progress > last_reported_progress:
-                        progress_monitor.update_progress(mapped_progress, f"正在渲染动画... ({percentage}%)")
-                        last_reported_progress = mapped_progress
-                        logger.info(f"渲染进度更新: {mapped_progress}% ({line.strip()})")
-                except Exception as e:
-                    logger.warning(f"解析Manim详细进度失败: {line.strip()}, 错误: {e}")
-                continue # 处理完这行就进入下一行
-
-            match_simple = progress_regex_simple.match(line)
-            if match_simple:
-                try:
-                    percentage = int(match_simple.group(1))
-                    mapped_progress = int(40 + (percentage / 100) * (85 - 40))
-                    if mapped_progress > last_reported_progress:
-                        progress_monitor.update_progress(mapped_progress, f"正在渲染动画... ({percentage}%)")
-                        last_reported_progress = mapped_progress
-                        logger.info(f"渲染进度更新: {mapped_progress}% ({line.strip()})")
-                except Exception as e:
-                    logger.warning(f"解析Manim简单进度失败: {line.strip()}, 错误: {e}")
+        for segment, is_redraw in iter_segments(process.stdout):
+            sampled_at = time.time()
+            if sampled_at - last_sampled >= self.progress_interval:
+                # VmHWM 是进程启动以来的峰值，进程退出前的最后一次采样即为整个渲染的峰值
+                peak_rss = process_peak_rss(process.pid) or peak_rss
+                last_sampled = sampled_at
+            sample = parse_progress(segment)
+            if sample is None:
+                job_log.write(segment)
+                # 所有动画渲染完成后 Manim 合并分段视频
+                if "Combining to Movie file" in segment:
+                    self._mark_stage(unique_id, 'encoding', only_after='frame_rendering')
+                # 如果 Manim 输出中包含错误信息，显示在状态中（job_log 已写入全局日志）
+                if "ERROR" in segment.upper() or "FATAL" in segment.upper():
+                    progress_monitor.update_progress(last_reported_progress, f"Manim警告/错误: {segment.strip()}",
+                                                     unique_id=unique_id)
                 continue
-            
-            # 如果 Manim 输出中包含错误信息，也记录下来
-            if "ERROR" in line.upper() or "FATAL" in line.upper():
-                logger.error(f"Manim子进程错误输出: {line.strip()}")
-                progress_monitor.update_progress(last_reported_progress, f"Manim警告/错误: {line.strip()}")
-        
-        # 渲染循环结束后，确保进度条至少达到85%
-        if last_reported_progress < 85:
-            progress_monitor.update_progress(85, "渲染完成，处理文件...")
-
-    def _find_generated_video(self, unique_id: str) -> Optional[str]:
-        """
-        在常见的 Manim 输出目录中查找与 unique_id 匹配的视频文件。
-        1) 优先检查配置的视频目录
-        2) 兼容查找项目根下的 media/ 与 media/videos/ 目录
-        """
-        video_pattern = f"stroboscope_{unique_id}.mp4"
-        # Derive media roots from project root instead of CWD
-        from .utils import config_manager as _cfg
-        project_root = str(_cfg.project_root)
-        search_roots = [
-            file_manager.video_dir,
-            os.path.join(file_manager.video_dir, 'videos'),
-            os.path.join(project_root, 'media'),
-            os.path.join(project_root, 'media', 'videos')
-        ]
 
-        for root_dir in search_roots:
-            if not os.path.exists(root_dir):
+            self._mark_stage(unique_id, 'frame_rendering', only_after='subprocess_startup')
+            frames = None
+            if expected_frames and sample['frame'] is not None:
+                # 进入下一个动画时把上一个动画的帧数计入已完成部分
+                if sample['animation'] is not None and sample['animation'] != current_animation:
+                    completed_frames += current_animation_frames
+                    current_animation = sample['animation']
+                current_animation_frames = sample['total_frames']
+                frames = min(expected_frames, completed_frames + sample['frame'])
+                percentage = int(frames / expected_frames * 100)
+                if frames >= expected_frames:
+                    self._mark_stage(unique_id, 'encoding', only_after='frame_rendering')
+            else:
+                percentage = sample['percentage']
+
+            # 将 Manim 的 0-100% 映射到我们的 40-85% 范围
+            mapped_progress = int(40 + (percentage / 100) * (85 - 40))
+            if mapped_progress <= last_reported_progress and (pending is None or mapped_progress <= pending[0]):
+                if not is_redraw:
+                    job_log.write(segment)
                 continue
-            logger.info(f"尝试在 {root_dir} 及其子目录中查找视频文件: {video_pattern}")
-
-            expected_path = os.path.join(root_dir, video_pattern)
-            if os.path.exists(expected_path):
-                logger.info(f"视频文件在预期路径找到: {expected_path}")
-                return expected_path
-
-            # 遍历子目录
-            for root, _, files in os.walk(root_dir):
-                for file in files:
-                    # 精确匹配或包含 unique_id 的 mp4 文件都接受（不同 Manim 版本可能附加后缀）
-                    if file == video_pattern or (file.endswith('.mp4') and unique_id in file):
-                        found_path = os.path.join(root, file)
-                        logger.info(f"视频文件通过遍历找到: {found_path}")
-                        return found_path
-
-        # 输出关键目录快照，帮助定位
-        try:
-            for probe in [file_manager.video_dir, os.path.join(file_manager.video_dir, 'videos')]:
-                if os.path.exists(probe):
-                    entries = ", ".join(sorted(os.listdir(probe)))
-                    logger.warning(f"目录快照 {probe}: {entries}")
-                else:
-                    logger.warning(f"目录不存在 {probe}")
-        except Exception as snap_err:
-            logger.warning(f"列举目录失败: {snap_err}")
+            pending = (mapped_progress, f"正在渲染动画... ({percentage}%)", frames)
+            now = time.time()
+            if now - last_published >= self.progress_interval:
+                publish(now)
+                job_log.write(segment)
+                job_log.summary(f"渲染进度 {mapped_progress}% ({segment.strip()})")
+            elif not is_redraw:
+                job_log.write(segment)
 
-        logger.warning(f"未能在常见目录中找到视频文件: {video_pattern}")
-        return None
+        if pending is not None:
+            publish(time.time())
+        
+        # 渲染循环结束后，确保进度条至少达到85%
+        if last_reported_progress < 85:
+            progress_monitor.update_progress(85, "渲染完成，处理文件...", unique_id=unique_id)
+        return peak_rss
 
-    def get_render_status(self) -> Dict[str, Any]:
-        """获取渲染状态"""
-        return progress_monitor.get_status()
+    def get_render_status(self, unique_id: str = None) -> Optional[Dict[str, Any]]:
+        """获取渲染状态；指定 unique_id 时返回该任务的状态，并附带数值 ETA"""
+        status = progress_monitor.get_status(unique_id)
+        if status and status['unique_id']:
+            status.update(self.eta_fields(status))
+        return status
     
 # 全局实例
 render_engine = RenderEngine()
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+渲染历史与耗时预测
+每个结束的渲染任务记录质量、帧率、帧数、每帧像素数、渲染方式与各阶段耗时（SQLite），
+并据此预测新任务的渲染耗时；没有历史时回退到 QUALITY_SETTINGS 中的 time_estimate。
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import statistics
+from typing import Any, Dict, List, Optional
+from .utils import file_manager, logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    engine TEXT NOT NULL,           -- manim / fast
+    variant TEXT NOT NULL,          -- 渲染方式，如 full/opengl、full/cairo、warm、layered、fast
+    quality_level INTEGER NOT NULL,
+    fps INTEGER NOT NULL,
+    frames INTEGER NOT NULL,        -- 实际需要渲染的帧数
+    pixels INTEGER,                 -- 每帧像素数（宽 × 高）
+    success INTEGER NOT NULL,
+    queue_seconds REAL,             -- 排队等待
+    prepare_seconds REAL,           -- 开始执行到开始渲染（生成场景、准备参数）
+    render_seconds REAL,            -- 渲染（Manim / 光栅化编码）
+    finalize_seconds REAL,          -- 渲染结束到登记结果（查找、复制、写入缓存）
+    total_seconds REAL NOT NULL,    -- 开始执行到结束（不含排队）
+    stages TEXT,                    -- 各渲染阶段（RENDER_STAGES）的耗时，JSON 对象 {阶段: 秒}
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_renders_variant ON renders(engine, variant, finished_at);
+"""
+
+# 每种渲染方式参与预测的最近成功记录数
+RECENT_SAMPLES = 50
+# 线性拟合所需的最少记录数
+MIN_FIT_SAMPLES = 3
+
+
+def parse_time_estimate(text: str) -> Optional[float]:
+    """将 QUALITY_SETTINGS 中的 time_estimate（如 "60-120秒"）解析为秒数（取区间中点）"""
+    numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", text or '')]
+    if not numbers:
+        return None
+    return sum(numbers[:2]) / len(numbers[:2])
+
+
+class RenderHistory:
+    """渲染历史（SQLite，WAL 模式，单连接 + 锁）与耗时模型"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """旧版本的历史没有 pixels / stages 列：补上这两列（已有记录留空）"""
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(renders)")}
+        for column, column_type in (('pixels', 'INTEGER'), ('stages', 'TEXT')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE renders ADD COLUMN {column} {column_type}")
+
+    def record(self, run: Dict[str, Any]):
+        """记录一次渲染；run 包含 job_id/engine/variant/quality_level/fps/frames/pixels/success 与各阶段耗时"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    """INSERT INTO renders (job_id, engine, variant, quality_level, fps, frames, pixels, success,
+                                            queue_seconds, prepare_seconds, render_seconds, finalize_seconds,
+                                            total_seconds, stages, finished_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (run['job_id'], run['engine'], run['variant'], run['quality_level'], run['fps'], run['frames'],
+                     run.get('pixels'), 1 if run['success'] else 0, run.get('queue_seconds'), run.get('prepare_seconds'),
+                     run.get('render_seconds'), run.get('finalize_seconds'), run['total_seconds'],
+                     json.dumps(run.get('stages') or {}), time.time())
+                )
+        except Exception as e:
+            logger.warning(f"记录渲染历史失败: {e}")
+
+    def recent(self, engine: str, variant: str, limit: int = RECENT_SAMPLES) -> List[Dict[str, Any]]:
+        """某种渲染方式最近的成功记录（stages 解析为 {阶段: 秒}）"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT * FROM renders WHERE engine = ? AND variant = ? AND success = 1
+                   ORDER BY finished_at DESC LIMIT ?""",
+                (engine, variant, limit)
+            ).fetchall()
+        samples = [dict(row) for row in rows]
+        for sample in samples:
+            sample['stages'] = json.loads(sample['stages']) if sample['stages'] else {}
+        return samples
+
+    def predict_duration(self, engine: str, variant: str, quality_level: int, frames: int,
+                         pixels: Optional[int] = None, fallback: Optional[float] = None) -> Optional[float]:
+        """
+        预测任务执行耗时（秒，不含排队），按质量档位分别建模（各档位的分辨率与编码预设不同）：
+        - 同一渲染方式、同一档位的最近记录帧数有差异时，按 耗时 = 固定开销 + 每帧耗时 × 帧数 做最小二乘拟合；
+        - 否则取同档位记录的中位数（按帧数比例缩放）；
+        - 该档位没有记录时，按其他档位的每像素帧耗时（耗时 / (帧数 × 每帧像素数)）的中位数估算；
+        - 没有历史时返回 fallback
+        """
+        samples = self.recent(engine, variant)
+        same_quality = [s for s in samples if s['quality_level'] == quality_level]
+        if len(same_quality) >= MIN_FIT_SAMPLES and len({s['frames'] for s in same_quality}) > 1:
+            xs = [s['frames'] for s in same_quality]
+            ys = [s['total_seconds'] for s in same_quality]
+            mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+            var_x = sum((x - mean_x) ** 2 for x in xs)
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+            if slope > 0:
+                intercept = max(0.0, mean_y - slope * mean_x)
+                return intercept + slope * frames
+        if same_quality:
+            median_seconds = statistics.median(s['total_seconds'] for s in same_quality)
+            median_frames = statistics.median(s['frames'] for s in same_quality)
+            return median_seconds * frames / max(1, median_frames)
+        with_pixels = [s for s in samples if s['pixels']]
+        if pixels and with_pixels:
+            per_pixel_frame = statistics.median(s['total_seconds'] / (max(1, s['frames']) * s['pixels'])
+                                                for s in with_pixels)
+            return per_pixel_frame * frames * pixels
+        if samples:
+            return statistics.median(s['total_seconds'] / max(1, s['frames']) for s in samples) * frames
+        return fallback
+
+# 全局实例
+render_history = RenderHistory(os.path.join(file_manager.data_dir, 'render_history.sqlite3'))
@@ -0,0 +1,289 @@
+"""
+参数扫描
+对旋转速度（RPM）、闪烁频率（Hz）与质量档位的网格或列表批量渲染：
+多个任务同时提交给渲染引擎并行执行，按内容键（与渲染缓存相同）跳过已有的输出，
+并写出包含各任务耗时的 JSON / CSV 清单。
+
+命令行用法（在项目根目录）：
+    python -m stroboscope.sweep --rpm 30 --hz 0,0.4,0.5 --quality 1:3 --engine fast --out experiment_videos
+库调用：
+    from stroboscope.sweep import build_grid, run_sweep
+    results = run_sweep(build_grid([30], [0.4, 0.5], [2]), 'experiment_videos', workers=4)
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from .utils import file_manager, progress_monitor, logger
+from .render_cache import render_cache
+from .render_engine import render_engine, RENDER_ENGINES
+
+DEFAULT_MANIFEST = 'sweep_manifest.json'
+DEFAULT_NAME_TEMPLATE = '{label}.mp4'
+MANIFEST_FIELDS = (
+    'label', 'rotation_speed', 'flash_frequency', 'quality', 'engine', 'cache_key', 'output',
+    'status', 'error', 'queue_seconds', 'render_seconds', 'total_seconds'
+)
+TERMINAL_STATES = ('done', 'failed', 'cancelled')
+
+
+def parse_values(text: str) -> List[float]:
+    """解析取值：逗号分隔的列表（"0,0.4,0.5"）或闭区间网格 start:stop[:step]（"0:1:0.25"，步长默认 1）"""
+    values: List[float] = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if ':' in part:
+            fields = [float(f) for f in part.split(':')]
+            start, stop = fields[0], fields[1]
+            step = fields[2] if len(fields) > 2 else 1.0
+            if step <= 0:
+                raise ValueError(f"步长必须为正数: {part}")
+            count = int(round((stop - start) / step)) + 1
+            values.extend(round(start + i * step, 10) for i in range(max(0, count)))
+        else:
+            values.append(float(part))
+    return values
+
+
+def build_grid(rpms: Iterable[float], flash_hz: Iterable[float], qualities: Iterable[int]) -> List[Dict[str, Any]]:
+    """三组取值的笛卡尔积，每项带有默认标签"""
+    items = []
+    for rpm, hz, quality in itertools.product(rpms, flash_hz, qualities):
+        items.append({
+            'label': f"rpm{rpm:g}_hz{hz:g}_q{int(quality)}",
+            'rotation_speed': float(rpm),
+            'flash_frequency': float(hz),
+            'quality': int(quality),
+        })
+    return items
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """读取已有清单（JSON 或 CSV），不存在时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            if path.lower().endswith('.csv'):
+                return list(csv.DictReader(f))
+            return json.load(f).get('items', [])
+    except (OSError, ValueError) as e:
+        logger.warning(f"读取扫描清单失败，将忽略: {path} -> {e}")
+        return []
+
+
+def write_manifest(path: str, results: List[Dict[str, Any]], summary: Dict[str, Any]):
+    """写出清单：.csv 为每项一行，其他扩展名为 JSON（含汇总）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            json.dump({'summary': summary, 'items': results}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _link_or_copy(source: str, destination: str):
+    """优先硬链接，跨文件系统时复制"""
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return
+    tmp_path = f"{destination}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def _render_item(item: Dict[str, Any], output_path: str, engine: str, timeout: float,
+                 derive_tiers: bool = None) -> Dict[str, Any]:
+    """提交一个渲染任务并等待完成，把视频放到 output_path"""
+    unique_id = f"sweep_{uuid.uuid4().hex[:12]}"
+    submitted = time.time()
+    while not render_engine.render_animation(item['rotation_speed'], item['flash_frequency'], item['quality'],
+                                             unique_id, engine=engine, derive_tiers=derive_tiers):
+        # 队列被其他请求占满：稍后重试
+        if time.time() - submitted > timeout:
+            return {'status': 'failed', 'error': '渲染队列已满'}
+        time.sleep(1.0)
+
+    status = progress_monitor.wait_until_finished(unique_id, timeout - (time.time() - submitted))
+    total_seconds = time.time() - submitted
+    if not status or status['state'] != 'done':
+        if status and status['state'] not in TERMINAL_STATES:
+            render_engine.cancel_render(unique_id, '扫描任务超时')
+        error = (status or {}).get('error') or ('超时' if status else '任务不存在')
+        return {'status': 'failed', 'error': error, 'total_seconds': round(total_seconds, 2)}
+
+    video_path = file_manager.get_video_path(unique_id)
+    if not video_path or not os.path.exists(video_path):
+        return {'status': 'failed', 'error': '视频文件不存在', 'total_seconds': round(total_seconds, 2)}
+    _link_or_copy(video_path, output_path)
+    queue_seconds = (status['start_time'] - status['queued_time']) if status.get('start_time') else 0.0
+    return {
+        'status': 'rendered' if status.get('start_time') else 'cached', # 命中渲染缓存的任务不会开始执行
+        'error': None,
+        'queue_seconds': round(queue_seconds, 2),
+        'render_seconds': round(total_seconds - queue_seconds, 2),
+        'total_seconds': round(total_seconds, 2),
+    }
+
+
+def run_sweep(items: List[Dict[str, Any]], output_dir: str, engine: str = None, workers: int = None,
+              manifest_path: str = None, name_template: str = DEFAULT_NAME_TEMPLATE,
+              timeout: float = 1800, derive_tiers: bool = None, force: bool = False) -> List[Dict[str, Any]]:
+    """
+    并行渲染一组参数，返回每项的结果（同时写入清单）。
+    items 每项为 {'label', 'rotation_speed', 'flash_frequency', 'quality'}；
+    输出文件名由 name_template 生成（可用 {label} 与 {key}）。
+    清单中记录了输出对应的内容键：输出已存在且内容键相同则跳过，
+    其他输出已有相同内容时直接链接，否则提交渲染（渲染缓存命中时立即完成）。
+    输出目录中已存在、但清单中没有记录的文件（如手动放入或早期版本生成的视频）视为已有输出并跳过，
+    force 为 True 时才重新渲染并覆盖。
+    workers 为同时进行的任务数，默认使用渲染引擎的工作线程数。
+    derive_tiers 为 True 时按派生模式渲染（同一参数的多个档位只渲染一次最高档），None 时使用配置。
+    """
+    engine = (engine or render_engine.default_engine).lower()
+    if engine not in RENDER_ENGINES:
+        raise ValueError(f"未知的渲染引擎: {engine}")
+    workers = max(1, workers or render_engine.max_workers)
+    render_engine.ensure_capacity(workers)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, DEFAULT_MANIFEST)
+
+    # 已有输出的内容键：来自上一次的清单，且文件仍然存在
+    previous_entries = load_manifest(manifest_path)
+    known_outputs: Dict[str, str] = {}
+    for entry in previous_entries:
+        path = os.path.join(output_dir, entry.get('output') or '')
+        if entry.get('cache_key') and entry.get('status') != 'failed' and os.path.isfile(path):
+            known_outputs[entry['output']] = entry['cache_key']
+    outputs_by_key = {key: name for name, key in known_outputs.items()}
+    manifest_outputs = {entry.get('output') for entry in previous_entries}
+
+    started = time.time()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    to_render, duplicates = [], []
+    claimed_outputs: Dict[str, str] = {}
+    scheduled: Dict[str, str] = {}  # 本次扫描中首个渲染某参数的输出
+    for index, item in enumerate(items):
+        key = render_cache.make_key(item['rotation_speed'], item['flash_frequency'], item['quality'], engine)
+        output_name = name_template.format(label=item['label'], key=key[:16])
+        result = {
+            'label': item['label'],
+            'rotation_speed': item['rotation_speed'],
+            'flash_frequency': item['flash_frequency'],
+            'quality': item['quality'],
+            'engine': engine,
+            'cache_key': key,
+            'output': output_name,
+            'error': None,
+            'queue_seconds': 0.0,
+            'render_seconds': 0.0,
+            'total_seconds': 0.0,
+        }
+        results[index] = result
+        if output_name in claimed_outputs:
+            # 同一输出文件在本次扫描中出现多次（标签重复）：只处理第一次
+            if claimed_outputs[output_name] == key:
+                result['status'] = 'reused'
+            else:
+                result.update(status='failed', error=f"输出文件名与其他参数冲突: {output_name}")
+            continue
+        claimed_outputs[output_name] = key
+        if known_outputs.get(output_name) == key:
+            result['status'] = 'skipped'
+        elif not force and output_name not in manifest_outputs and os.path.isfile(os.path.join(output_dir, output_name)):
+            # 清单中没有记录的已有文件：无法确认其参数，不覆盖
+            result['status'] = 'skipped'
+            logger.info(f"参数扫描: 输出已存在且清单中没有记录，跳过（--force 可覆盖）: {output_name}")
+        elif key in scheduled:
+            duplicates.append(index)  # 同一次扫描中重复的参数只渲染一次，等首个渲染完成后再链接
+        elif key in outputs_by_key:
+            _link_or_copy(os.path.join(output_dir, outputs_by_key[key]), os.path.join(output_dir, output_name))
+            result['status'] = 'reused'
+        else:
+            scheduled[key] = output_name
+            to_render.append(index)
+
+    logger.info(f"参数扫描: 共 {len(items)} 项，需渲染 {len(to_render)} 项，并行 {workers} 个 (引擎: {engine})")
+
+    def render_one(index: int):
+        result = results[index]
+        output_path = os.path.join(output_dir, result['output'])
+        try:
+            result.update(_render_item(items[index], output_path, engine, timeout, derive_tiers))
+        except Exception as e:
+            result.update(status='failed', error=str(e))
+        logger.info(f"参数扫描: {result['label']} -> {result['status']} ({result['total_seconds']}秒)")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sweep') as executor:
+        list(executor.map(render_one, to_render))
+
+    for index in duplicates:
+        result = results[index]
+        source = scheduled[result['cache_key']]
+        source_path = os.path.join(output_dir, source)
+        if os.path.isfile(source_path):
+            _link_or_copy(source_path, os.path.join(output_dir, result['output']))
+            result['status'] = 'reused'
+        else:
+            result.update(status='failed', error=f"相同参数的 {source} 渲染失败")
+
+    summary = {
+        'engine': engine,
+        'workers': workers,
+        'items': len(results),
+        'wall_seconds': round(time.time() - started, 2),
+        'counts': {status: sum(1 for r in results if r['status'] == status)
+                   for status in ('rendered', 'cached', 'skipped', 'reused', 'failed')},
+        'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    # 清单保留上一次扫描中本次未涉及的输出，使多次扫描共用同一份清单
+    current_outputs = {r['output'] for r in results}
+    carried = [entry for entry in previous_entries if entry.get('output') not in current_outputs]
+    write_manifest(manifest_path, results + carried, summary)
+    logger.info(f"参数扫描完成: {summary['counts']}，用时 {summary['wall_seconds']} 秒，清单: {manifest_path}")
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="频闪效应参数扫描：并行渲染参数网格并写出清单")
+    parser.add_argument('--rpm', required=True, help="旋转速度（RPM）：列表 30,60 或网格 30:120:30")
+    parser.add_argument('--hz', required=True, help="闪烁频率（Hz）：列表 0,0.4,0.5 或网格 0:1:0.1")
+    parser.add_argument('--quality', default='2', help="质量档位：列表 1,3 或网格 1:3（默认 2）")
+    parser.add_argument('--engine', choices=RENDER_ENGINES, default=None, help="渲染引擎（默认使用配置）")
+    parser.add_argument('--out', default='experiment_videos', help="输出目录（默认 experiment_videos）")
+    parser.add_argument('--manifest', default=None, help=f"清单路径，.json 或 .csv（默认 <输出目录>/{DEFAULT_MANIFEST}）")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="同时进行的任务数（默认 CPU 核数）")
+    parser.add_argument('--name', default=DEFAULT_NAME_TEMPLATE, help="输出文件名模板，可用 {label} 与 {key}")
+    parser.add_argument('--timeout', type=float, default=1800, help="单个任务的超时（秒）")
+    parser.add_argument('--force', action='store_true',
+                        help="重新渲染并覆盖输出目录中已存在、但清单中没有记录的文件")
+    parser.add_argument('--derive-tiers', action='store_const', const=True, default=None,
+                        help="同一参数的多个质量档位只渲染一次最高档，其余档位由其派生（默认使用配置）")
+    args = parser.parse_args(argv)
+
+    items = build_grid(parse_values(args.rpm), parse_values(args.hz), [int(q) for q in parse_values(args.quality)])
+    results = run_sweep(items, args.out, engine=args.engine, workers=args.workers,
+                        manifest_path=args.manifest, name_template=args.name, timeout=args.timeout,
+                        derive_tiers=args.derive_tiers, force=args.force)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 1 if any(r['status'] == 'failed' for r in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
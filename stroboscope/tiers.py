@@ -0,0 +1,69 @@
+"""
+质量档位派生
+指针每帧的转角为 fr·2π/fps，第 i 帧对应时刻 i/fps，场景中的文字也与帧率无关，
+因此帧率为最高档整数分之一的低档位视频恰好是最高档视频按固定间隔抽帧的结果。
+派生模式只渲染一次最高档，再用一次 ffmpeg（split 后分别抽帧、缩放、按各档编码参数编码）输出其余档位。
+"""
+
+from typing import List, Tuple
+from .manim_manager import scene_manager
+from .compositor import LayerCompositor
+from .encoder import encoder_args
+
+
+def top_quality_level() -> int:
+    """分辨率最高（相同时帧率最高）的档位"""
+    return max((int(level) for level in scene_manager.quality_settings),
+               key=lambda level: (LayerCompositor.get_frame_size(scene_manager.get_quality_setting(level))[1],
+                                  int(scene_manager.get_quality_setting(level).get('fps', 60))))
+
+
+def derivable_levels(top_level: int) -> List[int]:
+    """可以由 top_level 派生的其他档位：帧率整除最高档帧率，且分辨率不高于最高档"""
+    top_setting = scene_manager.get_quality_setting(top_level)
+    top_fps = int(top_setting.get('fps', 60))
+    top_height = LayerCompositor.get_frame_size(top_setting)[1]
+    levels = []
+    for level in sorted(int(level) for level in scene_manager.quality_settings):
+        setting = scene_manager.get_quality_setting(level)
+        fps = int(setting.get('fps', 60))
+        if level != top_level and top_fps % fps == 0 and LayerCompositor.get_frame_size(setting)[1] <= top_height:
+            levels.append(level)
+    return levels
+
+
+def build_derive_command(ffmpeg_path: str, source_path: str, top_level: int,
+                         targets: List[Tuple[int, str]]) -> List[str]:
+    """
+    由最高档视频一次输出多个档位：targets 为 [(档位, 输出路径)]。
+    每一路按帧序号整除抽帧（select 按帧号取，不按时间戳取整，结果与该档位逐帧渲染的时间轴一致），
+    再用 lanczos 缩放到该档位的分辨率，并使用该档位的编码参数
+    """
+    top_fps = int(scene_manager.get_quality_setting(top_level).get('fps', 60))
+    filters = [f"[0:v]split={len(targets)}" + ''.join(f"[s{index}]" for index in range(len(targets)))]
+    outputs: List[str] = []
+    for index, (level, output_path) in enumerate(targets):
+        setting = scene_manager.get_quality_setting(level)
+        fps = int(setting.get('fps', 60))
+        width, height = LayerCompositor.get_frame_size(setting)
+        filters.append(
+            f"[s{index}]select='not(mod(n\\,{top_fps // fps}))',setpts=N/({fps}*TB),"
+            f"scale={width}:{height}:flags=lanczos,format=yuv420p[v{index}]"
+        )
+        outputs += [
+            "-map", f"[v{index}]",
+            "-r", str(fps),
+            "-c:v", "libx264",
+            "-pix_fmt", "yuv420p",
+            *encoder_args(setting),
+            "-movflags", "+faststart",
+            output_path,
+        ]
+    return [
+        ffmpeg_path, "-y",
+        "-loglevel", "error",
+        "-i", source_path,
+        "-filter_complex", ";".join(filters),
+        *outputs,
+    ]
+
@@ -9,16 +9,30 @@ import os
 from pathlib import Path
 import shutil
 import time
+import queue
+import atexit
 import configparser
 import logging
-from datetime import datetime
+import logging.handlers
+import signal
+import subprocess
 from typing import Dict, Any, Optional
 import json # 确保导入 json
 import threading
+from collections import OrderedDict, deque
+from .artifact_index import ArtifactIndex
 
 class ConfigManager:
     """配置管理器"""
     
+    # 只在启动时读取的配置（None 表示整个小节）：重新加载后需重启服务才会生效
+    RESTART_REQUIRED_KEYS = {
+        'APP': ('DEBUG', 'HOST', 'PORT', 'SECRET_KEY', 'USE_X_SENDFILE'),
+        'PATHS': None,
+        'RENDER': ('WORKERS', 'MAX_QUEUE_SIZE'),
+        'LOGGING': ('MAX_FILE_MB', 'BACKUP_COUNT'),
+    }
+    
     def __init__(self, config_file: str = "config.ini"):
         # Resolve project root as the repository root: one level up from this package directory
         self.project_root = Path(__file__).resolve().parents[1]
@@ -26,6 +40,7 @@ class ConfigManager:
         cfg_path = Path(config_file)
         self.config_file = str(cfg_path if cfg_path.is_absolute() else self.project_root / cfg_path)
         self.config = configparser.ConfigParser()
+        self._reload_listeners = []
         self.load_config()
     
     def load_config(self):
@@ -35,29 +50,85 @@ class ConfigManager:
         else:
             self.create_default_config()
     
+    def add_reload_listener(self, callback):
+        """注册配置重新加载后的回调（如重新探测渲染环境）"""
+        self._reload_listeners.append(callback)
+    
+    def reload(self) -> list:
+        """重新读取配置文件并通知已注册的回调，返回值已改变但需重启才生效的键（SECTION.KEY）"""
+        before = self._restart_required_values()
+        self.config = configparser.ConfigParser()
+        self.load_config()
+        for callback in self._reload_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"配置重新加载回调失败: {e}")
+        after = self._restart_required_values()
+        return sorted(key for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+    
+    def _restart_required_values(self) -> Dict[str, Optional[str]]:
+        """当前只在启动时读取的配置值"""
+        values = {}
+        for section, keys in self.RESTART_REQUIRED_KEYS.items():
+            if not self.config.has_section(section):
+                continue
+            for key in keys if keys is not None else (k.upper() for k in self.config.options(section)):
+                values[f"{section}.{key}"] = self.config.get(section, key, fallback=None)
+        return values
+    
     def create_default_config(self):
         """创建默认配置"""
         self.config['APP'] = {
             'DEBUG': 'True',
             'HOST': '127.0.0.1',
             'PORT': '5000',
-            'SECRET_KEY': 'your-secret-key-here' # !!! 生产环境请务必修改此项 !!!
+            'SECRET_KEY': 'your-secret-key-here', # !!! 生产环境请务必修改此项 !!!
+            'ADMIN_TOKEN': ''
         }
         
         self.config['MANIM'] = {
-            'QUALITY_SETTINGS': '{"1": {"flag": "-ql", "name": "快速", "resolution": "480p", "fps": 15, "time_estimate": "15-30秒"}, "2": {"flag": "-qm", "name": "标准", "resolution": "720p", "fps": 30, "time_estimate": "30-60秒"}, "3": {"flag": "-qh", "name": "高质量", "resolution": "1080p", "fps": 60, "time_estimate": "60-120秒"}}'
+            'QUALITY_SETTINGS': '{"1": {"flag": "-ql", "name": "快速", "resolution": "480p", "fps": 15, "time_estimate": "15-30秒", "timeout": 120, "encoder": {"preset": "ultrafast", "tune": "zerolatency", "crf": 28, "threads": 0, "gop": 30}}, "2": {"flag": "-qm", "name": "标准", "resolution": "720p", "fps": 30, "time_estimate": "30-60秒", "timeout": 300, "encoder": {"preset": "veryfast", "crf": 23, "threads": 0, "gop": 60}}, "3": {"flag": "-qh", "name": "高质量", "resolution": "1080p", "fps": 60, "time_estimate": "60-120秒", "timeout": 600, "encoder": {"preset": "slow", "crf": 20, "threads": 0, "gop": 120}}}'
         }
         
         self.config['PATHS'] = {
             'TEMP_DIR': 'temp_files',
             'LOGS_DIR': 'logs',
             'MANIM_SCENES_DIR': 'manim_scenes',
-            'VIDEO_OUTPUT_DIR': 'static/animations'
+            'VIDEO_OUTPUT_DIR': 'static/animations',
+            'DATA_DIR': 'data'
+        }
+        
+        self.config['RENDER'] = {
+            'WORKERS': '2',
+            'MAX_QUEUE_SIZE': '20',
+            'PIPELINE': 'full',
+            'ENGINE': 'manim',
+            'MANIM_MODE': 'subprocess',
+            'MANIM_ENCODER': 'off',
+            'WARM_WORKER_MAX_JOBS': '20',
+            'RENDERER': 'auto',
+            'LATEST_WINS': 'false',
+            'STREAMING': 'false',
+            'STREAM_SEGMENT_SECONDS': '2',
+            'PROGRESS_INTERVAL_SECONDS': '0.2',
+            'MOSAIC_MAX_PANELS': '9',
+            'DERIVE_TIERS': 'false'
+        }
+        
+        self.config['LOGGING'] = {
+            'MAX_FILE_MB': '10',
+            'BACKUP_COUNT': '5',
+            'SUMMARY_SECONDS': '5'
         }
         
         self.config['CLEANUP'] = {
             'AUTO_CLEANUP_HOURS': '1',
-            'MAX_TEMP_FILES': '50'
+            'MAX_TEMP_FILES': '50',
+            'MAX_DISK_MB': '2048',
+            'JANITOR_INTERVAL_SECONDS': '30',
+            'JANITOR_BATCH_SIZE': '20',
+            'UNINDEXED_SCAN_LIMIT': '500'
         }
         
         self.save_config()
@@ -92,6 +163,8 @@ class FileManager:
         self.logs_dir = os.path.join(str(project_root), self.config.get('PATHS', 'LOGS_DIR', 'logs'))
         self.scenes_dir = os.path.join(str(project_root), self.config.get('PATHS', 'MANIM_SCENES_DIR', 'manim_scenes'))
         self.video_dir = os.path.join(str(project_root), self.config.get('PATHS', 'VIDEO_OUTPUT_DIR', 'static/animations'))
+        self.data_dir = os.path.join(str(project_root), self.config.get('PATHS', 'DATA_DIR', 'data'))
+        self.job_logs_dir = os.path.join(self.logs_dir, 'jobs') # 每个任务的子进程原始输出
         
         # 如果配置里仍是旧路径 src/manim_scenes，则迁移到新路径 manim_scenes
         if os.path.normpath(self.scenes_dir).endswith(os.path.normpath(os.path.join('src', 'manim_scenes'))):
@@ -99,28 +172,37 @@ class FileManager:
         
         # 确保目录存在
         self.ensure_directories()
+        
+        # 视频目录下的产物索引：任务 -> 视频路径、清理查询（不再遍历目录）
+        self.artifact_index = ArtifactIndex(os.path.join(self.data_dir, 'artifacts.sqlite3'), self.video_dir)
     
     def ensure_directories(self):
         """确保所有必要的目录存在"""
-        directories = [self.temp_dir, self.logs_dir, self.scenes_dir, self.video_dir]
+        directories = [self.temp_dir, self.logs_dir, self.job_logs_dir, self.scenes_dir, self.video_dir, self.data_dir]
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
 
     def cleanup_static(self, delete_all_static: bool = False) -> int:
         """清理 static 目录下的文件。
-        - 默认仅清理 `static/animations` 下的文件
+        - 默认仅清理 `static/animations` 下已登记的产物，以及超过 AUTO_CLEANUP_HOURS 的未登记文件
         - 当 delete_all_static=True 时，删除整个 `static` 下的文件（保留目录结构）
         返回删除的文件数量。
         """
         deleted = 0
-        # 默认目标：only animations directory
+        if not delete_all_static:
+            # 默认只清理 animations 下已登记的产物，直接按索引删除；
+            # 未登记的文件可能属于正在渲染的任务，只兜底删除超过 AUTO_CLEANUP_HOURS 的部分
+            entries = self.artifact_index.find()
+            deleted = self.artifact_index.delete([entry['path'] for entry in entries])
+            max_age_hours = float(self.config.get('CLEANUP', 'AUTO_CLEANUP_HOURS', '1'))
+            return deleted + self.cleanup_unindexed(time.time() - max_age_hours * 3600)
+        
         target_dirs = [self.video_dir]
-        if delete_all_static:
-            static_root = os.path.join(str(self.config.project_root), 'static')
-            if os.path.exists(static_root):
-                # 收集 static 下所有子目录
-                subdirs = [os.path.join(static_root, d) for d in os.listdir(static_root)]
-                target_dirs = [p for p in subdirs if os.path.isdir(p)] or [static_root]
+        static_root = os.path.join(str(self.config.project_root), 'static')
+        if os.path.exists(static_root):
+            # 收集 static 下所有子目录
+            subdirs = [os.path.join(static_root, d) for d in os.listdir(static_root)]
+            target_dirs = [p for p in subdirs if os.path.isdir(p)] or [static_root]
 
         for root_dir in target_dirs:
             if not os.path.exists(root_dir):
@@ -143,6 +225,8 @@ class FileManager:
                         os.rmdir(root)
                 except Exception as e:
                     logger.warning(f"删除空目录失败: {root} -> {e}")
+        # 文件已全部删除，清空索引
+        self.artifact_index.delete([entry['path'] for entry in self.artifact_index.find()])
         return deleted
     
     def cleanup_old_files(self, max_age_hours: int = 1, delete_scenes_all: bool = False) -> int:
@@ -166,21 +250,25 @@ class FileManager:
                         except Exception as e:
                             logger.error(f"清理临时文件失败 {file_path}: {e}")
         
-        # 清理视频文件 (Manim的输出，通常在 video_dir 下)
-        if os.path.exists(self.video_dir):
-            for root, dirs, files in os.walk(self.video_dir):
-                for filename in files:
-                    # Manim可能还会生成json文件，这些也应该被清理
-                    if filename.endswith('.mp4') or filename.endswith('.json'): 
-                        file_path = os.path.join(root, filename)
-                        file_age = current_time - os.path.getmtime(file_path) # 使用 getmtime
-                        if file_age > max_age_seconds:
-                            try:
-                                os.remove(file_path)
-                                deleted_count += 1
-                                logger.info(f"清理了旧视频/JSON文件: {file_path}")
-                            except Exception as e:
-                                logger.error(f"清理视频/JSON文件失败 {file_path}: {e}")
+        # 清理视频目录下的旧产物：查询索引，不遍历目录（背景图层长期复用，不按时间清理）
+        expired = self.artifact_index.find(kinds=('video', 'cache', 'stream', 'scratch'),
+                                           created_before=current_time - max_age_seconds)
+        if expired:
+            deleted = self.artifact_index.delete([entry['path'] for entry in expired])
+            deleted_count += deleted
+            logger.info(f"清理了 {deleted} 个旧视频产物")
+        deleted_count += self.cleanup_unindexed(current_time - max_age_seconds)
+
+        # 清理任务日志（目录只有一层，按修改时间清理）
+        if os.path.exists(self.job_logs_dir):
+            for filename in os.listdir(self.job_logs_dir):
+                file_path = os.path.join(self.job_logs_dir, filename)
+                if os.path.isfile(file_path) and current_time - os.path.getmtime(file_path) > max_age_seconds:
+                    try:
+                        os.remove(file_path)
+                        deleted_count += 1
+                    except Exception as e:
+                        logger.error(f"清理任务日志失败 {file_path}: {e}")
 
         # 清理Manim场景文件 (由 ManimSceneManager 生成)
         if os.path.exists(self.scenes_dir):
@@ -200,39 +288,203 @@ class FileManager:
         
         return deleted_count
     
+    def cleanup_unindexed(self, created_before: float) -> int:
+        """删除视频目录下未登记到索引、且早于 created_before 的文件（每次最多检查 UNINDEXED_SCAN_LIMIT 个文件）"""
+        limit = int(self.config.get('CLEANUP', 'UNINDEXED_SCAN_LIMIT', '500'))
+        deleted = 0
+        for relative_path in self.artifact_index.find_unindexed(created_before, limit):
+            path = self.artifact_index.absolute(relative_path)
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError as e:
+                logger.warning(f"删除未登记的文件失败: {path} -> {e}")
+        if deleted:
+            logger.info(f"清理了 {deleted} 个未登记到产物索引的旧文件")
+        return deleted
+
+    def register_video(self, unique_id: str, video_path: str):
+        """登记某个任务对应的实际视频路径（用于缓存命中或合并的重复请求）"""
+        self.artifact_index.link_job(unique_id, video_path)
+
     def get_video_path(self, unique_id: str) -> str:
         """
-        根据 unique_id 获取预期视频文件路径，不检查是否存在。
+        根据 unique_id 获取视频文件路径，不检查是否存在。
+        优先使用索引中登记的路径，否则返回默认命名的预期路径；
         渲染引擎会负责在渲染完成后确认文件存在。
         """
+        registered = self.artifact_index.get_job_output(unique_id)
+        if registered:
+            return registered
         video_pattern = f"stroboscope_{unique_id}.mp4"
         return os.path.join(self.video_dir, video_pattern)
 
+    def get_job_log_path(self, unique_id: str) -> str:
+        """任务子进程原始输出的日志文件路径"""
+        return os.path.join(self.job_logs_dir, f"{unique_id}.log")
+
+def new_process_group_kwargs() -> Dict[str, Any]:
+    """
+    启动子进程时使用的参数：让子进程成为新进程组的首进程，
+    以便取消或超时时连同其派生的 ffmpeg 等子进程一起终止
+    """
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+def kill_process_tree(process: subprocess.Popen, grace_seconds: float = 3.0):
+    """终止子进程及其派生的全部进程：POSIX 先发 SIGTERM 再 SIGKILL，Windows 使用 taskkill /T"""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'nt':
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=grace_seconds)
+                return
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        process.kill()
+    try:
+        process.wait(timeout=grace_seconds)
+    except subprocess.TimeoutExpired:
+        pass
+
+def process_peak_rss(pid: int) -> Optional[int]:
+    """子进程迄今的峰值常驻内存（字节），读取 /proc/<pid>/status 的 VmHWM；非 Linux 或进程已退出时返回 None"""
+    try:
+        with open(f"/proc/{pid}/status", 'r', encoding='ascii', errors='replace') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def reset_peak_rss(pid: int) -> bool:
+    """
+    把进程的峰值常驻内存（VmHWM）重置为当前值：向 /proc/<pid>/clear_refs 写入 5（Linux 4.0+），
+    用于常驻进程按任务采集峰值；非 Linux、内核不支持或进程已退出时返回 False
+    """
+    try:
+        with open(f"/proc/{pid}/clear_refs", 'w', encoding='ascii') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
 class ProgressMonitor:
-    """进度监控器"""
-    
+    """进度监控器
+
+    每个渲染任务按 unique_id 拥有独立的状态记录（queued / running / done / failed / cancelled），
+    同时保留一份"最近更新任务"的全局状态，兼容旧的 /status 接口。
+    每次更新都会递增版本号并唤醒等待者，供 /events 推送进度。
+    任务执行中各步骤的时间区间（span）单独记录在 traces 中，供 /status/<id>/trace 查询。
+    """
+
+    # 已结束任务的状态记录最多保留条数，避免长时间运行后内存无限增长
+    MAX_JOB_RECORDS = 200
+
     def __init__(self):
-        self.status = {
+        self.status = self._new_status()
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.aliases: Dict[str, str] = {} # 合并的重复请求 -> 实际执行渲染的任务
+        self.traces: Dict[str, list] = {} # 任务 -> 按结束时间排列的 span 列表
+        self.lock = threading.Lock() # 添加线程锁
+        self.changed = threading.Condition(self.lock) # 状态变化通知（与 lock 共用同一把锁）
+        self._version = 0
+
+    @staticmethod
+    def _new_status(unique_id: str = None, state: str = 'idle', estimated_time: str = None) -> Dict[str, Any]:
+        """构造一条初始状态记录"""
+        return {
+            'unique_id': unique_id,
+            'state': state,
             'is_rendering': False,
             'progress': 0,
             'current_task': '',
             'error': None,
+            'queued_time': None,
             'start_time': None,
-            'estimated_time': '未知', # 确保始终有默认值
+            'estimated_time': estimated_time if estimated_time else '未知', # 确保始终有默认值
             'current_animation': 0,
             'total_animations': 0,
-            'elapsed_time': '0.0秒' # 确保始终有默认值
+            'elapsed_time': '0.0秒', # 确保始终有默认值
+            'version': 0, # 每次更新递增，用于判断状态是否有变化
+            'stream_playlist': None, # 流式输出的 HLS 播放列表（相对视频目录），渲染中即可播放
+            'predicted_seconds': None # 根据渲染历史预测的执行耗时（秒，不含排队）
         }
-        self.lock = threading.Lock() # 添加线程锁
-    
-    def _update_status_safely(self, **kwargs):
-        """线程安全地更新状态"""
+
+    def _touch_locked(self, job: Dict[str, Any]):
+        """在已持有锁的前提下递增任务版本号并唤醒等待状态变化的线程"""
+        self._version += 1
+        job['version'] = self._version
+        self.changed.notify_all()
+
+    def _update_status_safely(self, unique_id: str = None, **kwargs):
+        """线程安全地更新状态（指定 unique_id 时同时更新该任务的记录）"""
+        with self.lock:
+            self._apply_locked(unique_id, kwargs)
+
+    def _apply_locked(self, unique_id: Optional[str], updates: Dict[str, Any]):
+        """在已持有锁的前提下更新任务记录，并同步到全局状态"""
+        if unique_id is None:
+            self.status.update(updates)
+            return
+        job = self.jobs.get(unique_id)
+        if job is None:
+            job = self._new_status(unique_id)
+            self.jobs[unique_id] = job
+            self._trim_jobs_locked()
+        job.update(updates)
+        self._touch_locked(job)
+        # 全局状态始终反映最近一次更新的任务
+        self.status = job.copy()
+
+    def _trim_jobs_locked(self):
+        """丢弃最早的已结束任务记录"""
+        if len(self.jobs) <= self.MAX_JOB_RECORDS:
+            return
+        for job_id in list(self.jobs.keys()):
+            if len(self.jobs) <= self.MAX_JOB_RECORDS:
+                break
+            if self.jobs[job_id]['state'] in ('done', 'failed', 'cancelled'):
+                del self.jobs[job_id]
+        # 清理指向已丢弃任务的别名与时间线
+        for alias_id in [a for a, target in self.aliases.items() if target not in self.jobs]:
+            del self.aliases[alias_id]
+        for job_id in [j for j in self.traces if j not in self.jobs]:
+            del self.traces[job_id]
+
+    def register_job(self, unique_id: str, estimated_time: str = None, predicted_seconds: float = None):
+        """登记一个排队中的任务"""
+        with self.lock:
+            job = self._new_status(unique_id, state='queued', estimated_time=estimated_time)
+            job['predicted_seconds'] = predicted_seconds
+            job['current_task'] = '排队等待渲染...'
+            job['queued_time'] = time.time()
+            self.jobs[unique_id] = job
+            self.traces[unique_id] = []
+            self._trim_jobs_locked()
+            self._touch_locked(job)
+            self.status = job.copy()
+
+    def link_job(self, unique_id: str, target_id: str):
+        """将 unique_id 的状态指向另一个正在执行的相同任务"""
         with self.lock:
-            self.status.update(kwargs)
+            self.jobs.pop(unique_id, None)
+            self.traces.pop(unique_id, None)
+            self.aliases[unique_id] = target_id
 
-    def start_render(self, estimated_time: str = None):
+    def start_render(self, estimated_time: str = None, unique_id: str = None):
         """开始渲染"""
         self._update_status_safely(
+            unique_id,
+            state='running',
             is_rendering=True,
             progress=0,
             current_task='准备渲染...',
@@ -244,7 +496,8 @@ class ProgressMonitor:
             elapsed_time='0.0秒'
         )
     
-    def update_progress(self, progress: int, task: str, current_animation: int = None, total_animations: int = None):
+    def update_progress(self, progress: int, task: str, current_animation: int = None, total_animations: int = None,
+                        unique_id: str = None):
         """更新进度"""
         updates = {
             'progress': min(progress, 100),
@@ -255,27 +508,156 @@ class ProgressMonitor:
         if total_animations is not None:
             updates['total_animations'] = total_animations
         
-        self._update_status_safely(**updates)
+        self._update_status_safely(unique_id, **updates)
+    
+    def set_stream_playlist(self, unique_id: str, playlist_path: str):
+        """登记任务的流式播放列表（第一个分段写出后调用）"""
+        self._update_status_safely(unique_id, stream_playlist=playlist_path)
     
-    def finish_render(self, success: bool = True, error: str = None):
+    def finish_render(self, success: bool = True, error: str = None, unique_id: str = None):
         """完成渲染"""
         with self.lock: # 锁定以确保状态更新的原子性
-            self.status.update({
+            record = self.jobs.get(unique_id, self.status) if unique_id is not None else self.status
+            updates = {
+                'state': 'done' if success else 'failed',
                 'is_rendering': False,
-                'progress': 100 if success else self.status['progress'],
+                'progress': 100 if success else record['progress'],
                 'current_task': '渲染完成！' if success else f'渲染失败: {error}',
                 'error': error if not success else None
-            })
-            if self.status['start_time']:
-                elapsed_time_val = time.time() - self.status['start_time']
-                self.status['elapsed_time'] = f"{elapsed_time_val:.1f}秒"
+            }
+            if record['start_time']:
+                elapsed_time_val = time.time() - record['start_time']
+                updates['elapsed_time'] = f"{elapsed_time_val:.1f}秒"
             else:
-                self.status['elapsed_time'] = '0.0秒'
+                updates['elapsed_time'] = '0.0秒'
+            self._apply_locked(unique_id, updates)
     
-    def get_status(self) -> Dict[str, Any]:
-        """获取当前状态"""
+    def cancel_job(self, unique_id: str, reason: str = '已取消'):
+        """
+        将任务标记为已取消。
+        合并到其他任务的重复请求会解除关联，改为独立的已取消记录，不影响被等待的任务。
+        """
+        with self.lock:
+            if unique_id in self.aliases:
+                del self.aliases[unique_id]
+                self.jobs[unique_id] = self._new_status(unique_id)
+            record = self.jobs.get(unique_id)
+            if record is None:
+                return
+            updates = {
+                'state': 'cancelled',
+                'is_rendering': False,
+                'current_task': f'已取消: {reason}',
+                'error': reason
+            }
+            if record['start_time']:
+                updates['elapsed_time'] = f"{time.time() - record['start_time']:.1f}秒"
+            self._apply_locked(unique_id, updates)
+
+    def wait_for_update(self, unique_id: str, since_version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        阻塞等待任务状态的版本号超过 since_version，最多等待 timeout 秒。
+        返回最新状态（超时时版本号不变）；未知任务返回 None
+        """
+        deadline = time.time() + timeout
+        with self.changed:
+            while True:
+                job = self.jobs.get(self.aliases.get(unique_id, unique_id))
+                if job is None or job['version'] > since_version:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+        return self.get_status(unique_id)
+
+    def wait_until_finished(self, unique_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待任务结束（由状态变化唤醒，不轮询），超时返回最后一次状态；未知任务返回 None"""
+        deadline = time.time() + timeout
+        status = self.get_status(unique_id)
+        while status and status['state'] not in ('done', 'failed', 'cancelled'):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            status = self.wait_for_update(unique_id, status['version'], remaining)
+        return status
+
+    def active_job_ids(self) -> set:
+        """排队中或渲染中的任务（其产物不可被清理）"""
+        with self.lock:
+            return {uid for uid, job in self.jobs.items() if job['state'] in ('queued', 'running')}
+
+    def active_jobs(self) -> list:
+        """排队中或渲染中任务的状态副本（按登记顺序）"""
+        with self.lock:
+            return [job.copy() for job in self.jobs.values() if job['state'] in ('queued', 'running')]
+
+    def add_span(self, unique_id: str, name: str, start: float, end: Optional[float] = None,
+                 category: str = 'step', args: Dict[str, Any] = None):
+        """
+        记录任务的一个时间区间（end 为 None 时为瞬时事件，如首帧）。
+        category 为 stage（RENDER_STAGES 中的粗粒度阶段）或 step（阶段内的具体步骤）
+        """
+        span = {'name': name, 'category': category, 'start': start, 'end': end}
+        if args:
+            span['args'] = args
+        with self.lock:
+            trace = self.traces.get(unique_id)
+            if trace is not None:
+                trace.append(span)
+
+    def get_trace(self, unique_id: str) -> Optional[Dict[str, Any]]:
+        """
+        任务的时间线：按开始时间排列的 span，时间为 Unix 时间戳（秒），
+        duration 为持续时间（瞬时事件为 None）；合并的重复请求返回实际渲染任务的时间线，未知任务返回 None
+        """
+        with self.lock:
+            target_id = self.aliases.get(unique_id, unique_id)
+            job = self.jobs.get(target_id)
+            if job is None:
+                return None
+            spans = [dict(span) for span in self.traces.get(target_id, ())]
+            state, queued_time = job['state'], job['queued_time']
+        spans.sort(key=lambda span: span['start'])
+        for span in spans:
+            span['duration'] = span['end'] - span['start'] if span['end'] is not None else None
+        return {'unique_id': unique_id, 'render_id': target_id, 'state': state,
+                'queued_time': queued_time, 'spans': spans}
+
+    @staticmethod
+    def to_chrome_trace(trace: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        转换为 Chrome Trace Event 格式（chrome://tracing、Perfetto 可直接打开）：
+        阶段与步骤分两行显示，时间单位为微秒
+        """
+        rows = {'stage': 1, 'step': 2}
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': 1, 'tid': 0, 'args': {'name': f"render {trace['render_id']}"}},
+            *({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': f"{category}s"}}
+              for category, tid in rows.items()),
+        ]
+        for span in trace['spans']:
+            event = {'name': span['name'], 'cat': span['category'], 'pid': 1,
+                     'tid': rows.get(span['category'], 2), 'ts': round(span['start'] * 1e6),
+                     'args': span.get('args', {})}
+            if span['end'] is None:
+                event.update(ph='i', s='t')
+            else:
+                event.update(ph='X', dur=round((span['end'] - span['start']) * 1e6))
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def get_status(self, unique_id: str = None) -> Optional[Dict[str, Any]]:
+        """获取当前状态；指定 unique_id 时返回该任务的状态，未知任务返回 None"""
         with self.lock: # 读取状态时也需要锁定
-            status = self.status.copy()
+            target_id = self.aliases.get(unique_id, unique_id)
+            if unique_id is None:
+                status = self.status.copy()
+            elif target_id in self.jobs:
+                status = self.jobs[target_id].copy()
+                status['unique_id'] = unique_id
+            else:
+                return None
         
         # 计算已用时间（在获取时计算，避免频繁更新状态）
         if status['is_rendering'] and status['start_time']: # 只在渲染中才动态计算
@@ -289,22 +671,36 @@ class Logger:
     
     def __init__(self, config_manager: ConfigManager):
         self.config = config_manager
-        self.logs_dir = self.config.get('PATHS', 'LOGS_DIR', 'logs')
+        self.logs_dir = os.path.join(str(config_manager.project_root), self.config.get('PATHS', 'LOGS_DIR', 'logs'))
         self.setup_logging()
     
     def setup_logging(self):
-        """设置日志"""
+        """
+        设置日志：调用方只把记录放入队列（QueueHandler），
+        由后台 QueueListener 线程写入按大小轮转的日志文件与控制台，渲染线程不等待磁盘与终端 I/O
+        """
         os.makedirs(self.logs_dir, exist_ok=True) # 确保日志目录存在
-        log_file = os.path.join(self.logs_dir, f"stroboscope_{datetime.now().strftime('%Y%m%d')}.log")
+        log_file = os.path.join(self.logs_dir, "stroboscope.log")
+        max_bytes = int(float(self.config.get('LOGGING', 'MAX_FILE_MB', '10')) * 1024 * 1024)
+        backup_count = int(self.config.get('LOGGING', 'BACKUP_COUNT', '5'))
         
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
         )
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+        
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        self.listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler,
+                                                       respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.listener.stop) # 退出时写完队列中剩余的日志
+        
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter('%(message)s')) # 入队时只合并消息参数，完整格式由监听线程的处理器负责
+        logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
         
         self.logger = logging.getLogger('stroboscope')
     
@@ -324,8 +720,62 @@ class Logger:
         """记录调试日志"""
         self.logger.debug(message)
 
+class JobOutputLog:
+    """
+    单个任务子进程（Manim）的原始输出：逐行写入 logs/jobs/<任务ID>.log，
+    全局日志只记录错误行、限频的进度摘要，以及失败时的最后若干行
+    """
+
+    TAIL_LINES = 20
+    ERROR_MARKERS = ('ERROR', 'FATAL', 'TRACEBACK')
+
+    def __init__(self, unique_id: str, source: str = 'Manim'):
+        self.unique_id = unique_id
+        self.source = source
+        self.path = file_manager.get_job_log_path(unique_id)
+        self.line_count = 0
+        self.tail: "deque[str]" = deque(maxlen=self.TAIL_LINES)
+        self.summary_interval = float(config_manager.get('LOGGING', 'SUMMARY_SECONDS', '5'))
+        self._last_summary = 0.0
+        self._file = None
+
+    def __enter__(self) -> "JobOutputLog":
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def write(self, line: str):
+        """记录一行原始输出；包含错误标记的行同时写入全局日志"""
+        line = line.rstrip()
+        if not line:
+            return
+        self.line_count += 1
+        self.tail.append(line)
+        if self._file:
+            self._file.write(line + "\n")
+        if any(marker in line.upper() for marker in self.ERROR_MARKERS):
+            logger.error(f"{self.source}[{self.unique_id}]: {line}")
+
+    def summary(self, message: str, force: bool = False):
+        """限频写入全局日志的进度摘要（每个任务每 SUMMARY_SECONDS 秒最多一条）"""
+        now = time.time()
+        if force or now - self._last_summary >= self.summary_interval:
+            self._last_summary = now
+            logger.info(f"{self.source}[{self.unique_id}]: {message}")
+
+    def log_tail(self):
+        """子进程失败时把最后若干行输出写入全局日志"""
+        if self.tail:
+            logger.error(f"{self.source}[{self.unique_id}] 最后 {len(self.tail)} 行输出（完整输出见 {self.path}）:\n"
+                         + "\n".join(self.tail))
+
 # 全局实例
-config_manager = ConfigManager()
+# 环境变量 STROBOSCOPE_CONFIG 可指定其他配置文件（如测试使用的临时配置）
+config_manager = ConfigManager(os.environ.get('STROBOSCOPE_CONFIG', 'config.ini'))
 file_manager = FileManager(config_manager)
 progress_monitor = ProgressMonitor()
 logger = Logger(config_manager)
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+常驻 Manim 工作进程池
+每个工作进程只导入一次 Manim，通过管道接收渲染任务并回传进度事件；
+处理一定数量的任务后自动回收，防止内存持续增长
+"""
+
+import os
+import sys
+import atexit
+import json
+import queue
+import threading
+import subprocess
+from typing import Callable, Dict, Any, List, Optional
+from .utils import config_manager, logger, new_process_group_kwargs, JobOutputLog
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manim_worker.py')
+
+# Manim 质量标志与 config.quality 取值的对应关系
+QUALITY_FLAG_NAMES = {
+    '-ql': 'low_quality',
+    '-qm': 'medium_quality',
+    '-qh': 'high_quality',
+    '-qp': 'production_quality',
+    '-qk': 'fourk_quality',
+}
+
+
+class WarmWorkerError(Exception):
+    """常驻工作进程不可用或渲染失败"""
+
+
+class WarmWorker:
+    """单个常驻 Manim 工作进程"""
+
+    def __init__(self, startup_timeout: float):
+        self.jobs_done = 0
+        self.job_log: Optional[JobOutputLog] = None # 当前任务的输出日志，stderr 转存到这里
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+            **new_process_group_kwargs()
+        )
+        self._events: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        threading.Thread(target=self._read_events, name=f"ManimWorkerEvents-{self.process.pid}", daemon=True).start()
+        threading.Thread(target=self._drain_stderr, name=f"ManimWorkerStderr-{self.process.pid}", daemon=True).start()
+
+        ready = self._next_event(startup_timeout)
+        if not ready or ready.get('event') != 'ready':
+            self.close()
+            raise WarmWorkerError(f"Manim工作进程启动失败: {ready}")
+        logger.info(f"Manim常驻工作进程已就绪: pid={self.process.pid}")
+
+    def _read_events(self):
+        """读取协议事件；进程退出时放入 None 作为结束标记"""
+        for line in self.process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self._events.put(json.loads(line))
+            except ValueError:
+                logger.warning(f"Manim工作进程输出无法解析: {line}")
+        self._events.put(None)
+
+    def _drain_stderr(self):
+        """
+        Manim 自身的日志输出写入 stderr，这里持续读取避免管道写满：
+        执行任务期间写入该任务的日志文件，空闲时只在全局日志中记录调试信息
+        """
+        for line in self.process.stderr:
+            line = line.rstrip()
+            if not line:
+                continue
+            job_log = self.job_log
+            if job_log:
+                job_log.write(line)
+            else:
+                logger.debug(f"Manim Worker[{self.process.pid}]: {line}")
+
+    def _next_event(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def render(self, job: Dict[str, Any], on_progress: Callable[[int], None] = None,
+               job_log: Optional[JobOutputLog] = None) -> str:
+        """提交任务并阻塞等待结果，返回输出视频路径"""
+        self.job_log = job_log
+        try:
+            return self._render(job, on_progress)
+        finally:
+            self.job_log = None
+
+    def _render(self, job: Dict[str, Any], on_progress: Callable[[int], None] = None) -> str:
+        if not self.is_alive():
+            raise WarmWorkerError("Manim工作进程已退出")
+        try:
+            self.process.stdin.write(json.dumps(job, ensure_ascii=False) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise WarmWorkerError(f"向Manim工作进程发送任务失败: {e}")
+
+        while True:
+            event = self._next_event()
+            if event is None:
+                raise WarmWorkerError(f"Manim工作进程意外退出 (返回码: {self.process.poll()})")
+            if event.get('job_id') != job['job_id']:
+                continue
+            if event['event'] == 'progress':
+                if on_progress:
+                    on_progress(event.get('frames', 0))
+            elif event['event'] == 'done':
+                self.jobs_done += 1
+                return event['output']
+            elif event['event'] == 'error':
+                self.jobs_done += 1
+                raise WarmWorkerError(event.get('message', '未知错误'))
+
+    def close(self):
+        """关闭工作进程：先关闭标准输入让其自然退出，超时则强制结束"""
+        try:
+            if self.process.stdin:
+                self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+
+
+class ManimWorkerPool:
+    """常驻 Manim 工作进程池"""
+
+    def __init__(self):
+        self._idle: List[WarmWorker] = []
+        self._lock = threading.Lock()
+        self._closed = False # 进程退出时关闭，之后归还的工作进程直接回收
+        self.load_config()
+        config_manager.add_reload_listener(self.load_config)
+
+    def load_config(self):
+        """读取工作进程的回收与启动超时配置；已在运行的工作进程按新的上限回收"""
+        self.max_jobs_per_worker = max(1, int(config_manager.get('RENDER', 'WARM_WORKER_MAX_JOBS', '20')))
+        self.startup_timeout = float(config_manager.get('RENDER', 'WARM_WORKER_STARTUP_TIMEOUT', '60'))
+
+    def acquire(self) -> WarmWorker:
+        """取出一个空闲的工作进程，没有则新启动一个"""
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.is_alive():
+                    return worker
+        return WarmWorker(self.startup_timeout)
+
+    def release(self, worker: WarmWorker):
+        """归还工作进程；达到任务上限或已退出的进程直接回收"""
+        with self._lock:
+            if worker.is_alive() and worker.jobs_done < self.max_jobs_per_worker and not self._closed:
+                self._idle.append(worker)
+                return
+        logger.info(f"回收Manim工作进程: pid={worker.process.pid}, 已处理 {worker.jobs_done} 个任务")
+        worker.close()
+
+    def prewarm(self, count: int):
+        """预先启动若干工作进程，使首个请求也无需等待 Manim 导入"""
+        for _ in range(count):
+            try:
+                self.release(WarmWorker(self.startup_timeout))
+            except WarmWorkerError as e:
+                logger.warning(f"预热Manim工作进程失败: {e}")
+                break
+
+    def render(self, job: Dict[str, Any], on_progress: Callable[[int], None] = None,
+               on_process: Callable[[subprocess.Popen], None] = None,
+               job_log: Optional[JobOutputLog] = None) -> str:
+        """
+        在某个工作进程上执行渲染任务；on_process 接收执行该任务的进程，便于取消时终止；
+        job_log 接收该任务期间工作进程的 Manim 日志输出
+        """
+        worker = self.acquire()
+        try:
+            if on_process:
+                on_process(worker.process)
+            return worker.render(job, on_progress, job_log)
+        finally:
+            self.release(worker)
+
+    def shutdown(self):
+        """关闭所有空闲工作进程；正在执行任务的工作进程在任务结束归还时回收（进程退出时自动调用）"""
+        with self._lock:
+            self._closed = True
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.close()
+
+# 全局实例
+manim_worker_pool = ManimWorkerPool()
+# Flask 退出或开发服务器重载时关闭常驻工作进程，避免遗留孤儿进程
+atexit.register(manim_worker_pool.shutdown)
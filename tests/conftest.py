@@ -0,0 +1,45 @@
+"""
+测试公共设置：从项目根目录导入 stroboscope 包（与 app.py 相同）。
+导入前经 STROBOSCOPE_CONFIG 换用一份临时配置，日志、数据库、视频与场景目录都指向临时目录，
+测试结束后删除，不在项目目录中留下文件；需要单独文件的测试另外使用 pytest 的 tmp_path。
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import configparser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_ROOT = tempfile.mkdtemp(prefix='stroboscope-tests-')
+TEST_PATHS = {
+    'TEMP_DIR': 'temp_files',
+    'LOGS_DIR': 'logs',
+    'MANIM_SCENES_DIR': 'manim_scenes',
+    'VIDEO_OUTPUT_DIR': 'animations',
+    'DATA_DIR': 'data',
+}
+
+
+def _write_test_config() -> str:
+    """复制项目配置，只把 [PATHS] 改为临时目录下的绝对路径"""
+    config = configparser.ConfigParser(interpolation=None)
+    config.optionxform = str
+    config.read(os.path.join(ROOT, 'config.ini'), encoding='utf-8')
+    if not config.has_section('PATHS'):
+        config.add_section('PATHS')
+    for key, name in TEST_PATHS.items():
+        config.set('PATHS', key, os.path.join(TEST_ROOT, name))
+    path = os.path.join(TEST_ROOT, 'config.ini')
+    with open(path, 'w', encoding='utf-8') as f:
+        config.write(f)
+    return path
+
+
+os.environ['STROBOSCOPE_CONFIG'] = _write_test_config()
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
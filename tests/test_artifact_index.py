@@ -0,0 +1,136 @@
+"""artifact_index：任务产物的登记、查找、删除与重建；Manim 中间目录在任务结束时删除；未登记文件的兜底清理"""
+
+import os
+import time
+
+import pytest
+
+from stroboscope.artifact_index import ArtifactIndex
+from stroboscope.render_engine import RenderEngine
+from stroboscope.utils import file_manager
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / 'animations'
+    root.mkdir()
+    return root
+
+
+@pytest.fixture
+def index(tmp_path, root):
+    return ArtifactIndex(str(tmp_path / 'artifacts.sqlite3'), str(root))
+
+
+def test_record_job_output_links_job_and_waiters(index, root):
+    video = root / 'stroboscope_a.mp4'
+    video.write_bytes(b'video')
+    index.record_job_output('a', [{'path': str(video), 'kind': 'video', 'params': {'quality_level': 1}}],
+                            str(video), waiter_ids=['w1', 'w2'])
+    for job_id in ('a', 'w1', 'w2'):
+        assert index.get_job_output(job_id) == str(video)
+    entry, = index.find(kinds=('video',))
+    assert entry['path'] == 'stroboscope_a.mp4' and entry['size'] == 5 and entry['job_id'] == 'a'
+
+
+def test_record_job_output_without_owner_link(index, root):
+    video = root / 'stroboscope_a_q3.mp4'
+    video.write_bytes(b'video')
+    index.record_job_output('a', [{'path': str(video), 'kind': 'video'}], str(video),
+                            waiter_ids=['w'], link_owner=False)
+    assert index.get_job_output('a') is None
+    assert index.get_job_output('w') == str(video)
+
+
+def test_delete_job_removes_files_and_links(index, root):
+    video = root / 'stroboscope_a.mp4'
+    video.write_bytes(b'video')
+    stream = root / 'streams' / 'a'
+    stream.mkdir(parents=True)
+    (stream / 'index.m3u8').write_text('#EXTM3U')
+    index.record_job_output('a', [{'path': str(video), 'kind': 'video'}, {'path': str(stream), 'kind': 'stream'}],
+                            str(video))
+    assert index.delete_job('a') == 2
+    assert not video.exists() and not stream.exists()
+    assert index.get_job_output('a') is None
+    assert index.find() == []
+
+
+def test_find_by_creation_time(index, root):
+    for name in ('old.mp4', 'new.mp4'):
+        (root / name).write_bytes(b'x')
+        index.record(str(root / name), 'video')
+    index._conn.execute("UPDATE artifacts SET created_at = 1 WHERE path = 'old.mp4'")
+    assert [entry['path'] for entry in index.find(created_before=100)] == ['old.mp4']
+
+
+def test_rebuild_registers_existing_files(tmp_path, root):
+    (root / 'stroboscope_x.mp4').write_bytes(b'x' * 3)
+    (root / 'cache').mkdir()
+    (root / 'cache' / 'k.mp4').write_bytes(b'k')
+    (root / 'videos' / 'manim_scene_1').mkdir(parents=True)
+    (root / 'notes.txt').write_text('ignored')
+    index = ArtifactIndex(str(tmp_path / 'new.sqlite3'), str(root))
+    kinds = {entry['path']: entry['kind'] for entry in index.find()}
+    assert kinds == {'stroboscope_x.mp4': 'video', 'cache/k.mp4': 'cache', 'videos/manim_scene_1': 'scratch'}
+
+
+def _write_old(path, content=b'x', age=7200):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def _unindexed_tree(index, root):
+    """已登记的视频与流式目录、分层背景、未登记的旧 svg 与新 mp4"""
+    for path in (root / 'stroboscope_a.mp4', root / 'streams' / 'a' / 'index.m3u8',
+                 root / 'layers' / 'bg.mp4', root / 'texts' / 'old.svg'):
+        _write_old(path)
+    (root / 'stroboscope_fresh.mp4').write_bytes(b'rendering')
+    index.record(str(root / 'stroboscope_a.mp4'), 'video')
+    index.record(str(root / 'streams' / 'a'), 'stream')
+
+
+def test_find_unindexed_skips_indexed_fresh_and_layers(index, root):
+    _unindexed_tree(index, root)
+    assert index.find_unindexed(time.time() - 3600) == ['texts/old.svg']
+
+
+def test_find_unindexed_is_bounded(index, root):
+    for i in range(5):
+        _write_old(root / 'texts' / f'{i}.svg')
+    assert len(index.find_unindexed(time.time(), limit=3)) == 3
+    assert index.find_unindexed(time.time(), limit=0) == []
+
+
+@pytest.mark.parametrize('cleanup', ['old_files', 'static'])
+def test_cleanup_removes_old_unindexed_files(index, root, monkeypatch, cleanup):
+    monkeypatch.setattr(file_manager, 'artifact_index', index)
+    _unindexed_tree(index, root)
+    if cleanup == 'old_files':
+        file_manager.cleanup_old_files(max_age_hours=1)
+    else:
+        file_manager.cleanup_static()
+    assert not (root / 'texts' / 'old.svg').exists()
+    # 未登记且较新的文件可能属于正在渲染的任务，保留
+    assert (root / 'stroboscope_fresh.mp4').exists()
+    assert (root / 'layers' / 'bg.mp4').exists()
+
+
+def test_manim_scratch_removed_after_publish(root, monkeypatch):
+    monkeypatch.setattr(file_manager, 'video_dir', str(root))
+    partial = root / 'videos' / 'manim_scene_1' / '480p15' / 'partial_movie_files'
+    partial.mkdir(parents=True)
+    (partial / '0001.mp4').write_bytes(b'p')
+    RenderEngine._remove_manim_scratch('/scenes/manim_scene_1.py', keep=str(root / 'stroboscope_1.mp4'))
+    assert not (root / 'videos' / 'manim_scene_1').exists()
+
+
+def test_manim_scratch_kept_when_output_is_inside(root, monkeypatch):
+    monkeypatch.setattr(file_manager, 'video_dir', str(root))
+    output = root / 'videos' / 'manim_scene_2' / '480p15' / 'stroboscope_2.mp4'
+    output.parent.mkdir(parents=True)
+    output.write_bytes(b'v')
+    RenderEngine._remove_manim_scratch('/scenes/manim_scene_2.py', keep=str(output))
+    assert output.exists()
@@ -0,0 +1,121 @@
+"""/artifacts/<path>：Range、条件请求、缓存头与路径穿越"""
+
+import os
+import uuid
+
+import pytest
+
+from app import app, IMMUTABLE_CACHE_CONTROL
+from stroboscope.utils import file_manager
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def _artifact(relative_path: str, content: bytes = CONTENT) -> str:
+    path = os.path.join(file_manager.video_dir, *relative_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return relative_path
+
+
+def test_full_response(client):
+    name = _artifact(f'stroboscope_{uuid.uuid4()}.mp4')
+    response = client.get(f'/artifacts/{name}')
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.mimetype == 'video/mp4'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag']
+
+
+def test_range_request_returns_partial_content(client):
+    name = _artifact(f'stroboscope_{uuid.uuid4()}.mp4')
+    response = client.get(f'/artifacts/{name}', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+    assert response.data == CONTENT[100:200]
+
+    suffix = client.get(f'/artifacts/{name}', headers={'Range': 'bytes=-24'})
+    assert suffix.status_code == 206
+    assert suffix.data == CONTENT[-24:]
+
+
+def test_unsatisfiable_range(client):
+    name = _artifact(f'stroboscope_{uuid.uuid4()}.mp4')
+    response = client.get(f'/artifacts/{name}', headers={'Range': f'bytes={len(CONTENT) + 10}-'})
+    assert response.status_code == 416
+
+
+def test_if_none_match_returns_not_modified(client):
+    name = _artifact(f'stroboscope_{uuid.uuid4()}.mp4')
+    etag = client.get(f'/artifacts/{name}').headers['ETag']
+    response = client.get(f'/artifacts/{name}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.get(f'/artifacts/{name}', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_if_range_with_stale_etag_returns_full_content(client):
+    name = _artifact(f'stroboscope_{uuid.uuid4()}.mp4')
+    response = client.get(f'/artifacts/{name}', headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+
+def test_cache_entry_uses_cache_key_etag_and_is_immutable(client):
+    key = uuid.uuid4().hex
+    name = _artifact(f'cache/{key}.mp4')
+    response = client.get(f'/artifacts/{name}')
+    assert response.headers['ETag'] == f'"{key}"'
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert client.get(f'/artifacts/{name}', headers={'If-None-Match': f'"{key}"'}).status_code == 304
+
+
+def test_hls_cache_control(client):
+    stream = f'streams/{uuid.uuid4()}'
+    segment = _artifact(f'{stream}/segment_000.ts')
+    playlist = _artifact(f'{stream}/index.m3u8', b'#EXTM3U\n')
+
+    response = client.get(f'/artifacts/{segment}')
+    assert response.mimetype == 'video/mp2t'
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+    # 播放列表在渲染期间不断追加，每次都需重新验证
+    response = client.get(f'/artifacts/{playlist}')
+    assert response.mimetype == 'application/vnd.apple.mpegurl'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+
+def test_task_video_is_revalidated(client):
+    name = _artifact(f'stroboscope_{uuid.uuid4()}.mp4')
+    assert client.get(f'/artifacts/{name}').headers['Cache-Control'] == 'no-cache'
+
+
+@pytest.mark.parametrize('path', [
+    '..%2Fsecret.mp4',
+    'streams/..%2F..%2Fsecret.mp4',
+    '%2E%2E/secret.mp4',
+])
+def test_path_traversal_is_rejected(client, path):
+    secret = os.path.join(os.path.dirname(file_manager.video_dir), 'secret.mp4')
+    with open(secret, 'wb') as f:
+        f.write(b'secret')
+    response = client.get(f'/artifacts/{path}')
+    assert response.status_code == 404
+    assert b'secret' not in response.data
+
+
+def test_absolute_path_and_other_extensions_are_rejected(client):
+    _artifact('notes.txt', b'text')
+    assert client.get('/artifacts/notes.txt').status_code == 404
+    # 即使绝对路径指向视频目录内真实存在的文件也不提供（路由合并重复斜杠后按相对路径查找）
+    name = _artifact(f'stroboscope_{uuid.uuid4()}.mp4')
+    absolute = os.path.join(os.path.abspath(file_manager.video_dir), name)
+    assert client.get('/artifacts/' + absolute, follow_redirects=True).status_code == 404
+    assert client.get(f'/artifacts/missing-{uuid.uuid4()}.mp4').status_code == 404
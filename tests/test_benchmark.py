@@ -0,0 +1,73 @@
+"""benchmark：默认基线路径、回归比较与退出码、基线合并"""
+
+import os
+
+from stroboscope import benchmark
+from stroboscope.utils import config_manager
+
+
+def test_default_baseline_is_anchored_to_project_root():
+    assert os.path.isabs(benchmark.DEFAULT_BASELINE)
+    assert benchmark.DEFAULT_BASELINE == os.path.join(str(config_manager.project_root), 'benchmarks', 'baseline.json')
+
+
+def _result(total: float, **stages) -> dict:
+    return {
+        'params': {'rotation_speed': 30.0, 'flash_frequency': 0.5, 'quality': 1, 'engine': 'fast'},
+        'stages': {stage: stages.get(stage, 0.0) for stage in benchmark.RENDER_STAGES},
+        'total_seconds': total,
+        'samples': 3,
+    }
+
+
+BASELINE = {'cases': {'fast_q1': _result(2.0, frame_rendering=1.0, encoding=0.2)}}
+
+
+def test_compare_requires_both_ratio_and_delta():
+    # 帧渲染 1.0 -> 1.3：+30% 且差值 0.3s，为回归；编码 0.2 -> 0.29：+45% 但差值不足 0.1s
+    results = {'fast_q1': _result(2.2, frame_rendering=1.3, encoding=0.29)}
+    regression, = benchmark.compare(results, BASELINE, threshold=0.25, min_delta=0.1)
+    assert regression == {'case': 'fast_q1', 'stage': 'frame_rendering', 'baseline': 1.0, 'current': 1.3,
+                          'ratio': 1.3}
+    assert benchmark.compare(results, BASELINE, threshold=0.5, min_delta=0.1) == []
+    assert len(benchmark.compare(results, BASELINE, threshold=0.25, min_delta=0.05)) == 2
+
+
+def test_compare_flags_total_and_skips_unknown_cases():
+    results = {'fast_q1': _result(3.0, frame_rendering=1.0), 'fast_q2': _result(100.0)}
+    regression, = benchmark.compare(results, BASELINE, threshold=0.25, min_delta=0.1)
+    assert regression['stage'] == 'total' and regression['ratio'] == 1.5
+
+
+def test_save_baseline_merges_cases(tmp_path):
+    path = str(tmp_path / 'nested' / 'baseline.json')
+    assert benchmark.load_baseline(path) == {'cases': {}}
+
+    benchmark.save_baseline(path, {'fast_q1': _result(2.0), 'fast_q2': _result(4.0)}, 0.25, 0.1)
+    benchmark.save_baseline(path, {'fast_q2': _result(5.0), 'manim_q1': _result(30.0)}, 0.3, 0.2)
+
+    baseline = benchmark.load_baseline(path)
+    assert {case_id: case['total_seconds'] for case_id, case in baseline['cases'].items()} == \
+        {'fast_q1': 2.0, 'fast_q2': 5.0, 'manim_q1': 30.0}
+    assert baseline['thresholds'] == {'threshold': 0.3, 'min_delta': 0.2}
+    assert baseline['machine'] == benchmark.machine_info()
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_main_exit_status(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 'baseline.json')
+    measured = {'fast_q1': _result(2.0, frame_rendering=1.0)}
+    monkeypatch.setattr(benchmark, 'run_benchmark', lambda cases, **kwargs: measured)
+    args = ['--quality', '1', '--baseline', path]
+
+    # 没有基线时只输出结果
+    assert benchmark.main(args) == 0
+    assert benchmark.main(args + ['--save', '--threshold', '0.5']) == 0
+    assert benchmark.main(args) == 0
+
+    # 帧渲染 +40%：低于基线记录的阈值 50%，命令行阈值 25% 时为回归
+    measured['fast_q1'] = _result(2.0, frame_rendering=1.4)
+    assert benchmark.main(args) == 0
+    assert benchmark.main(args + ['--threshold', '0.25']) == 1
+    assert 'fast_q1 frame_rendering' in capsys.readouterr().out
+    assert benchmark.main(args + ['--threshold', '0.25', '--min-delta', '0.5']) == 0
@@ -0,0 +1,107 @@
+"""compositor：背景缓存路径的失效条件，文字图层的时间轴与排版，合成命令"""
+
+import copy
+import re
+
+import pytest
+
+from stroboscope import compositor
+from stroboscope.compositor import (END_TEXT_FADE, END_TEXT_START, MOTION_DURATION, TOTAL_DURATION,
+                                    layer_compositor)
+from stroboscope.fast_renderer import HOLD_DURATION
+from stroboscope.manim_manager import scene_manager
+from stroboscope.utils import config_manager
+
+
+def test_timeline_matches_scene_template():
+    # 完整模板：运动 total_animation_time 秒，等待 2 秒，Write 默认 1 秒，再等待 1 秒
+    template = scene_manager.get_default_template()
+    assert f"total_animation_time = {MOTION_DURATION}" in template
+    tail = template[template.index("# 最终等待"):]
+    waits = [float(value) for value in re.findall(r"self\.wait\(([\d.]+)\)", tail)]
+    assert "self.play(Write(end_text))" in tail
+    assert END_TEXT_START == MOTION_DURATION + waits[0]
+    assert TOTAL_DURATION == END_TEXT_START + END_TEXT_FADE + waits[1]
+    assert TOTAL_DURATION == MOTION_DURATION + HOLD_DURATION
+
+
+def test_background_path_is_stable():
+    assert layer_compositor.get_background_path(1) == layer_compositor.get_background_path(1)
+    assert layer_compositor.get_background_path(1) != layer_compositor.get_background_path(2)
+
+
+def test_background_path_ignores_non_output_settings(monkeypatch):
+    before = layer_compositor.get_background_path(1)
+    settings = copy.deepcopy(scene_manager.quality_settings)
+    settings['1']['time_estimate'] = '1-2秒'
+    settings['1']['timeout'] = 1
+    monkeypatch.setattr(scene_manager, 'quality_settings', settings)
+    assert layer_compositor.get_background_path(1) == before
+
+
+@pytest.mark.parametrize("change", ['quality', 'font', 'template'])
+def test_background_path_invalidated(monkeypatch, change):
+    before = layer_compositor.get_background_path(1)
+    if change == 'quality':
+        settings = copy.deepcopy(scene_manager.quality_settings)
+        settings['1']['resolution'] = '360p'
+        monkeypatch.setattr(scene_manager, 'quality_settings', settings)
+    elif change == 'font':
+        original_get = config_manager.get
+        monkeypatch.setattr(config_manager, 'get', lambda section, key, default=None:
+                            'Other Font' if (section, key) == ('APP', 'FONT_FAMILY') else original_get(section, key, default))
+    else:
+        original = scene_manager.get_background_template()
+        monkeypatch.setattr(scene_manager, 'get_background_template', lambda: original + "\n# changed\n")
+    assert layer_compositor.get_background_path(1) != before
+
+
+def test_text_layers_follow_timeline():
+    layers = layer_compositor.build_text_layers(30, 0.55, 480)
+    subtitle, *info, end = layers
+    assert subtitle['text'] == "旋转速度: 30.0 RPM | 闪烁频率: 0.6 Hz"
+    assert subtitle['start'] == 0 and subtitle['x'] == '(w-text_w)/2'
+    # 调试信息在运动结束后出现：闪烁频率不为 0 时有三行，左对齐并依次向下排列
+    assert len(info) == 3
+    assert all(layer['start'] == MOTION_DURATION for layer in info)
+    assert len({layer['x'] for layer in info}) == 1
+    assert [layer['y'] for layer in info] == sorted(layer['y'] for layer in info)
+    assert info[0]['y'] > subtitle['y']
+    assert end['text'] == "动画结束" and end['start'] == END_TEXT_START and end['fade'] == END_TEXT_FADE
+
+
+def test_text_layers_without_flash_have_two_info_lines():
+    layers = layer_compositor.build_text_layers(30, 0, 480)
+    assert len([layer for layer in layers if layer['start'] == MOTION_DURATION]) == 2
+
+
+def test_text_layers_scale_with_frame_height():
+    low = layer_compositor.build_text_layers(30, 0.55, 480)
+    high = layer_compositor.build_text_layers(30, 0.55, 1080)
+    for small, large in zip(low, high):
+        assert large['font_size'] == pytest.approx(small['font_size'] * 1080 / 480)
+        if not isinstance(small['y'], str):
+            assert large['y'] == pytest.approx(small['y'] * 1080 / 480)
+
+
+def test_composite_command(tmp_path, monkeypatch):
+    monkeypatch.setattr(compositor.config_manager, 'get', lambda section, key, default=None:
+                        '' if (section, key) == ('APP', 'FONT_FILE') else default)
+    layers = layer_compositor.build_text_layers(30, 0.55, 480)
+    command = layer_compositor.build_composite_command('ffmpeg', 'bg.png', 'pointer.mov', layers, 15,
+                                                       'out.mp4', str(tmp_path), ['-preset', 'ultrafast'])
+    assert command[command.index('-loop') + 1] == '1'
+    assert command[command.index('-t') + 1] == str(TOTAL_DURATION)
+    assert command.index('-preset') < command.index('out.mp4') == len(command) - 1
+    graph = command[command.index('-filter_complex') + 1]
+    # 滤镜之间以逗号分隔（enable 表达式中的逗号在引号内）
+    drawtexts = graph.split(',drawtext=')[1:]
+    assert len(drawtexts) == len(layers)
+    # 副标题从第一帧起显示；调试信息与结束文字按时间轴出现，结束文字淡入
+    assert 'enable=' not in drawtexts[0]
+    assert f"enable='gte(t,{MOTION_DURATION})'" in drawtexts[1]
+    assert f"enable='gte(t,{END_TEXT_START})'" in drawtexts[-1]
+    assert f"alpha='min(1,(t-{END_TEXT_START})/{END_TEXT_FADE})'" in drawtexts[-1]
+    # 文字写入工作目录下的文本文件，不出现在滤镜表达式中
+    assert (tmp_path / 'text_0.txt').read_text(encoding='utf-8') == layers[0]['text']
+    assert "动画结束" not in graph
@@ -0,0 +1,74 @@
+"""encoder：档位编码参数的转换与 Manim 输出的重新编码命令"""
+
+from stroboscope.encoder import encoder_args, build_reencode_command
+from stroboscope.render_engine import RenderEngine
+
+
+def test_encoder_args_full_profile():
+    setting = {'encoder': {'preset': 'veryfast', 'tune': 'zerolatency', 'crf': 23, 'threads': 0, 'gop': 60}}
+    assert encoder_args(setting) == ['-preset', 'veryfast', '-tune', 'zerolatency',
+                                     '-crf', '23', '-threads', '0', '-g', '60']
+
+
+def test_encoder_args_without_profile():
+    assert encoder_args({}) == []
+    assert encoder_args({'encoder': None}) == []
+
+
+def test_encoder_args_ignores_invalid_values():
+    setting = {'encoder': {'preset': 'warp', 'tune': 'cartoon', 'crf': 99, 'threads': 'many', 'gop': 0}}
+    assert encoder_args(setting) == []
+
+
+def test_encoder_args_fractional_crf():
+    assert encoder_args({'encoder': {'crf': '18.5'}}) == ['-crf', '18.5']
+
+
+def test_encoder_args_without_keyframes_drops_gop():
+    setting = {'encoder': {'preset': 'slow', 'gop': 120}}
+    assert encoder_args(setting, keyframes=False) == ['-preset', 'slow']
+
+
+def test_reencode_command_places_args_before_output():
+    setting = {'encoder': {'preset': 'slow', 'crf': 20}}
+    command = build_reencode_command('ffmpeg', 'in.mp4', 'out.mp4', setting)
+    assert command[0] == 'ffmpeg'
+    assert command[command.index('-i') + 1] == 'in.mp4'
+    assert command[-1] == 'out.mp4'
+    assert command.index('-preset') < command.index('out.mp4')
+    assert command[command.index('-crf') + 1] == '20'
+
+
+def test_reencode_command_empty_without_profile():
+    assert build_reencode_command('ffmpeg', 'in.mp4', 'out.mp4', {}) == []
+
+
+def test_manim_command_runs_manim_module():
+    engine = RenderEngine()
+    assert engine.manim_encoder == 'off'
+    setting = {'flag': '-ql', 'fps': 15, 'encoder': {'preset': 'ultrafast', 'crf': 28}}
+    command = engine._build_manim_command('cairo', setting, '/media', 'out.mp4', 'scene.py', 'Scene')
+    # 档位的 encoder 不进入 Manim 命令
+    assert command[1:4] == ['-m', 'manim', 'render']
+    assert '-preset' not in command and '-crf' not in command
+    assert command[-2:] == ['scene.py', 'Scene']
+
+
+def test_reencode_output_is_opt_in(monkeypatch, tmp_path):
+    engine = RenderEngine()
+    calls = []
+    monkeypatch.setattr(engine, '_run_ffmpeg', lambda command, unique_id: calls.append(command) or (1, ''))
+    setting = {'encoder': {'preset': 'slow'}}
+    video = tmp_path / 'out.mp4'
+    video.write_bytes(b'manim')
+
+    engine.manim_encoder = 'off'
+    engine._reencode_output('job', 'ffmpeg', str(video), setting)
+    assert calls == []
+
+    engine.manim_encoder = 'reencode'
+    engine._reencode_output('job', 'ffmpeg', str(video), setting)
+    assert len(calls) == 1
+    # 重新编码失败时保留 Manim 的输出
+    assert video.read_bytes() == b'manim'
+    assert not (tmp_path / 'out.mp4.part.mp4').exists()
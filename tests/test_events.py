@@ -0,0 +1,104 @@
+"""/events/<id>：状态版本变化推送一条事件，无变化时发送心跳，进入终止状态后关闭连接"""
+
+import json
+import os
+import uuid
+
+import pytest
+
+import app as app_module
+from stroboscope.utils import file_manager, progress_monitor
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, 'EVENTS_KEEPALIVE_SECONDS', 0.05)
+    return app_module.app.test_client()
+
+
+def _parse(chunk: bytes):
+    """解析一条事件，返回 (事件名, 数据)；心跳注释返回 (None, None)"""
+    text = chunk.decode('utf-8')
+    assert text.endswith('\n\n')
+    if text.startswith(':'):
+        return None, None
+    event, data = text.strip().split('\n')
+    return event[len('event: '):], json.loads(data[len('data: '):])
+
+
+def _next_status(chunks):
+    """跳过心跳，返回下一条状态事件的数据"""
+    for chunk in chunks:
+        event, data = _parse(chunk)
+        if event is not None:
+            assert event == 'status'
+            return data
+    raise AssertionError('事件流已结束')
+
+
+def _finish(unique_id: str, state: str):
+    if state == 'done':
+        video = os.path.join(file_manager.video_dir, f'stroboscope_{unique_id}.mp4')
+        with open(video, 'wb') as f:
+            f.write(b'video')
+        progress_monitor.finish_render(success=True, unique_id=unique_id)
+    elif state == 'failed':
+        progress_monitor.finish_render(success=False, error='boom', unique_id=unique_id)
+    else:
+        progress_monitor.cancel_job(unique_id, '用户取消')
+
+
+@pytest.mark.parametrize('terminal', ['done', 'failed', 'cancelled'])
+def test_events_follow_versions_until_terminal_state(client, terminal):
+    unique_id = str(uuid.uuid4())
+    progress_monitor.register_job(unique_id, '10秒')
+    response = client.get(f'/events/{unique_id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    chunks = iter(response.response)
+
+    # 连接时先推送当前状态
+    first = _next_status(chunks)
+    assert first['unique_id'] == unique_id and first['state'] == 'queued'
+
+    # 无变化时只发送心跳
+    assert _parse(next(chunks)) == (None, None)
+
+    versions = [first['version']]
+    progress_monitor.start_render('10秒', unique_id=unique_id)
+    running = _next_status(chunks)
+    assert running['state'] == 'running'
+    versions.append(running['version'])
+
+    progress_monitor.update_progress(50, '渲染中', unique_id=unique_id)
+    progress = _next_status(chunks)
+    assert progress['progress'] == 50
+    versions.append(progress['version'])
+
+    _finish(unique_id, terminal)
+    final = _next_status(chunks)
+    versions.append(final['version'])
+    assert final['state'] == terminal
+    assert versions == sorted(set(versions))
+    if terminal == 'done':
+        assert final['video_url'] == f'/artifacts/stroboscope_{unique_id}.mp4'
+    else:
+        assert 'video_url' not in final
+
+    # 终止状态之后连接关闭
+    assert list(chunks) == []
+    response.close()
+
+
+def test_events_for_finished_job_close_immediately(client):
+    unique_id = str(uuid.uuid4())
+    progress_monitor.register_job(unique_id)
+    progress_monitor.finish_render(success=False, error='boom', unique_id=unique_id)
+    chunks = list(client.get(f'/events/{unique_id}').response)
+    assert len(chunks) == 1
+    assert _parse(chunks[0])[1]['state'] == 'failed'
+
+
+def test_events_for_unknown_job(client):
+    assert client.get(f'/events/{uuid.uuid4()}').status_code == 404
@@ -0,0 +1,105 @@
+"""fast_renderer：运动周期、周期渲染规划与逐帧角度"""
+
+import math
+
+import numpy as np
+import pytest
+
+from stroboscope.fast_renderer import (
+    MOTION_DURATION, HOLD_DURATION, FastRenderer,
+    compute_frame_angles, compute_motion_period, compute_mosaic_period, plan_periodic_render,
+)
+
+
+def _same_pose(a: np.ndarray, b: np.ndarray) -> bool:
+    """角度相差 2π 的整数倍时指针姿态相同"""
+    return np.allclose(np.cos(a), np.cos(b), atol=1e-9) and np.allclose(np.sin(a), np.sin(b), atol=1e-9)
+
+
+def _looped_angles(angles: np.ndarray, plan: dict, fps: int) -> np.ndarray:
+    """按规划重建整段角度：一个周期重复 loops 次 + 余数帧 + 停留画面（最后一帧）"""
+    motion_frames = int(MOTION_DURATION * fps)
+    hold = np.full(len(angles) - motion_frames, angles[-1])
+    return np.concatenate([np.tile(angles[:plan['period']], plan['loops']), angles[:plan['remainder']], hold])
+
+
+def test_frame_angles_timeline():
+    fps = 30
+    angles = compute_frame_angles(30, 0.4, fps)
+    assert len(angles) == (MOTION_DURATION + HOLD_DURATION) * fps
+    # fr = 0.4 - 0.5 = -0.1 圈/秒：每帧转过 -0.1 * 2π / fps
+    assert angles[1] == pytest.approx(-0.1 * 2 * math.pi / fps)
+    assert np.all(angles[MOTION_DURATION * fps:] == angles[-1])
+    assert angles[-1] == pytest.approx(MOTION_DURATION * fps * angles[1])
+
+
+def test_frame_angles_without_flash_follow_rotation():
+    fps = 15
+    angles = compute_frame_angles(60, 0, fps)
+    assert angles[fps] == pytest.approx(2 * math.pi)  # 60 RPM：一秒一圈
+    assert angles[-1] == pytest.approx(MOTION_DURATION * 2 * math.pi)
+
+
+@pytest.mark.parametrize('rotation_speed, flash_frequency, fps, period', [
+    (30, 0.5, 30, 1),     # fr = 0：静止
+    (0, 0, 60, 1),
+    (30, 0, 30, 60),      # 0.5 圈/秒，每帧 1/60 圈
+    (30, 0.4, 30, 300),   # fr = -0.1，每帧 1/300 圈
+    (30, 0.6, 15, 150),
+])
+def test_motion_period(rotation_speed, flash_frequency, fps, period):
+    assert compute_motion_period(rotation_speed, flash_frequency, fps) == period
+
+
+def test_motion_period_irrational_speed():
+    assert compute_motion_period(60 * math.sqrt(2), 0, 30) is None
+
+
+def test_mosaic_period_is_lcm():
+    panels = [{'rotation_speed': 30, 'flash_frequency': 0}, {'rotation_speed': 30, 'flash_frequency': 0.4}]
+    assert compute_mosaic_period(panels, 30) == 300
+    assert compute_mosaic_period(panels + [{'rotation_speed': 60 * math.sqrt(2), 'flash_frequency': 0}], 30) is None
+
+
+def test_plan_static_motion_renders_one_frame():
+    plan = plan_periodic_render(30, 0.5, 30)
+    assert plan['use_period'] and plan['period'] == 1
+    assert plan['render_frames'] == 1
+    assert plan['total_frames'] == (MOTION_DURATION + HOLD_DURATION) * 30
+
+
+def test_plan_short_period_with_remainder():
+    plan = plan_periodic_render(30, 0.6, 60)  # fr = 0.1，周期 600 帧，运动 720 帧：只循环 1 次
+    assert not plan['use_period']
+    plan = plan_periodic_render(45, 0, 30)    # 0.75 圈/秒，周期 40 帧：循环 9 次，余数 0
+    assert (plan['period'], plan['loops'], plan['remainder']) == (40, 9, 0)
+    assert plan['render_frames'] == 40 + 1
+    plan = plan_periodic_render(35, 0, 30)    # 7/12 圈/秒，周期 360 帧 = 运动帧数：不循环
+    assert not plan['use_period']
+    plan = plan_periodic_render(14, 0, 15)    # 7/30 圈/秒，周期 450 帧 > 运动帧数
+    assert not plan['use_period'] and plan['render_frames'] == plan['total_frames']
+
+
+def test_plan_irrational_renders_every_frame():
+    plan = plan_periodic_render(60 * math.sqrt(2), 0, 30)
+    assert not plan['use_period']
+    assert plan['render_frames'] == plan['total_frames']
+
+
+@pytest.mark.parametrize('rotation_speed, flash_frequency, fps', [
+    (30, 0, 30), (45, 0, 30), (30, 0.5, 60), (3000, 49.5, 60), (100, 0, 15), (48, 0, 30),
+])
+def test_looped_angles_equal_direct_computation(rotation_speed, flash_frequency, fps):
+    angles = compute_frame_angles(rotation_speed, flash_frequency, fps)
+    plan = plan_periodic_render(rotation_speed, flash_frequency, fps)
+    assert plan['use_period']
+    looped = _looped_angles(angles, plan, fps)
+    assert len(looped) == plan['total_frames'] == len(angles)
+    assert _same_pose(looped, angles)
+
+
+def test_ffmpeg_command_pads_with_tpad():
+    command = FastRenderer().build_ffmpeg_command('ffmpeg', 64, 48, 30, 'out.mp4', pad_frames=119)
+    assert command[command.index('-vf') + 1] == 'tpad=stop_mode=clone:stop=119'
+    assert command.index('-vf') < command.index('-c:v')
+    assert '-vf' not in FastRenderer().build_ffmpeg_command('ffmpeg', 64, 48, 30, 'out.mp4')
@@ -0,0 +1,123 @@
+"""janitor / artifact_index：硬链接按一个产物计入预算，按 LRU 顺序整组淘汰"""
+
+import os
+import sqlite3
+
+import pytest
+
+from stroboscope.artifact_index import ArtifactIndex
+from stroboscope.janitor import ArtifactJanitor, EVICTABLE_KINDS
+from stroboscope.utils import file_manager, progress_monitor
+
+
+def _render(index: ArtifactIndex, root, job_id: str, size: int, last_access: float):
+    """模拟一次渲染：任务视频 + 硬链接的缓存文件"""
+    video = root / f"stroboscope_{job_id}.mp4"
+    video.write_bytes(b'v' * size)
+    cache = root / 'cache' / f"{job_id}.mp4"
+    cache.parent.mkdir(exist_ok=True)
+    os.link(video, cache)
+    index.record_job_output(job_id, [{'path': str(video), 'kind': 'video'},
+                                     {'path': str(cache), 'kind': 'cache', 'cache_key': job_id}], str(cache))
+    index._conn.execute("UPDATE artifacts SET last_access = ? WHERE job_id = ?", (last_access, job_id))
+
+
+@pytest.fixture
+def index(tmp_path):
+    root = tmp_path / 'animations'
+    root.mkdir()
+    return ArtifactIndex(str(tmp_path / 'artifacts.sqlite3'), str(root))
+
+
+@pytest.fixture
+def janitor(index, monkeypatch):
+    monkeypatch.setattr(file_manager, 'artifact_index', index)
+    monkeypatch.setattr(progress_monitor, 'active_job_ids', lambda: [])
+    janitor = ArtifactJanitor()
+    janitor.max_bytes = 0
+    janitor.batch_size = 20
+    return janitor
+
+
+def test_usage_counts_hardlinks_once(index, tmp_path):
+    root = tmp_path / 'animations'
+    _render(index, root, 'a', 1000, 1.0)
+    _render(index, root, 'b', 500, 2.0)
+    assert index.usage(EVICTABLE_KINDS) == (2, 1500)
+
+
+def test_usage_counts_copies_separately(index, tmp_path):
+    root = tmp_path / 'animations'
+    (root / 'x.mp4').write_bytes(b'x' * 100)
+    (root / 'cache').mkdir()
+    (root / 'cache' / 'x.mp4').write_bytes(b'x' * 100)  # 跨文件系统时的复制
+    index.record(str(root / 'x.mp4'), 'video', job_id='x')
+    index.record(str(root / 'cache' / 'x.mp4'), 'cache', job_id='x')
+    assert index.usage(EVICTABLE_KINDS) == (2, 200)
+
+
+def test_least_recently_used_groups_links(index, tmp_path):
+    root = tmp_path / 'animations'
+    _render(index, root, 'old', 10, 1.0)
+    _render(index, root, 'new', 10, 5.0)
+    index.touch(str(root / 'cache' / 'old.mp4'), min_interval=0)  # 访问缓存路径也算作整组的访问
+    groups = index.least_recently_used(EVICTABLE_KINDS)
+    assert [sorted(g['paths']) for g in groups] == [
+        ['cache/new.mp4', 'stroboscope_new.mp4'], ['cache/old.mp4', 'stroboscope_old.mp4']]
+
+
+def test_least_recently_used_skips_active_jobs(index, tmp_path):
+    root = tmp_path / 'animations'
+    _render(index, root, 'busy', 10, 1.0)
+    _render(index, root, 'idle', 10, 2.0)
+    groups = index.least_recently_used(EVICTABLE_KINDS, exclude_job_ids=['busy'])
+    assert [sorted(g['paths'])[1] for g in groups] == ['stroboscope_idle.mp4']
+
+
+def test_janitor_evicts_oldest_renders_as_a_whole(index, janitor, tmp_path):
+    root = tmp_path / 'animations'
+    for job_id, last_access in (('b', 2.0), ('a', 1.0), ('c', 3.0)):
+        _render(index, root, job_id, 100, last_access)
+    janitor.max_files = 2
+
+    deleted, over_budget = janitor.run_once()
+
+    assert (deleted, over_budget) == (2, False)
+    assert not (root / 'stroboscope_a.mp4').exists() and not (root / 'cache' / 'a.mp4').exists()
+    assert (root / 'stroboscope_b.mp4').exists() and (root / 'cache' / 'c.mp4').exists()
+    assert index.get_job_output('a') is None
+    assert index.usage(EVICTABLE_KINDS) == (2, 200)
+
+
+def test_janitor_byte_budget(index, janitor, tmp_path):
+    root = tmp_path / 'animations'
+    for job_id, last_access in (('a', 1.0), ('b', 2.0), ('c', 3.0)):
+        _render(index, root, job_id, 1024 * 1024, last_access)
+    janitor.max_files = 0
+    janitor.max_bytes = 2 * 1024 * 1024  # 3 次渲染（含缓存硬链接）共 3 MB
+
+    janitor.run_once()
+
+    assert index.usage(EVICTABLE_KINDS) == (2, 2 * 1024 * 1024)
+    assert not (root / 'stroboscope_a.mp4').exists()
+
+
+def test_migrates_index_without_file_id(tmp_path):
+    root = tmp_path / 'animations'
+    root.mkdir()
+    (root / 'v.mp4').write_bytes(b'v' * 10)
+    os.link(root / 'v.mp4', root / 'w.mp4')
+    db_path = str(tmp_path / 'old.sqlite3')
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE artifacts (path TEXT PRIMARY KEY, kind TEXT NOT NULL, job_id TEXT, cache_key TEXT,
+                                params TEXT, size INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL,
+                                last_access REAL NOT NULL);
+        INSERT INTO artifacts VALUES ('v.mp4', 'video', 'j', NULL, NULL, 10, 1, 1);
+        INSERT INTO artifacts VALUES ('w.mp4', 'cache', 'j', NULL, NULL, 10, 1, 1);
+    """)
+    conn.close()
+
+    index = ArtifactIndex(db_path, str(root))
+
+    assert index.usage(EVICTABLE_KINDS) == (1, 10)
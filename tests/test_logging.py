@@ -0,0 +1,75 @@
+"""utils：任务原始输出写入单独的日志文件，全局日志经队列监听线程按大小轮转写入"""
+
+import logging
+import logging.handlers
+import os
+import time
+
+import pytest
+
+from stroboscope.utils import JobOutputLog, config_manager, file_manager, logger
+
+
+@pytest.fixture
+def job_log():
+    with JobOutputLog('job-log-test') as log:
+        yield log
+    os.remove(log.path)
+
+
+def test_job_output_goes_to_job_file_only(job_log, caplog):
+    with caplog.at_level(logging.INFO, logger='stroboscope'):
+        job_log.write("Animation 0:  10%|█         | 6/60\n")
+        job_log.write("   \n")  # 空行不记录
+        job_log.write("ERROR  something broke")
+    job_log._file.flush()
+    with open(job_log.path, encoding='utf-8') as f:
+        assert f.read().splitlines() == ["Animation 0:  10%|█         | 6/60", "ERROR  something broke"]
+    assert job_log.path == os.path.join(file_manager.job_logs_dir, 'job-log-test.log')
+    assert job_log.line_count == 2
+    # 全局日志只记录错误行
+    assert [record.getMessage() for record in caplog.records] == ["Manim[job-log-test]: ERROR  something broke"]
+
+
+def test_summary_is_rate_limited(job_log, caplog):
+    job_log.summary_interval = 60
+    with caplog.at_level(logging.INFO, logger='stroboscope'):
+        job_log.summary("first")
+        job_log.summary("dropped")
+        job_log.summary("forced", force=True)
+    assert [record.getMessage() for record in caplog.records] == ["Manim[job-log-test]: first",
+                                                                  "Manim[job-log-test]: forced"]
+
+
+def test_log_tail_keeps_last_lines(job_log, caplog):
+    for index in range(JobOutputLog.TAIL_LINES + 5):
+        job_log.write(f"line {index}")
+    with caplog.at_level(logging.ERROR, logger='stroboscope'):
+        job_log.log_tail()
+    [record] = caplog.records
+    lines = record.getMessage().splitlines()
+    assert lines[1:] == [f"line {index}" for index in range(5, JobOutputLog.TAIL_LINES + 5)]
+
+
+def test_rotating_file_handler_uses_config():
+    [file_handler] = [h for h in logger.listener.handlers if isinstance(h, logging.handlers.RotatingFileHandler)]
+    assert file_handler.maxBytes == int(float(config_manager.get('LOGGING', 'MAX_FILE_MB', '10')) * 1024 * 1024)
+    assert file_handler.backupCount == int(config_manager.get('LOGGING', 'BACKUP_COUNT', '5'))
+    assert os.path.dirname(file_handler.baseFilename) == logger.logs_dir
+
+
+def test_records_reach_log_file_through_queue_listener():
+    [file_handler] = [h for h in logger.listener.handlers if isinstance(h, logging.handlers.RotatingFileHandler)]
+    marker = f"queue-listener-{time.time()}"
+    # QueueHandler 只把记录放入队列（pytest 的日志捕获会替换根处理器，这里直接入队），写入由后台监听线程完成
+    logger.listener.queue.put_nowait(logging.makeLogRecord({'name': 'stroboscope', 'levelno': logging.WARNING,
+                                                            'levelname': 'WARNING', 'msg': marker}))
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        file_handler.flush()
+        with open(file_handler.baseFilename, encoding='utf-8') as f:
+            if marker in f.read():
+                break
+        time.sleep(0.02)
+    else:
+        pytest.fail("日志记录没有写入日志文件")
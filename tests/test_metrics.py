@@ -0,0 +1,85 @@
+"""metrics：Prometheus 文本格式输出；utils：按任务采集峰值内存"""
+
+import os
+import sys
+
+import pytest
+
+from stroboscope.metrics import MetricsRegistry, RSS_BUCKETS
+from stroboscope.utils import process_peak_rss, reset_peak_rss
+
+
+def _lines(registry: MetricsRegistry, name: str):
+    return [line for line in registry.render().splitlines() if line.startswith(name)]
+
+
+def test_unsampled_counter_and_gauge_render_zero():
+    registry = MetricsRegistry()
+    text = registry.render()
+    assert "# TYPE stroboscope_queue_depth gauge" in text
+    assert "stroboscope_render_failures_total 0" in text.splitlines()
+
+
+def test_counter_labels_are_sorted_and_escaped():
+    registry = MetricsRegistry()
+    registry.inc('stroboscope_render_failures_total', labels={'reason': 'bad "quote"\n'})
+    registry.inc('stroboscope_render_failures_total', labels={'reason': 'bad "quote"\n'})
+    registry.inc('stroboscope_render_failures_total', -1)  # 计数器不能减少
+    assert _lines(registry, 'stroboscope_render_failures_total') == [
+        'stroboscope_render_failures_total{reason="bad \\"quote\\"\\n"} 2']
+
+
+def test_set_max_keeps_peak_per_label():
+    registry = MetricsRegistry()
+    registry.set_max('stroboscope_manim_peak_rss_max_bytes', 300, labels={'mode': 'warm'})
+    registry.set_max('stroboscope_manim_peak_rss_max_bytes', 200, labels={'mode': 'warm'})
+    registry.set_max('stroboscope_manim_peak_rss_max_bytes', 100, labels={'mode': 'subprocess'})
+    assert _lines(registry, 'stroboscope_manim_peak_rss_max_bytes') == [
+        'stroboscope_manim_peak_rss_max_bytes{mode="subprocess"} 100',
+        'stroboscope_manim_peak_rss_max_bytes{mode="warm"} 300',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    registry.observe('stroboscope_render_duration_seconds', 1.5, labels={'quality': '1', 'renderer': 'fast'})
+    registry.observe('stroboscope_render_duration_seconds', 30, labels={'quality': '1', 'renderer': 'fast'})
+    lines = _lines(registry, 'stroboscope_render_duration_seconds')
+    prefix = 'stroboscope_render_duration_seconds'
+    labels = 'quality="1",renderer="fast"'
+    assert f'{prefix}_bucket{{{labels},le="1"}} 0' in lines
+    assert f'{prefix}_bucket{{{labels},le="2"}} 1' in lines
+    assert f'{prefix}_bucket{{{labels},le="30"}} 2' in lines
+    assert f'{prefix}_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f'{prefix}_sum{{{labels}}} 31.5' in lines
+    assert f'{prefix}_count{{{labels}}} 2' in lines
+
+
+def test_undeclared_or_mistyped_metric_is_ignored():
+    registry = MetricsRegistry()
+    registry.inc('stroboscope_unknown_total')
+    registry.observe('stroboscope_queue_depth', 1)
+    assert 'stroboscope_unknown_total' not in registry.render()
+    assert 'stroboscope_queue_depth_bucket' not in registry.render()
+
+
+def test_rss_histogram_bucket_bounds_are_bytes():
+    registry = MetricsRegistry()
+    registry.observe('stroboscope_manim_peak_rss_bytes', 200 * 1024 * 1024, labels={'mode': 'warm'})
+    assert f'stroboscope_manim_peak_rss_bytes_bucket{{mode="warm",le="{RSS_BUCKETS[1]}"}} 1' in registry.render()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="需要 /proc")
+def test_reset_peak_rss_lowers_high_water_mark():
+    block = bytearray(64 * 1024 * 1024)
+    block[::4096] = b'\x01' * len(block[::4096])  # 触碰每一页，使其计入 RSS
+    before = process_peak_rss(os.getpid())
+    del block
+    if not reset_peak_rss(os.getpid()):
+        pytest.skip("内核不支持重置 VmHWM")
+    assert process_peak_rss(os.getpid()) < before
+
+
+def test_peak_rss_of_missing_process():
+    assert process_peak_rss(2 ** 22 + 1) is None
+    assert reset_peak_rss(2 ** 22 + 1) is False
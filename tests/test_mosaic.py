@@ -0,0 +1,62 @@
+"""拼图模式：网格布局、面板校验与拼图周期"""
+
+import pytest
+
+from stroboscope.fast_renderer import compute_mosaic_period, plan_mosaic_render
+from stroboscope.manim_manager import (MOSAIC_FRAME_HEIGHT, MOSAIC_FRAME_WIDTH, MOSAIC_PANEL_HEIGHT,
+                                       MOSAIC_PANEL_WIDTH, MOSAIC_TITLE_HEIGHT, scene_manager)
+from stroboscope.render_engine import MOSAIC_LABEL_MAX_LENGTH, render_engine
+
+
+@pytest.mark.parametrize("count, cols, rows", [(1, 1, 1), (2, 2, 1), (3, 2, 2), (4, 2, 2), (5, 3, 2), (9, 3, 3)])
+def test_layout_grid_size(count, cols, rows):
+    layout = scene_manager.compute_mosaic_layout(count)
+    assert (layout['cols'], layout['rows']) == (cols, rows)
+    assert len(layout['centers']) == count
+
+
+@pytest.mark.parametrize("count", range(1, 10))
+def test_layout_panels_fit_below_title(count):
+    layout = scene_manager.compute_mosaic_layout(count)
+    half_width = MOSAIC_PANEL_WIDTH * layout['scale'] / 2
+    for x, y in layout['centers']:
+        assert abs(x) + half_width <= MOSAIC_FRAME_WIDTH / 2 + 1e-3
+        # 圆盘圆心在标题栏以下
+        assert y < MOSAIC_FRAME_HEIGHT / 2 - MOSAIC_TITLE_HEIGHT
+    assert layout['scale'] <= 1.0
+    assert layout['scale'] * MOSAIC_PANEL_HEIGHT * layout['rows'] <= MOSAIC_FRAME_HEIGHT - MOSAIC_TITLE_HEIGHT + 1e-3
+
+
+def test_layout_centers_incomplete_last_row():
+    layout = scene_manager.compute_mosaic_layout(3)
+    (x0, y0), (x1, _), (x2, y2) = layout['centers']
+    assert x0 == -x1
+    assert x2 == 0.0 and y2 < y0
+
+
+def test_layout_rejects_empty():
+    with pytest.raises(ValueError):
+        scene_manager.compute_mosaic_layout(0)
+
+
+def test_normalize_panels_defaults_and_truncates_labels():
+    panels = render_engine.normalize_panels([
+        {'rotation_speed': '30', 'flash_frequency': 0.5},
+        {'rotation_speed': 30, 'flash_frequency': 0.55, 'label': 'x' * 100},
+    ])
+    assert panels[0] == {'rotation_speed': 30.0, 'flash_frequency': 0.5, 'label': 'N=30 RPM, r=0.5 Hz'}
+    assert len(panels[1]['label']) == MOSAIC_LABEL_MAX_LENGTH
+
+
+@pytest.mark.parametrize("count", [0, 10])
+def test_normalize_panels_rejects_panel_count(monkeypatch, count):
+    monkeypatch.setattr(render_engine, 'mosaic_max_panels', 9)
+    with pytest.raises(ValueError):
+        render_engine.normalize_panels([{'rotation_speed': 30, 'flash_frequency': 0.5}] * count)
+
+
+def test_mosaic_period_is_lcm_of_panel_periods():
+    # 30 fps 下：fr = 0 周期 1 帧，fr = 0.1 周期 300 帧，fr = 0.5 周期 60 帧
+    panels = [{'rotation_speed': 30, 'flash_frequency': f} for f in (0.5, 0.6, 1.0)]
+    assert compute_mosaic_period(panels, 30) == 300
+    assert plan_mosaic_render(panels, 30)['period'] == 300
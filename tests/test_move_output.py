@@ -0,0 +1,84 @@
+"""_move_output：跨文件系统时先复制为 .part.mp4 再原子重命名，最终文件名下不会出现不完整的文件"""
+
+import errno
+import os
+import shutil
+
+import pytest
+
+from stroboscope.render_engine import RenderEngine
+
+CONTENT = b'manim output' * 1024
+
+
+@pytest.fixture
+def paths(tmp_path):
+    source = tmp_path / 'media' / 'out.mp4'
+    source.parent.mkdir()
+    source.write_bytes(CONTENT)
+    destination = tmp_path / 'animations' / 'stroboscope_x.mp4'
+    destination.parent.mkdir()
+    return str(source), str(destination)
+
+
+def _cross_device(monkeypatch, source, destination, observed):
+    """源文件的重命名报 EXDEV；其余重命名照常执行，并记录执行前最终文件名的状态"""
+    real_replace = os.replace
+
+    def replace(src, dst):
+        observed.append(('replace', src, dst, os.path.exists(destination)))
+        if src == source:
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', replace)
+
+
+def test_rename_within_filesystem(paths):
+    source, destination = paths
+    assert RenderEngine()._move_output('job', source, destination) == destination
+    assert not os.path.exists(source)
+    with open(destination, 'rb') as f:
+        assert f.read() == CONTENT
+
+
+def test_cross_device_copies_to_part_file_then_renames(paths, monkeypatch):
+    source, destination = paths
+    observed = []
+    _cross_device(monkeypatch, source, destination, observed)
+    real_copy = shutil.copy2
+
+    def copy2(src, dst):
+        observed.append(('copy', src, dst, os.path.exists(destination)))
+        return real_copy(src, dst)
+
+    monkeypatch.setattr(shutil, 'copy2', copy2)
+
+    assert RenderEngine()._move_output('job', source, destination) == destination
+    part = f"{destination}.part.mp4"
+    assert observed == [
+        ('replace', source, destination, False),
+        ('copy', source, part, False),
+        ('replace', part, destination, False),
+    ]
+    with open(destination, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(part)
+
+
+def test_failed_copy_keeps_source_and_leaves_nothing_behind(paths, monkeypatch):
+    source, destination = paths
+    _cross_device(monkeypatch, source, destination, [])
+
+    def copy2(src, dst):
+        with open(dst, 'wb') as f:
+            f.write(CONTENT[:10])
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    monkeypatch.setattr(shutil, 'copy2', copy2)
+
+    assert RenderEngine()._move_output('job', source, destination) == source
+    assert not os.path.exists(destination)
+    assert not os.path.exists(f"{destination}.part.mp4")
+    with open(source, 'rb') as f:
+        assert f.read() == CONTENT
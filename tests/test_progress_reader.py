@@ -0,0 +1,62 @@
+"""progress_reader：按 \\r / \\n 切分原始字节流，并解析 tqdm 与旧格式的进度"""
+
+import io
+
+import pytest
+
+from stroboscope import progress_reader
+from stroboscope.progress_reader import iter_segments, parse_progress
+
+
+class ChunkedStream:
+    """每次 read 只返回预先切好的一块，模拟管道的读取边界"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read(self, size):
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def test_iter_segments_marks_redraws():
+    stream = io.BytesIO(b"a 10%\rb 20%\rdone\nlast")
+    assert list(iter_segments(stream)) == [("a 10%", True), ("b 20%", True), ("done", False), ("last", False)]
+
+
+def test_iter_segments_crlf_split_across_reads():
+    # \r\n 被读取边界切开时仍是一个换行，而不是进度条重绘
+    stream = ChunkedStream([b"line one\r", b"\nline two\r\n"])
+    assert list(iter_segments(stream)) == [("line one", False), ("line two", False)]
+
+
+def test_iter_segments_trailing_cr_at_eof():
+    stream = ChunkedStream([b"50%\r"])
+    assert list(iter_segments(stream)) == [("50%", True)]
+
+
+def test_iter_segments_flushes_oversized_segment(monkeypatch):
+    monkeypatch.setattr(progress_reader, 'MAX_SEGMENT_BYTES', 8)
+    stream = ChunkedStream([b"0123456789", b"ab\n"])
+    assert list(iter_segments(stream)) == [("0123456789", False), ("ab", False)]
+
+
+def test_parse_progress_tqdm():
+    segment = "Animation 3: Rotate(Circle):  45%|████▌     | 123/270 [00:02<00:03, 45.20it/s]"
+    assert parse_progress(segment) == {'percentage': 45, 'animation': 3, 'frame': 123, 'total_frames': 270}
+
+
+def test_parse_progress_tqdm_without_animation_prefix():
+    assert parse_progress("  7%|▋         | 7/100 [00:00<00:01]") == {
+        'percentage': 7, 'animation': None, 'frame': 7, 'total_frames': 100}
+
+
+@pytest.mark.parametrize("segment, percentage", [
+    ("[00:00:01/00:00:12] 45% Playing Animation: Rotate", 45),
+    ("Progress: 80%", 80),
+])
+def test_parse_progress_legacy_formats(segment, percentage):
+    assert parse_progress(segment) == {'percentage': percentage, 'animation': None, 'frame': None, 'total_frames': None}
+
+
+def test_parse_progress_ignores_other_output():
+    assert parse_progress("INFO     Rendered StroboscopeScene") is None
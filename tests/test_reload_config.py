@@ -0,0 +1,86 @@
+import configparser
+
+import pytest
+
+from app import app
+from stroboscope import config_manager, render_engine, scene_manager
+from stroboscope.worker_pool import manim_worker_pool
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def edit_config():
+    """修改临时配置文件中的键，测试结束后恢复原文件并重新加载"""
+    with open(config_manager.config_file, 'r', encoding='utf-8') as f:
+        original = f.read()
+
+    def edit(values):
+        config = configparser.ConfigParser(interpolation=None)
+        config.optionxform = str
+        config.read_string(original)
+        # 跳过 OpenGL 探测子进程
+        values = {('RENDER', 'RENDERER'): 'cairo', **values}
+        for (section, key), value in values.items():
+            config.set(section, key, value)
+        with open(config_manager.config_file, 'w', encoding='utf-8') as f:
+            config.write(f)
+
+    yield edit
+    with open(config_manager.config_file, 'w', encoding='utf-8') as f:
+        f.write(original)
+    config_manager.reload()
+
+
+def test_remote_caller_is_rejected_without_token(client, edit_config):
+    edit_config({})
+    pipeline = render_engine.pipeline
+    response = client.post('/reload_config', environ_base={'REMOTE_ADDR': '203.0.113.5'})
+    assert response.status_code == 403
+    assert response.get_json()['success'] is False
+    assert render_engine.pipeline == pipeline
+
+
+def test_admin_token_is_required_when_configured(client, edit_config):
+    edit_config({('APP', 'ADMIN_TOKEN'): 's3cret'})
+    config_manager.reload()
+    remote = {'REMOTE_ADDR': '203.0.113.5'}
+
+    # 配置了令牌后本机请求也必须携带
+    assert client.post('/reload_config', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+    assert client.post('/reload_config', environ_base=remote,
+                       headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    response = client.post('/reload_config', environ_base=remote, headers={'X-Admin-Token': 's3cret'})
+    assert response.status_code == 200
+
+
+def test_reload_propagates_to_render_engine_and_reports_restart_keys(client, edit_config):
+    workers = render_engine.max_workers
+    edit_config({
+        ('RENDER', 'PIPELINE'): 'layered',
+        ('RENDER', 'WARM_WORKER_MAX_JOBS'): '3',
+        ('RENDER', 'WORKERS'): str(workers + 1),
+        ('MANIM', 'QUALITY_SETTINGS'): '{"1": {"flag": "-ql", "fps": 15, "timeout": 7}}',
+    })
+
+    response = client.post('/reload_config', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is True
+    assert body['restart_required'] == ['RENDER.WORKERS']
+
+    # 按任务读取的配置立即生效，工作线程数保持启动时的值
+    assert render_engine.pipeline == 'layered'
+    assert manim_worker_pool.max_jobs_per_worker == 3
+    assert scene_manager.get_quality_setting(1)['timeout'] == 7
+    assert render_engine.max_workers == workers
+
+
+def test_unchanged_reload_reports_nothing(client, edit_config):
+    edit_config({})
+    config_manager.reload()
+    response = client.post('/reload_config', environ_base={'REMOTE_ADDR': '::1'})
+    assert response.get_json()['restart_required'] == []
@@ -0,0 +1,79 @@
+"""render_cache：缓存键的规范化与区分，重复请求的合并与缓存写入"""
+
+import os
+
+import pytest
+
+from stroboscope.render_cache import RenderCache
+from stroboscope.utils import config_manager
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = RenderCache()
+    cache.cache_dir = str(tmp_path)
+    return cache
+
+
+def test_make_key_normalizes_numbers(cache):
+    assert cache.make_key(30, 0.5, 1) == cache.make_key(30.0, "0.500000", 1) == cache.make_key("30.000", 0.5, 1)
+
+
+@pytest.mark.parametrize("changed", [
+    (31, 0.5, 1, 'manim'),
+    (30, 0.55, 1, 'manim'),
+    (30, 0.5, 2, 'manim'),
+    (30, 0.5, 1, 'fast'),
+])
+def test_make_key_distinguishes_parameters(cache, changed):
+    assert cache.make_key(30, 0.5, 1, 'manim') != cache.make_key(*changed)
+
+
+def test_make_key_includes_pipeline(cache, monkeypatch):
+    original_get = config_manager.get
+    before = cache.make_key(30, 0.5, 1)
+
+    def get(section, key, default=None):
+        if (section, key) == ('RENDER', 'PIPELINE'):
+            return 'layered'
+        return original_get(section, key, default)
+
+    monkeypatch.setattr(config_manager, 'get', get)
+    assert cache.make_key(30, 0.5, 1) != before
+
+
+def test_mosaic_key_depends_on_panel_order(cache):
+    first = {'rotation_speed': 30, 'flash_frequency': 0.5, 'label': 'A'}
+    second = {'rotation_speed': 30, 'flash_frequency': 0.55, 'label': 'B'}
+    assert cache.make_mosaic_key([first, second], 1) != cache.make_mosaic_key([second, first], 1)
+
+
+def test_claim_merges_duplicates_until_release(cache):
+    assert cache.claim('k', 'owner') is None
+    assert cache.claim('k', 'dup1') == 'owner'
+    assert cache.claim('k', 'dup2') == 'owner'
+    assert not cache.try_claim('k', 'other')
+    assert cache.get_waiters('k', 'owner') == ['dup1', 'dup2']
+    assert cache.get_waiters('k', 'dup1') == []
+    assert cache.remove_waiter('dup1')
+    assert not cache.remove_waiter('owner')  # 执行者不是等待者
+    assert cache.get_waiters('k', 'owner') == ['dup2']
+    cache.release('k', 'dup2')  # 只有执行者能释放
+    assert cache.get_waiters('k', 'owner') == ['dup2']
+    cache.release('k', 'owner')
+    assert cache.try_claim('k', 'other')
+
+
+def test_store_hardlinks_and_lookup(cache, tmp_path):
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(b'mp4')
+    assert cache.lookup('abc') is None
+    stored = cache.store('abc', str(video))
+    assert stored == cache.get_cache_path('abc') == cache.lookup('abc')
+    assert os.stat(stored).st_ino == os.stat(video).st_ino
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_lookup_ignores_empty_file(cache):
+    open(cache.get_cache_path('empty'), 'wb').close()
+    assert cache.lookup('empty') is None
@@ -0,0 +1,127 @@
+"""取消、超时与最新请求优先：子进程树被终止，任务以 cancelled 或超时失败结束"""
+
+import os
+import sys
+import time
+import uuid
+
+import pytest
+
+from app import app
+from stroboscope import render_engine, scene_manager
+from stroboscope.capabilities import capabilities
+from stroboscope.utils import progress_monitor
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='通过 /proc 检查子进程树')
+
+# 模拟卡住的编码进程：派生一个孙进程并把其 pid 写入文件，然后自己也一直等待
+STUB_SCRIPT = (
+    "import subprocess, sys, time\n"
+    "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+    "open(sys.argv[1], 'w').write(str(child.pid))\n"
+    "time.sleep(60)\n"
+)
+
+
+def _alive(pid: int) -> bool:
+    """进程仍在运行（不存在或已成为僵尸进程都视为已结束）"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def _wait_for(predicate, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return
+        time.sleep(0.02)
+    raise AssertionError('等待超时')
+
+
+@pytest.fixture
+def stub_jobs(tmp_path, monkeypatch):
+    """快速引擎的渲染替换为 STUB_SCRIPT，返回 submit(session_id) -> (任务 id, 孙进程 pid)"""
+    monkeypatch.setattr(capabilities, 'get_ffmpeg_path', lambda: 'ffmpeg')
+
+    def render_fast(rotation_speed, flash_frequency, quality_level, unique_id, *args):
+        pid_file = str(tmp_path / f'{unique_id}.pid')
+        render_engine._run_ffmpeg([sys.executable, '-c', STUB_SCRIPT, pid_file], unique_id)
+
+    monkeypatch.setattr(render_engine, '_render_fast', render_fast)
+    submitted = []
+
+    def submit(session_id=None):
+        unique_id = str(uuid.uuid4())
+        assert render_engine.render_animation(12.0, 0.5, 1, unique_id, engine='fast',
+                                              session_id=session_id, use_cache=False)
+        submitted.append(unique_id)
+        pid_file = tmp_path / f'{unique_id}.pid'
+        _wait_for(lambda: pid_file.exists() and pid_file.read_text())
+        return unique_id, int(pid_file.read_text())
+
+    yield submit
+    for unique_id in submitted:
+        render_engine.cancel_render(unique_id)
+    _wait_for(lambda: not any(unique_id in render_engine._pending for unique_id in submitted))
+
+
+def _wait_finished(unique_id: str):
+    _wait_for(lambda: unique_id not in render_engine._pending)
+    return progress_monitor.get_status(unique_id)
+
+
+def test_cancel_kills_process_tree(stub_jobs):
+    unique_id, grandchild = stub_jobs()
+    assert progress_monitor.get_status(unique_id)['state'] == 'running'
+
+    assert render_engine.cancel_render(unique_id) == 'cancelled'
+    status = _wait_finished(unique_id)
+    assert status['state'] == 'cancelled'
+    assert status['error'] == '用户取消'
+    _wait_for(lambda: not _alive(grandchild))
+    assert render_engine.cancel_render(unique_id) == 'finished'
+
+
+def test_timeout_fails_job_and_kills_process_tree(stub_jobs, monkeypatch):
+    settings = {level: dict(setting) for level, setting in scene_manager.quality_settings.items()}
+    settings['1']['timeout'] = 0.5
+    monkeypatch.setattr(scene_manager, 'quality_settings', settings)
+
+    unique_id, grandchild = stub_jobs()
+    status = _wait_finished(unique_id)
+    assert status['state'] == 'failed'
+    assert '渲染超时' in status['error']
+    _wait_for(lambda: not _alive(grandchild))
+
+
+def test_latest_wins_cancels_previous_session_job(stub_jobs, monkeypatch):
+    monkeypatch.setattr(render_engine, 'latest_wins', True)
+    session_id = str(uuid.uuid4())
+
+    first_id, first_grandchild = stub_jobs(session_id)
+    second_id, _ = stub_jobs(session_id)
+
+    status = _wait_finished(first_id)
+    assert status['state'] == 'cancelled'
+    assert status['error'] == '已被同一会话的新请求取代'
+    _wait_for(lambda: not _alive(first_grandchild))
+    # 新任务不受影响，其他会话的任务也不会被取代
+    other_id, _ = stub_jobs(str(uuid.uuid4()))
+    assert progress_monitor.get_status(second_id)['state'] == 'running'
+    assert progress_monitor.get_status(other_id)['state'] == 'running'
+
+
+def test_cancel_endpoint(stub_jobs):
+    client = app.test_client()
+    unique_id, grandchild = stub_jobs()
+
+    response = client.post(f'/cancel/{unique_id}')
+    assert response.status_code == 200 and response.get_json()['success'] is True
+    assert _wait_finished(unique_id)['state'] == 'cancelled'
+    _wait_for(lambda: not _alive(grandchild))
+
+    assert client.post(f'/cancel/{unique_id}').status_code == 409
+    assert client.post(f'/cancel/{uuid.uuid4()}').status_code == 404
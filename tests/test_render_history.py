@@ -0,0 +1,75 @@
+"""render_history：各阶段耗时持久化，按质量档位拟合，缺少档位时按像素数换算"""
+
+import json
+import sqlite3
+
+import pytest
+
+from stroboscope.render_history import RenderHistory, parse_time_estimate
+
+
+@pytest.fixture
+def history(tmp_path):
+    return RenderHistory(str(tmp_path / 'render_history.sqlite3'))
+
+
+def _record(history, quality_level, frames, pixels, total_seconds, stages=None):
+    history.record({'job_id': f"job-{quality_level}-{frames}", 'engine': 'fast', 'variant': 'fast',
+                    'quality_level': quality_level, 'fps': 30, 'frames': frames, 'pixels': pixels,
+                    'success': True, 'total_seconds': total_seconds, 'stages': stages or {}})
+
+
+def test_record_persists_stage_durations(history):
+    _record(history, 1, 60, 854 * 480, 2.0, stages={'frame_rendering': 1.5, 'encoding': 0.25})
+    [sample] = history.recent('fast', 'fast')
+    assert sample['stages'] == {'frame_rendering': 1.5, 'encoding': 0.25}
+    assert sample['pixels'] == 854 * 480
+
+
+def test_fit_is_per_quality_tier(history):
+    # 低档位：1 + 0.01 × 帧数；高档位：2 + 0.1 × 帧数，两者混在一起拟合会得到错误的斜率
+    for frames in (100, 200, 300):
+        _record(history, 1, frames, 854 * 480, 1 + 0.01 * frames)
+        _record(history, 3, frames, 1920 * 1080, 2 + 0.1 * frames)
+    assert history.predict_duration('fast', 'fast', 1, 400) == pytest.approx(5.0)
+    assert history.predict_duration('fast', 'fast', 3, 400) == pytest.approx(42.0)
+
+
+def test_same_tier_median_scaled_by_frames(history):
+    _record(history, 2, 100, 1280 * 720, 10.0)
+    assert history.predict_duration('fast', 'fast', 2, 200) == pytest.approx(20.0)
+
+
+def test_unseen_tier_scales_by_pixels(history):
+    _record(history, 1, 100, 1000, 1.0)
+    # 没有档位 3 的记录：每像素帧耗时 1e-5 秒
+    assert history.predict_duration('fast', 'fast', 3, 100, pixels=4000) == pytest.approx(4.0)
+
+
+def test_fallback_without_history(history):
+    assert history.predict_duration('fast', 'fast', 1, 100, fallback=22.5) == 22.5
+
+
+def test_migrates_old_schema(tmp_path):
+    db_path = tmp_path / 'render_history.sqlite3'
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE renders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, engine TEXT NOT NULL, variant TEXT NOT NULL,
+        quality_level INTEGER NOT NULL, fps INTEGER NOT NULL, frames INTEGER NOT NULL, success INTEGER NOT NULL,
+        queue_seconds REAL, prepare_seconds REAL, render_seconds REAL, finalize_seconds REAL,
+        total_seconds REAL NOT NULL, finished_at REAL NOT NULL)""")
+    conn.execute("""INSERT INTO renders (job_id, engine, variant, quality_level, fps, frames, success,
+                    total_seconds, finished_at) VALUES ('old', 'fast', 'fast', 1, 15, 50, 1, 3.0, 1.0)""")
+    conn.commit()
+    conn.close()
+    history = RenderHistory(str(db_path))
+    [sample] = history.recent('fast', 'fast')
+    assert sample['stages'] == {} and sample['pixels'] is None
+    _record(history, 1, 60, 100, 2.0, stages={'encoding': 0.5})
+    row = history._conn.execute("SELECT stages FROM renders WHERE job_id = 'job-1-60'").fetchone()
+    assert json.loads(row['stages']) == {'encoding': 0.5}
+
+
+@pytest.mark.parametrize("text, seconds", [("60-120秒", 90.0), ("约 30 秒", 30.0), ("", None)])
+def test_parse_time_estimate(text, seconds):
+    assert parse_time_estimate(text) == seconds
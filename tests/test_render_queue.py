@@ -0,0 +1,53 @@
+"""render_engine：有界队列满时拒绝新任务并释放其缓存键，相同渲染合并而不占用队列"""
+
+import queue
+import uuid
+
+import pytest
+
+from stroboscope.render_cache import render_cache
+from stroboscope.render_engine import RenderEngine
+from stroboscope.utils import progress_monitor
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = RenderEngine()
+    engine.max_queue_size = 1
+    engine._queue = queue.Queue(maxsize=1)
+    # 不启动工作线程，任务停留在队列中
+    monkeypatch.setattr(engine, '_ensure_workers', lambda: None)
+    return engine
+
+
+def _submit(engine, rotation_speed: float):
+    unique_id = str(uuid.uuid4())
+    return unique_id, engine.render_animation(rotation_speed, 0.5, 1, unique_id)
+
+
+def test_queue_full_rejects_new_jobs(engine):
+    queued_id, accepted = _submit(engine, 17.25)
+    assert accepted and engine.queue_depth() == 1
+    assert progress_monitor.get_status(queued_id)['state'] == 'queued'
+
+    rejected_id, accepted = _submit(engine, 17.5)
+    assert not accepted and engine.queue_depth() == 1
+    status = progress_monitor.get_status(rejected_id)
+    assert status['state'] == 'failed' and status['error'] == '渲染队列已满'
+    # 被拒绝任务的缓存键已释放，之后的相同请求可以重新申请；排队中的任务仍持有自己的键
+    queued_key, rejected_key = render_cache.make_key(17.25, 0.5, 1), render_cache.make_key(17.5, 0.5, 1)
+    assert render_cache.claim(rejected_key, 'retry') is None
+    assert render_cache.get_waiters(queued_key, queued_id) == []
+    assert render_cache.claim(queued_key, 'retry') == queued_id
+    render_cache.release(rejected_key, 'retry')
+    render_cache.release(queued_key, queued_id)
+
+
+def test_duplicate_request_waits_instead_of_queueing(engine):
+    leader_id, _ = _submit(engine, 18.25)
+    follower_id, accepted = _submit(engine, 18.25)
+    # 相同渲染合并到正在排队的任务，不占用队列位置
+    assert accepted and engine.queue_depth() == 1
+    key = render_cache.make_key(18.25, 0.5, 1)
+    assert render_cache.get_waiters(key, leader_id) == [follower_id]
+    render_cache.release(key, leader_id)
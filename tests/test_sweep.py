@@ -0,0 +1,60 @@
+"""sweep：取值解析、参数网格与已有输出的跳过规则"""
+
+import json
+import os
+
+import pytest
+
+from stroboscope.sweep import parse_values, build_grid, run_sweep, load_manifest
+
+
+def test_parse_values_list_and_grid():
+    assert parse_values("0,0.4,0.5") == [0.0, 0.4, 0.5]
+    assert parse_values("0:1:0.25") == [0.0, 0.25, 0.5, 0.75, 1.0]
+    assert parse_values("1:3") == [1.0, 2.0, 3.0]
+    assert parse_values("30, 60:90:30,") == [30.0, 60.0, 90.0]
+
+
+def test_parse_values_grid_avoids_float_drift():
+    assert parse_values("0:1:0.1")[-1] == 1.0
+    assert len(parse_values("0:1:0.1")) == 11
+
+
+def test_parse_values_rejects_non_positive_step():
+    with pytest.raises(ValueError):
+        parse_values("0:1:0")
+
+
+def test_build_grid_is_cartesian_product():
+    items = build_grid([30], [0.4, 0.5], [1, 3])
+    assert [item['label'] for item in items] == [
+        'rpm30_hz0.4_q1', 'rpm30_hz0.4_q3', 'rpm30_hz0.5_q1', 'rpm30_hz0.5_q3']
+    assert items[0] == {'label': 'rpm30_hz0.4_q1', 'rotation_speed': 30.0, 'flash_frequency': 0.4, 'quality': 1}
+
+
+def test_existing_output_without_manifest_is_not_overwritten(tmp_path):
+    existing = tmp_path / 'A_1.mp4'
+    existing.write_bytes(b'original')
+    items = [{'label': 'A_1', 'rotation_speed': 30.0, 'flash_frequency': 0.0, 'quality': 2}]
+
+    results = run_sweep(items, str(tmp_path), engine='fast', workers=1)
+
+    assert results[0]['status'] == 'skipped'
+    assert existing.read_bytes() == b'original'
+    # 写入清单后，下一次扫描按清单中的内容键判断
+    manifest = load_manifest(os.path.join(str(tmp_path), 'sweep_manifest.json'))
+    assert manifest[0]['output'] == 'A_1.mp4'
+    assert manifest[0]['cache_key'] == results[0]['cache_key']
+
+
+def test_duplicate_labels_with_different_parameters_fail(tmp_path):
+    (tmp_path / 'same.mp4').write_bytes(b'x')
+    items = [{'label': 'same', 'rotation_speed': 30.0, 'flash_frequency': 0.0, 'quality': 2},
+             {'label': 'same', 'rotation_speed': 60.0, 'flash_frequency': 0.0, 'quality': 2}]
+
+    results = run_sweep(items, str(tmp_path), engine='fast', workers=1)
+
+    assert results[0]['status'] == 'skipped'
+    assert results[1]['status'] == 'failed'
+    summary = json.loads((tmp_path / 'sweep_manifest.json').read_text(encoding='utf-8'))['summary']
+    assert summary['counts']['failed'] == 1
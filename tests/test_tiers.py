@@ -0,0 +1,45 @@
+"""tiers：最高档位的选择、可派生档位与派生命令"""
+
+import pytest
+
+from stroboscope.manim_manager import scene_manager
+from stroboscope.tiers import build_derive_command, derivable_levels, top_quality_level
+
+QUALITY_SETTINGS = {
+    "1": {"flag": "-ql", "resolution": "480p", "fps": 15, "encoder": {"preset": "ultrafast", "crf": 28}},
+    "2": {"flag": "-qm", "resolution": "720p", "fps": 30, "encoder": {"preset": "veryfast", "crf": 23}},
+    "3": {"flag": "-qh", "resolution": "1080p", "fps": 60, "encoder": {"preset": "slow", "crf": 20}},
+    "4": {"flag": "-ql", "resolution": "480p", "fps": 25},  # 25 不整除 60，不能派生
+}
+
+
+@pytest.fixture(autouse=True)
+def quality_settings(monkeypatch):
+    monkeypatch.setattr(scene_manager, 'quality_settings', QUALITY_SETTINGS)
+
+
+def test_top_quality_level_is_highest_resolution():
+    assert top_quality_level() == 3
+
+
+def test_derivable_levels_require_dividing_fps():
+    assert derivable_levels(3) == [1, 2]
+
+
+def test_derivable_levels_exclude_higher_resolution():
+    # 以 720p30 为最高档时，1080p 与 25fps 的档位都不能派生
+    assert derivable_levels(2) == [1]
+
+
+def test_build_derive_command():
+    command = build_derive_command('ffmpeg', 'top.mp4', 3, [(1, 'q1.mp4'), (2, 'q2.mp4')])
+    assert command[:6] == ['ffmpeg', '-y', '-loglevel', 'error', '-i', 'top.mp4']
+    graph = command[command.index('-filter_complex') + 1]
+    assert graph.startswith('[0:v]split=2[s0][s1];')
+    assert "select='not(mod(n\\,4))',setpts=N/(15*TB),scale=854:480" in graph
+    assert "select='not(mod(n\\,2))',setpts=N/(30*TB),scale=1280:720" in graph
+    # 每一路输出使用各自档位的帧率与编码参数，输出路径在该路参数之后
+    first = command[command.index('[v0]'):command.index('q1.mp4') + 1]
+    second = command[command.index('[v1]'):command.index('q2.mp4') + 1]
+    assert first[first.index('-r') + 1] == '15' and first[first.index('-crf') + 1] == '28'
+    assert second[second.index('-r') + 1] == '30' and second[second.index('-preset') + 1] == 'veryfast'
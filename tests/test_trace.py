@@ -0,0 +1,119 @@
+"""任务时间线：get_trace 的排序与嵌套、Chrome Trace 格式与 /status/<id>/trace"""
+
+import json
+import sys
+import time
+import uuid
+
+import pytest
+
+from app import app
+from stroboscope import render_engine
+from stroboscope.capabilities import capabilities
+from stroboscope.utils import ProgressMonitor, progress_monitor
+
+
+def _wait_for(predicate, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return
+        time.sleep(0.02)
+    raise AssertionError('等待超时')
+
+
+def test_get_trace_sorts_spans_and_follows_aliases():
+    monitor = ProgressMonitor()
+    monitor.register_job('leader')
+    monitor.add_span('leader', 'finalization', 30.0, 31.0, category='stage')
+    monitor.add_span('leader', 'scene_generation', 10.0, 12.5, category='stage')
+    monitor.add_span('leader', 'first_frame', 20.0)
+    monitor.register_job('waiter')
+    monitor.link_job('waiter', 'leader')
+
+    trace = monitor.get_trace('waiter')
+    assert trace['unique_id'] == 'waiter' and trace['render_id'] == 'leader'
+    assert [span['name'] for span in trace['spans']] == ['scene_generation', 'first_frame', 'finalization']
+    assert [span['duration'] for span in trace['spans']] == [2.5, None, 1.0]
+    assert monitor.get_trace('unknown') is None
+
+
+def test_to_chrome_trace_format():
+    trace = {'render_id': 'job', 'spans': [
+        {'name': 'frame_rendering', 'category': 'stage', 'start': 100.0, 'end': 101.25},
+        {'name': 'subprocess_spawn', 'category': 'step', 'start': 100.5, 'end': 100.5005, 'args': {'program': 'ffmpeg'}},
+        {'name': 'first_frame', 'category': 'step', 'start': 100.75, 'end': None},
+    ]}
+    chrome = json.loads(json.dumps(ProgressMonitor.to_chrome_trace(trace)))
+    events = chrome['traceEvents']
+    metadata = [event for event in events if event['ph'] == 'M']
+    assert {event['name'] for event in metadata} == {'process_name', 'thread_name'}
+
+    stage, spawn, instant = (event for event in events if event['ph'] != 'M')
+    # 时间单位为微秒（整数）
+    assert stage == {'name': 'frame_rendering', 'cat': 'stage', 'ph': 'X', 'pid': 1, 'tid': 1,
+                     'ts': 100_000_000, 'dur': 1_250_000, 'args': {}}
+    assert spawn['tid'] == 2 and spawn['ts'] == 100_500_000 and spawn['dur'] == 500
+    assert spawn['args'] == {'program': 'ffmpeg'}
+    assert instant['ph'] == 'i' and instant['s'] == 't' and 'dur' not in instant
+
+
+@pytest.fixture
+def finished_job(tmp_path, monkeypatch):
+    """经工作线程完整执行一个快速引擎任务；渲染步骤替换为一个立即退出的子进程"""
+    monkeypatch.setattr(capabilities, 'get_ffmpeg_path', lambda: 'ffmpeg')
+
+    def render_fast(rotation_speed, flash_frequency, quality_level, unique_id, ffmpeg_path, output_path, *args):
+        render_engine._run_ffmpeg([sys.executable, '-c', 'pass'], unique_id)
+        with open(output_path, 'wb') as f:
+            f.write(b'video')
+
+    monkeypatch.setattr(render_engine, '_render_fast', render_fast)
+    unique_id = str(uuid.uuid4())
+    assert render_engine.render_animation(12.0, 0.5, 1, unique_id, engine='fast', use_cache=False)
+    _wait_for(lambda: progress_monitor.get_status(unique_id)['state'] == 'done'
+              and unique_id not in render_engine._pending)
+    return unique_id
+
+
+def test_job_trace_stages_are_ordered_and_steps_nested(finished_job):
+    response = app.test_client().get(f'/status/{finished_job}/trace')
+    assert response.status_code == 200
+    spans = response.get_json()['spans']
+
+    stages = [span for span in spans if span['category'] == 'stage']
+    assert [span['name'] for span in stages] == ['queue', 'scene_generation', 'subprocess_startup',
+                                                 'finalization', 'cleanup']
+    # 阶段首尾相接、互不重叠
+    for previous, current in zip(stages, stages[1:]):
+        assert previous['end'] <= current['start'] + 1e-6
+        assert current['start'] - previous['end'] < 0.5
+
+    # 每个步骤都落在某个阶段之内
+    steps = [span for span in spans if span['category'] == 'step' and span['end'] is not None]
+    assert {'subprocess_spawn', 'output_registration'} <= {span['name'] for span in steps}
+    for step in steps:
+        assert any(stage['start'] - 1e-6 <= step['start'] and step['end'] <= stage['end'] + 1e-6
+                   for stage in stages), step['name']
+
+
+def test_job_trace_chrome_format(finished_job):
+    client = app.test_client()
+    response = client.get(f'/status/{finished_job}/trace?format=chrome')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    trace = json.loads(response.data)
+    spans = client.get(f'/status/{finished_job}/trace').get_json()['spans']
+    events = [event for event in trace['traceEvents'] if event['ph'] != 'M']
+    assert len(events) == len(spans)
+    for event, span in zip(events, spans):
+        assert event['name'] == span['name']
+        assert isinstance(event['ts'], int) and event['ts'] == round(span['start'] * 1e6)
+        if event['ph'] == 'X':
+            assert isinstance(event['dur'], int) and event['dur'] >= 0
+
+
+def test_trace_for_unknown_job():
+    assert app.test_client().get(f'/status/{uuid.uuid4()}/trace').status_code == 404
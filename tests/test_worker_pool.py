@@ -0,0 +1,49 @@
+"""worker_pool：关闭后归还的工作进程直接回收"""
+
+from types import SimpleNamespace
+
+from stroboscope.worker_pool import ManimWorkerPool
+
+
+class FakeWorker:
+    """只实现进程池用到的接口"""
+
+    def __init__(self, jobs_done: int = 0, alive: bool = True):
+        self.jobs_done = jobs_done
+        self.alive = alive
+        self.closed = False
+        self.process = SimpleNamespace(pid=0)
+
+    def is_alive(self) -> bool:
+        return self.alive and not self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def test_release_keeps_healthy_worker():
+    pool = ManimWorkerPool()
+    worker = FakeWorker()
+    pool.release(worker)
+    assert not worker.closed
+    assert pool.acquire() is worker
+
+
+def test_release_retires_exhausted_or_dead_worker():
+    pool = ManimWorkerPool()
+    exhausted = FakeWorker(jobs_done=pool.max_jobs_per_worker)
+    dead = FakeWorker(alive=False)
+    pool.release(exhausted)
+    pool.release(dead)
+    assert exhausted.closed and dead.closed
+
+
+def test_shutdown_closes_idle_and_later_released_workers():
+    pool = ManimWorkerPool()
+    idle, busy = FakeWorker(), FakeWorker()
+    pool.release(idle)
+    pool.shutdown()
+    assert idle.closed
+    # 关闭时仍在执行任务的工作进程，归还时回收而不是放回空闲列表
+    pool.release(busy)
+    assert busy.closed